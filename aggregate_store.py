@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from jobs_io import filename_hashes, sorted_contains, sorted_insert
+
+# Keeps running totals of the job data on disk, so that find_jobs.py (with '--store') only has to look at the adverts
+# it hasn't seen before, rather than going through every advert since the beginning on every run. The 4_ summaries,
+# salary stats and plots only need counts, so they're all worked out from the store.
+#
+# For each profile (and ALL_JOBS for every job with a title) the store holds:
+#  - counts: the number of jobs in each year and month
+#  - dates: the number of jobs on each date, for the histograms
+#  - salaries: the number of jobs with each salary in each year and month (see salary_sketch.py), from which the
+#    mean, clipped mean, min, max and number of salaries are worked out exactly
+#  - organisations: the number of jobs at each organisation in each year, for the unique institutions (see
+#    institutions.py)
+#
+# It also holds a (64 bit) hash of the filename of every advert that has been added, so an advert is never counted
+# twice however many times it turns up in the input, and the search terms of each profile. If the profiles change,
+# the store is started again from scratch. Adverts are recognised by filename, so if the adverts are parsed again
+# with different rules, delete the store to start again.
+
+ALL_JOBS = '*'
+
+# The tables in the store, and the columns which together identify a row of each. Each table also has a 'jobs'
+# column with the number of jobs
+
+STORE_TABLES = {'counts': ['profile', 'year', 'month'],
+                'dates': ['profile', 'date'],
+                'salaries': ['profile', 'year', 'month', 'salary'],
+                'organisations': ['profile', 'year', 'organisation']}
+
+PROFILES_FILE = 'profiles.json'
+ADVERTS_FILE = 'adverts.npy'
+
+
+def empty_store(profiles):
+    """
+    Makes a store with nothing in it yet
+    :param profiles: a dict of profile name to a tuple of the list of jobs of interest and the list of jobs to avoid
+    :return: the store, a dict of the profiles, the hashes of the filenames of the adverts added (a pandas Index,
+    which finds a filename quickly), the hashes added since the store was loaded (a sorted numpy array) and each of
+    the STORE_TABLES as a df
+    """
+
+    store = {'profiles': {name: [list(jobs), list(avoid)] for name, (jobs, avoid) in profiles.items()},
+             'adverts': pd.Index(np.array([], dtype=np.uint64)), 'new adverts': np.array([], dtype=np.uint64)}
+
+    for table, keys in STORE_TABLES.items():
+        store[table] = pd.DataFrame(columns=keys + ['jobs'])
+
+    return store
+
+
+def load_store(location, profiles):
+    """
+    Loads the store, or starts a new one if there isn't one yet or the profiles have changed since it was saved
+    :param location: the folder the store is kept in
+    :param profiles: a dict of profile name to a tuple of the list of jobs of interest and the list of jobs to avoid
+    :return: the store (see empty_store), and whether it had to be started again (which it also is if it was saved
+    before one of the STORE_TABLES was added)
+    """
+
+    store = empty_store(profiles)
+
+    if not os.path.exists(os.path.join(location, PROFILES_FILE)):
+        return store, True
+
+    with open(os.path.join(location, PROFILES_FILE), 'r') as f:
+        if json.load(f) != store['profiles']:
+            return store, True
+
+    if not all(os.path.exists(os.path.join(location, table + '.csv')) for table in STORE_TABLES):
+        return store, True
+
+    store['adverts'] = pd.Index(np.load(os.path.join(location, ADVERTS_FILE)))
+
+    for table in STORE_TABLES:
+        dtypes = {'profile': str, 'year': 'Int64', 'month': 'Int64', 'salary': 'float64', 'organisation': object,
+                  'jobs': 'int64'}
+        df = pd.read_csv(os.path.join(location, table + '.csv'), keep_default_na=False, dtype=dtypes,
+                         na_values={'year': [''], 'month': [''], 'salary': [''], 'organisation': ['']})
+        if table == 'dates':
+            df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d')
+        store[table] = df
+
+    return store, False
+
+
+def save_store(store, location):
+    """
+    Saves the store. Every file is written in full before any of the old ones are replaced
+    :param store: the store
+    :param location: the folder to keep the store in, which is made if it doesn't exist
+    :return: nothing, saves the files
+    """
+
+    os.makedirs(location, exist_ok=True)
+
+    files = {PROFILES_FILE: lambda f: json.dump(store['profiles'], f, indent=4)}
+    for table in STORE_TABLES:
+        files[table + '.csv'] = lambda f, table=table: store[table].to_csv(f, index=False, date_format='%Y-%m-%d')
+
+    for filename, write in files.items():
+        with open(os.path.join(location, filename + '.tmp'), 'w', newline='') as f:
+            write(f)
+
+    adverts = sorted_insert(np.sort(store['adverts'].to_numpy()), store['new adverts'])
+    with open(os.path.join(location, ADVERTS_FILE + '.tmp'), 'wb') as f:
+        np.save(f, adverts)
+    files[ADVERTS_FILE] = None
+
+    for filename in files:
+        os.replace(os.path.join(location, filename + '.tmp'), os.path.join(location, filename))
+
+
+def new_adverts(store, df):
+    """
+    Picks out the adverts which aren't in the store yet: not in it when it was loaded, not added since and not
+    repeated earlier in df, so that an advert is only counted once however many times it turns up in a run
+    :param store: the store
+    :param df: a df of job data
+    :return: the rows of df which aren't in the store, without repeats
+    """
+
+    hashes = filename_hashes(df['filename'])
+    new = (store['adverts'].get_indexer(hashes) < 0) & ~sorted_contains(store['new adverts'], hashes)
+
+    return df[new & ~pd.Series(hashes).duplicated().to_numpy()]
+
+
+def count_jobs(df, profile):
+    """
+    Works out what a set of jobs adds to each of the STORE_TABLES
+    :param df: the jobs, with the dates as datetimes
+    :param profile: the name of the profile they're the jobs of interest for, or ALL_JOBS
+    :return: a dict of table name to a df of the rows to add to the table
+    """
+
+    data = pd.DataFrame({'profile': profile,
+                         'year': pd.to_numeric(df['year']).astype('Int64').array,
+                         'month': df['date'].dt.month.astype('Int64').array,
+                         'date': df['date'].dt.normalize().to_numpy(),
+                         'salary': pd.to_numeric(df['salary'], errors='coerce').astype('float64').to_numpy(),
+                         'organisation': df['organisation'].astype(object).to_numpy()})
+
+    counts = {}
+    for table, keys in STORE_TABLES.items():
+        # Jobs without a year or month are still counted, but only the salaries, dates and organisations that are
+        # there are recorded
+        rows = data.dropna(subset=[key for key in keys if key in ('date', 'salary', 'organisation')])
+        counts[table] = rows.groupby(keys, dropna=False).size().rename('jobs').reset_index()
+
+    return counts
+
+
+def add_jobs(store, all_jobs, interest_jobs):
+    """
+    Adds a batch of new adverts to the store
+    :param store: the store, which is updated
+    :param all_jobs: a df of all the new jobs with titles, with the dates as datetimes
+    :param interest_jobs: a dict of profile name to the df of the new jobs of interest for that profile
+    :return: nothing
+    """
+
+    batches = [count_jobs(all_jobs, ALL_JOBS)] + [count_jobs(df, name) for name, df in interest_jobs.items()]
+
+    for table, keys in STORE_TABLES.items():
+        frames = [store[table]] + [batch[table] for batch in batches]
+        frames = [frame for frame in frames if len(frame) > 0]
+        if frames:
+            store[table] = pd.concat(frames, ignore_index=True).groupby(keys, dropna=False)['jobs'].sum().reset_index()
+
+    # The adverts are only added to the index when the store is saved, as rebuilding it for every batch would be slow,
+    # so until then they're kept in order to be looked up by new_adverts
+    store['new adverts'] = sorted_insert(store['new adverts'], filename_hashes(all_jobs['filename']))
+
+
+def store_totals(store, profile, cohort):
+    """
+    Gets the totals for a profile out of the store, in the same form as the running totals kept by find_jobs.py
+    when it streams through the data
+    :param store: the store
+    :param profile: the name of the profile, or ALL_JOBS
+    :param cohort: the name of the jobs in the salary stats, e.g. 'All Jobs'
+    :return: a dict of the number of jobs, the number of jobs in each year (a dict), the number of jobs on each
+    date (a Series indexed by date), the salary sketch (see salary_sketch.py) and the number of jobs at each
+    organisation in each year (a Series indexed by year and organisation)
+    """
+
+    counts = store['counts'][store['counts']['profile'] == profile]
+    dates = store['dates'][store['dates']['profile'] == profile]
+    salaries = store['salaries'][store['salaries']['profile'] == profile].dropna(subset=['year'])
+    organisations = store['organisations'][store['organisations']['profile'] == profile].dropna(subset=['year'])
+
+    years = counts.dropna(subset=['year']).groupby('year')['jobs'].sum()
+
+    sketch = salaries.assign(cohort=cohort, year=salaries['year'].astype(int))
+    sketch = sketch.groupby(['cohort', 'year', 'salary'])['jobs'].sum().rename('count')
+
+    return {'jobs': int(counts['jobs'].sum()),
+            'years': {int(year): int(n_jobs) for year, n_jobs in years.items()},
+            'dates': dates.groupby('date')['jobs'].sum(),
+            'salaries': sketch,
+            'organisations': organisations.astype({'year': 'int64'}).groupby(['year', 'organisation'])['jobs'].sum()}
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import aggregate_store
+from benchmark_near_duplicates import synthetic_adverts
+from title_matcher import match_titles
+
+# Checks that aggregate_store.py only ever counts an advert once, on synthetic adverts fed in in chunks the way
+# find_jobs.py --store does: the totals from the store have to match counting the distinct adverts directly, when
+# some adverts are repeated within a chunk and across chunks, and have to stay the same when all the adverts are fed
+# in again. Also times adding the adverts.
+#
+# Call as 'python benchmark_aggregate_store.py' for 200,000 adverts, or give the number of adverts to use, e.g.
+# 'python benchmark_aggregate_store.py 1000000'
+
+# The profile the jobs of interest are found with
+
+PROFILE = 'rse'
+PROFILE_JOBS = ['software engineer', 'data scien']
+
+# The share of the adverts that turn up a second time, and the number of adverts in each chunk
+
+REPEAT_FRACTION = 0.1
+CHUNK_SIZE = 20000
+
+
+def feed_adverts(store, df):
+    """
+    Adds some adverts to the store a chunk at a time, as find_jobs.analyse_in_chunks does
+    :param store: the store, which is updated
+    :param df: the adverts
+    :return: the number of adverts added
+    """
+
+    n_added = 0
+    for start in range(0, len(df), CHUNK_SIZE):
+        chunk = aggregate_store.new_adverts(store, df.iloc[start:start + CHUNK_SIZE])
+        interest = chunk[match_titles(chunk['job title'], PROFILE_JOBS)['keep_job']]
+        aggregate_store.add_jobs(store, chunk, {PROFILE: interest})
+        n_added += len(chunk)
+
+    return n_added
+
+
+def check_totals(store, df):
+    """
+    Checks the totals in the store against counting the adverts directly
+    :param store: the store
+    :param df: the distinct adverts that have been fed into the store
+    :return: True if the number of jobs and the jobs per year are the same for all the jobs and the jobs of interest
+    """
+
+    interest = df[match_titles(df['job title'], PROFILE_JOBS)['keep_job']]
+
+    same = True
+    for profile, jobs in [(aggregate_store.ALL_JOBS, df), (PROFILE, interest)]:
+        totals = aggregate_store.store_totals(store, profile, profile)
+        same &= totals['jobs'] == len(jobs)
+        same &= totals['years'] == {int(year): int(n_jobs) for year, n_jobs in jobs['year'].value_counts().items()}
+
+    return bool(same)
+
+
+def main(n_adverts=200000):
+    """
+    Main function to run program
+    """
+
+    df, _ = synthetic_adverts(n_adverts)
+    df['year'] = df['date'].dt.year
+
+    # Repeat some of the adverts, some in the same chunk as the first time and some in later chunks
+    rng = np.random.default_rng(1)
+    repeats = df.iloc[rng.integers(0, len(df), int(len(df) * REPEAT_FRACTION))]
+    with_repeats = pd.concat([df, repeats]).iloc[rng.permutation(len(df) + len(repeats))]
+
+    store = aggregate_store.empty_store({PROFILE: (PROFILE_JOBS, [])})
+
+    start_time = time.perf_counter()
+    n_added = feed_adverts(store, with_repeats)
+    print('Added %i of %i adverts (%i repeats) in %.2fs, totals match: %s' %
+          (n_added, len(with_repeats), len(repeats), time.perf_counter() - start_time, check_totals(store, df)))
+
+    start_time = time.perf_counter()
+    n_added = feed_adverts(store, with_repeats)
+    print('Fed them all in again and added %i in %.2fs, totals match: %s' %
+          (n_added, time.perf_counter() - start_time, check_totals(store, df)))
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import near_duplicates
+
+# Times how long near_duplicates.py takes to find the candidate pairs of near duplicate adverts as the number of
+# adverts grows, on synthetic adverts with some duplicates planted in them, and checks how many of the planted
+# duplicates are found. Comparing every advert with every other would grow with the square of the number of
+# adverts; the time per advert here should stay roughly flat.
+#
+# Call as 'python benchmark_near_duplicates.py' for 10,000 up to 1 million adverts, or give the largest number of
+# adverts to use, e.g. 'python benchmark_near_duplicates.py 3000000'
+
+# Words to build the synthetic adverts from
+
+TITLE_WORDS = ['research', 'software', 'engineer', 'data', 'scientist', 'developer', 'bioinformatician', 'fellow',
+               'lecturer', 'senior', 'associate', 'assistant', 'professor', 'postdoctoral', 'technician', 'manager',
+               'officer', 'analyst', 'head', 'machine', 'learning', 'clinical', 'chemistry', 'physics', 'biology',
+               'history', 'computing', 'imaging', 'genomics', 'statistics', 'economics', 'law', 'nursing', 'library',
+               'student', 'services', 'support', 'systems', 'network', 'teaching', 'studies', 'marketing', 'finance']
+PLACES = ['bristol', 'london', 'manchester', 'edinburgh', 'glasgow', 'cardiff', 'leeds', 'sheffield', 'oxford',
+          'cambridge', 'york', 'durham', 'exeter', 'bath', 'southampton', 'nottingham', 'birmingham', 'liverpool',
+          'newcastle', 'belfast', 'aberdeen', 'dundee', 'swansea', 'leicester', 'reading', 'warwick', 'sussex',
+          'kent', 'surrey', 'lancaster']
+
+# The fraction of the adverts that are a planted duplicate of another one
+
+DUPLICATE_FRACTION = 0.05
+
+
+def synthetic_adverts(n_adverts, seed=0):
+    """
+    Makes up some adverts, then re-advertises some of them: with a new filename, a few weeks later, and sometimes
+    with an extra word in the title
+    :param n_adverts: the number of adverts to make
+    :param seed: the seed for the random numbers
+    :return: a df of the adverts, and a numpy array of the position of the original of each planted duplicate (-1
+    for adverts which aren't planted duplicates)
+    """
+
+    rng = np.random.default_rng(seed)
+    n_originals = n_adverts - int(n_adverts * DUPLICATE_FRACTION)
+
+    words = np.array(TITLE_WORDS, dtype=object)
+    titles = words[rng.integers(0, len(words), n_originals)]
+    for _ in range(3):
+        titles = titles + ' ' + words[rng.integers(0, len(words), n_originals)]
+    organisations = np.array(['university of ' + place for place in PLACES] +
+                             [place + ' ' + kind for place in PLACES for kind in ['college', 'institute']],
+                             dtype=object)
+
+    df = pd.DataFrame({'filename': ['JOB%08i' % i for i in range(n_originals)],
+                       'job title': titles,
+                       'organisation': organisations[rng.integers(0, len(organisations), n_originals)],
+                       'location': np.array(PLACES, dtype=object)[rng.integers(0, len(PLACES), n_originals)],
+                       'salary': rng.integers(25, 60, n_originals) * 1000.0,
+                       'date': pd.Timestamp('2012-01-01') + pd.to_timedelta(rng.integers(0, 3650, n_originals), 'D')})
+
+    originals = rng.integers(0, n_originals, n_adverts - n_originals)
+    duplicates = df.iloc[originals].copy()
+    duplicates['filename'] = ['DUP%08i' % i for i in range(len(duplicates))]
+    duplicates['date'] += pd.to_timedelta(rng.integers(1, 45, len(duplicates)), 'D')
+    extra = rng.random(len(duplicates)) < 0.3
+    duplicates.loc[extra, 'job title'] = duplicates.loc[extra, 'job title'] + ' fixed term'
+
+    planted = np.r_[np.full(n_originals, -1), originals]
+
+    return pd.concat([df, duplicates], ignore_index=True), planted
+
+
+def time_candidates(df):
+    """
+    Works out the signatures and candidate pairs of some adverts, as near_duplicates.duplicate_clusters does
+    :param df: the adverts, with the dates as datetimes
+    :return: the time taken for the signatures and for the candidate pairs, in seconds, and the pairs
+    """
+
+    start_time = time.perf_counter()
+    codes, fields = near_duplicates.distinct_adverts(near_duplicates.advert_fields(df))
+    signatures, _ = near_duplicates.minhash_signatures(fields)
+    signature_time = time.perf_counter() - start_time
+
+    days = df['date'].to_numpy(dtype='datetime64[D]').astype(np.int64)
+    start_time = time.perf_counter()
+    first, second = near_duplicates.candidate_pairs(signatures, codes, days)
+    candidate_time = time.perf_counter() - start_time
+
+    return signature_time, candidate_time, first, second
+
+
+def main(max_adverts=1000000):
+    """
+    Main function to run program
+    """
+
+    sizes = [size for size in [10000, 30000, 100000, 300000, 1000000, 3000000] if size < max_adverts] + [max_adverts]
+
+    print('%10s %12s %12s %10s %16s %10s %8s %14s' % ('adverts', 'signatures', 'candidates', 'us/advert',
+                                                      'candidate pairs', 'all pairs', 'recall', 'wrongly found'))
+
+    for size in sizes:
+        df, planted = synthetic_adverts(size)
+        signature_time, candidate_time, first, second = time_candidates(df)
+
+        # How many of the planted duplicates the whole thing finds
+        clusters = near_duplicates.duplicate_clusters(df).to_numpy()
+        is_planted = planted >= 0
+        found = clusters[is_planted] == clusters[planted[is_planted]]
+
+        # And how many other adverts are wrongly found to be duplicates
+        in_cluster = pd.Series(clusters).duplicated(keep=False).to_numpy()
+        original = np.zeros(size, dtype=bool)
+        original[planted[is_planted]] = True
+        wrong = in_cluster & ~is_planted & ~original
+
+        print('%10i %11.2fs %11.2fs %10.2f %16i %10.2g %7.1f%% %14i' %
+              (size, signature_time, candidate_time, 1e6 * (signature_time + candidate_time) / size, len(first),
+               size * (size - 1) / 2, 100 * found.mean(), wrong.sum()))
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import os
+import sys
+import time
+from glob import glob
+
+from bs4 import BeautifulSoup
+
+import jobs_to_csv
+
+# Times the field extraction in jobs_to_csv.py on a folder of job adverts, comparing the original approach (the
+# find_* functions, which each search the whole tree) with extract_fields (a single walk of the tree). Both are
+# run over the same adverts and their results are checked against each other.
+#
+# Call as 'python benchmark_parsing.py /PATH_TO_JOBS_FOLDER/' and optionally add the maximum number of
+# adverts to use, e.g. 'python benchmark_parsing.py ./job_ads/ 5000'
+
+
+def find_fields(advert):
+    """
+    Finds the title, date, salary, role, organisation and location in an advert with the find_* functions
+    :param advert: the beautiful soup parsed version of an advert
+    :return: a tuple of title, date, salary, role, organisation and location
+    """
+
+    return (jobs_to_csv.find_title(advert), jobs_to_csv.find_date(advert), jobs_to_csv.find_salary(advert),
+            jobs_to_csv.find_role(advert), jobs_to_csv.find_organisation(advert), jobs_to_csv.find_location(advert))
+
+
+def single_pass_fields(advert):
+    """
+    Finds the title, date, salary, role, organisation and location in an advert with extract_fields
+    :param advert: the beautiful soup parsed version of an advert
+    :return: a tuple of title, date, salary, role, organisation and location
+    """
+
+    fields, _, _ = jobs_to_csv.extract_fields(advert)
+
+    return fields
+
+
+def time_extraction(adverts, extractor):
+    """
+    Runs an extractor over every advert
+    :param adverts: a list of beautiful soup parsed adverts
+    :param extractor: a function which takes a parsed advert and returns its fields
+    :return: the time taken in seconds and a list of the extracted fields
+    """
+
+    start_time = time.perf_counter()
+    results = [extractor(advert) for advert in adverts]
+
+    return time.perf_counter() - start_time, results
+
+
+def main(datastore, limit=None):
+    """
+    Main function to run program
+    """
+
+    list_of_adverts = [current_ad for current_ad in sorted(glob(os.path.join(datastore, '*')))
+                       if jobs_to_csv.ADVERT_FILENAME.match(os.path.basename(current_ad))]
+    if limit is not None:
+        list_of_adverts = list_of_adverts[:limit]
+
+    n_adverts = len(list_of_adverts)
+    if n_adverts == 0:
+        raise ValueError('No job adverts found in "%s"' % datastore)
+
+    # Parse the html up front so that only the field extraction is being compared
+    start_time = time.perf_counter()
+    adverts = []
+    for current_ad in list_of_adverts:
+        with open(current_ad, 'r') as f:
+            adverts.append(BeautifulSoup(f.read(), 'lxml'))
+    parse_time = time.perf_counter() - start_time
+
+    find_time, find_results = time_extraction(adverts, find_fields)
+    single_pass_time, single_pass_results = time_extraction(adverts, single_pass_fields)
+
+    mismatches = [os.path.basename(current_ad) for current_ad, before, after
+                  in zip(list_of_adverts, find_results, single_pass_results) if before != after]
+
+    print('Adverts:                  %i' % n_adverts)
+    print('HTML parsing:             %.2fs (%.0f ads/sec)' % (parse_time, n_adverts / parse_time))
+    print('find_* extraction:        %.2fs (%.0f ads/sec)' % (find_time, n_adverts / find_time))
+    print('Single pass extraction:   %.2fs (%.0f ads/sec)' % (single_pass_time, n_adverts / single_pass_time))
+    print('End to end, before:       %.0f ads/sec' % (n_adverts / (parse_time + find_time)))
+    print('End to end, after:        %.0f ads/sec' % (n_adverts / (parse_time + single_pass_time)))
+    print('Adverts with differences: %i %s' % (len(mismatches), ' '.join(mismatches[:10])))
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) < 2:
+        raise ValueError('Must pass the folder of job adverts to benchmark on')
+
+    main(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else None)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import sys
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import salary_parser
+
+# Checks that salary_parser.parse_salary gives exactly the same values as the salary parser that used to live
+# inside jobs_to_csv.py (kept below as legacy_parse_salary) on a golden corpus of salary strings, then times
+# both in strings/sec.
+#
+# Call as 'python benchmark_salary.py'. To add the salary text from a parsed jobs file to the corpus, call as
+# 'python benchmark_salary.py /PATH_TO_PROCESSED_JOBS_FILE.csv COLUMN', e.g. with COLUMN as 'salary text'.
+
+# Salary text seen in adverts, plus the awkward cases the parser has to cope with
+
+GOLDEN_SALARIES = [
+    '£30,000 - £40,000 per annum',
+    '£30000-£40000',
+    '£30,000 to £40,000',
+    '£28,331 to £33,309 (Grade 6)',
+    '£35k',
+    '£35K - £45K pa',
+    '£32,000pa',
+    '£32,000PA',
+    '£32,000p.a.',
+    '£32,000per annum',
+    '£40,000+',
+    '£40,000*',
+    '£40,000; plus benefits',
+    '£30,000 / £40,000',
+    '£30,000/£40,000',
+    '£30000 -£40000 - £50000',
+    'Grade 7: £33,797 - £40,322\nper annum',
+    '£\t45,000',
+    '(£38,000)',
+    'GBP 50,000',
+    '€50000 pa',
+    'EUR 60,000 - 70,000',
+    'SEK 40000 per month',
+    'DKK 450,000',
+    'CHF 90,000',
+    'MOP 300,000',
+    'RMB 250,000',
+    'JPY 6,000,000',
+    'A$95,000',
+    'AUD $95,000 - AUD $105,000',
+    'CAD$80,000',
+    'HK $400,000',
+    'NZD 90,000',
+    'S$70,000',
+    'SGD 90,000',
+    'Col$80,000,000',
+    'USD 90,000',
+    'USD$120,000',
+    '$120k',
+    'Competitive',
+    'Competitive salary',
+    'Not specified',
+    'Grade 7',
+    '£10.50 per hour',
+    '£9,000',
+    '£1,000,000',
+    '£',
+    '',
+    '£nan',
+    'Up to £45,000 (pro rata)',
+    'Starting at £31,000 rising to £36,000',
+    'Salary: £27,000 - 30,000',
+    'Negotiable; circa £50K',
+]
+
+
+def legacy_parse_salary(salary):
+    """
+    The salary parser as it was in jobs_to_csv.py, kept as the reference for the golden corpus
+    :param salary: the text from the salary cell of an advert
+    :return: the mean of the sane salary values found in the text, or '' if there weren't any
+    """
+
+    salary_string = salary.replace('\n', ' ').replace('\t', ' ').replace(',', '').replace('(',' ').replace(')',' ')
+    salary_string = salary_string.replace('- ','-').replace(' -','-')
+    salary_string = salary_string.replace(' /','-').replace('/ ','-').replace('/','-')
+
+    def extract_values_by_currency(salary_string,currency_symbol,conversion=1):
+
+        salary_strings = salary_string.split(currency_symbol)[1:]
+        salaries=[]
+
+        for salary in salary_strings:
+            salary=salary.strip().split(' ')
+            salary_cleaned=salary[0].replace('pa','').replace('PA','').replace('p.a.','').replace('per','')
+            salary_cleaned=salary_cleaned.replace('+','').replace('*','').replace(';','')
+            salary_cleaned=salary_cleaned.strip('-')
+            salary_cleaned=salary_cleaned.replace('k','000').replace('K','000')
+
+            if '-' in salary_cleaned:
+                sc_split=salary_cleaned.split('-')
+                salary_cleaned=sc_split[0]
+                salary_strings.append(sc_split[1])
+
+            try:
+                salary_value=float(salary_cleaned)
+            except:
+                continue
+
+            salary_gbp=salary_value*conversion
+
+            if salary_gbp<=12000:
+                continue
+
+            if salary_gbp>500000:
+                continue
+
+            salaries.append(salary_gbp)
+
+        if len(salaries)==0:
+            return ''
+
+        else:
+            return np.mean(salaries)
+
+    currencies=OrderedDict()
+    currencies[('£','GBP')]=1
+    currencies[('€','EUR')]=0.85
+    currencies[('SEK')]=0.07
+    currencies[('DKK')]=0.11
+    currencies[('CHF')]=0.90
+    currencies[('MOP')]=0.098
+    currencies[('RMB')]=0.11
+    currencies[('JPY')]=0.0054
+    currencies[('A$','AUD$','AUD $','AUD')]=0.51
+    currencies[('CAD$','CAD $','CAD')]=0.58
+    currencies[('HKD$','HK $','HKD')]=0.10
+    currencies[('NZD$','NZD $','NZD')]=0.47
+    currencies[('S$','SGD$','SGD $','SGD')]=0.58
+    currencies[('Col$','COP')]=0.00019
+    currencies[('USD$','USD','$')]=0.79
+
+    for currency in currencies:
+        conversion=currencies[currency]
+        for symbol in currency:
+            salary=extract_values_by_currency(salary_string,symbol,conversion)
+            if salary!='':
+                return salary
+
+    return ''
+
+
+def same_value(before, after):
+    """
+    Checks whether two parsed salaries are identical (treating NaN as equal to NaN)
+    """
+
+    if isinstance(before, str) or isinstance(after, str):
+        return before == after
+
+    return before == after or (np.isnan(before) and np.isnan(after))
+
+
+def time_parser(parser, corpus):
+    """
+    Runs a salary parser over every string in the corpus
+    :return: the time taken in seconds
+    """
+
+    start_time = time.perf_counter()
+    for salary in corpus:
+        parser(salary)
+
+    return time.perf_counter() - start_time
+
+
+def main(corpus_file=None, column=None):
+    """
+    Main function to run program
+    """
+
+    corpus = list(GOLDEN_SALARIES)
+
+    if corpus_file is not None:
+        extra = pd.read_csv(corpus_file, usecols=[column], dtype=str)[column].dropna()
+        corpus += extra.tolist()
+
+    # Check the golden corpus first
+    mismatches = [salary for salary in corpus
+                  if not same_value(legacy_parse_salary(salary), salary_parser.parse_salary(salary))]
+
+    print('Salary strings:           %i' % len(corpus))
+    print('Strings with differences: %i' % len(mismatches))
+    for salary in mismatches[:10]:
+        print('  %r: %r -> %r' % (salary, legacy_parse_salary(salary), salary_parser.parse_salary(salary)))
+
+    # Then time them over enough strings to get a stable figure
+    repeats = max(1, 200000 // len(corpus))
+    timing_corpus = corpus * repeats
+    n_strings = len(timing_corpus)
+
+    legacy_time = time_parser(legacy_parse_salary, timing_corpus)
+    uncached_time = time_parser(salary_parser.parse_salary.__wrapped__, timing_corpus)
+    salary_parser.parse_salary.cache_clear()
+    cached_time = time_parser(salary_parser.parse_salary, timing_corpus)
+
+    print('Legacy parser:            %.0f strings/sec' % (n_strings / legacy_time))
+    print('salary_parser, uncached:  %.0f strings/sec' % (n_strings / uncached_time))
+    print('salary_parser, cached:    %.0f strings/sec' % (n_strings / cached_time))
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) == 3:
+        main(sys.argv[1], sys.argv[2])
+    else:
+        main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import statistics
+import subprocess
+import sys
+import time
+
+# Times how long it takes to import each of the scripts, in a fresh python process each time (so nothing is
+# already loaded), and checks that importing them doesn't load matplotlib. This is the start-up cost paid every
+# time a script is run, or imported by a scheduler, before it does any work.
+#
+# Call as 'python benchmark_startup.py' for the median of 7 imports of each script, or give the number of
+# imports to time, e.g. 'python benchmark_startup.py 20'
+
+SCRIPTS = ['jobs_to_csv', 'find_jobs', 'dataset_merger']
+
+# Imported for comparison, to show what the scripts would cost if they still imported these at the top
+
+REFERENCE_MODULES = ['pandas', 'matplotlib.pyplot']
+
+
+def time_import(module, runs):
+    """
+    Imports a module in a new python process several times
+    :param module: the name of the module to import
+    :param runs: the number of times to import it
+    :return: the median time taken by the new process, in seconds
+    """
+
+    times = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'import ' + module], check=True)
+        times.append(time.perf_counter() - start_time)
+
+    return statistics.median(times)
+
+
+def imports_matplotlib(module):
+    """
+    Checks whether importing a module also imports matplotlib
+    :param module: the name of the module to import
+    :return: True if matplotlib was imported
+    """
+
+    check = 'import sys, %s; print("matplotlib" in sys.modules)' % module
+    output = subprocess.run([sys.executable, '-c', check], check=True, capture_output=True, text=True).stdout
+
+    return output.strip() == 'True'
+
+
+def main(runs=7):
+    """
+    Main function to run program
+    """
+
+    print('Median of %i imports, each in a new process' % runs)
+    print('python (no imports):      %.3fs' % time_import('sys', runs))
+
+    for module in REFERENCE_MODULES:
+        print('%-25s %.3fs' % (module + ':', time_import(module, runs)))
+
+    for module in SCRIPTS:
+        print('%-25s %.3fs%s' % (module + ':', time_import(module, runs),
+                                 ' (imports matplotlib)' if imports_matplotlib(module) else ''))
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
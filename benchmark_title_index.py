@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import title_index
+from benchmark_near_duplicates import synthetic_adverts
+from title_matcher import find_terms
+
+# Times how long title_index.py takes to build an index of synthetic adverts, to add a batch of new adverts to it
+# (and checks that the result is the same as building the index in one go) and to answer some queries, compared
+# with searching every title with title_matcher.py (which is what find_jobs.py does), and checks that both find the
+# same jobs.
+#
+# Call as 'python benchmark_title_index.py' for a million adverts, or give the number of adverts to use, e.g.
+# 'python benchmark_title_index.py 3000000'
+
+# The queries: the terms, the terms to leave out and whether any of the terms will do
+
+QUERIES = [(['scien'], [], False),
+           (['research software'], [], False),
+           (['bioinformatic'], [], False),
+           (['research', 'engineer'], ['senior'], False),
+           (['data scien', 'software develop', 'research engineer'], ['lecturer', 'professor'], True)]
+
+# The share of the adverts that are added as a second batch, to time an incremental update
+
+NEW_FRACTION = 0.02
+
+
+def scan_rows(titles, terms, not_terms, any_term):
+    """
+    Finds the titles matching a query by searching every title, as find_jobs.py does
+    :param titles: a pandas Series of the job titles
+    :param terms: the list of terms
+    :param not_terms: the list of terms to leave out
+    :param any_term: True for titles with any of the terms, False for titles with all of them
+    :return: a numpy array of the positions of the matching titles
+    """
+
+    found = find_terms(titles, list(terms) + list(not_terms))
+    wanted = found[:, :len(terms)].any(axis=1) if any_term else found[:, :len(terms)].all(axis=1)
+
+    return np.flatnonzero(wanted & ~found[:, len(terms):].any(axis=1))
+
+
+def main(n_adverts=1000000):
+    """
+    Main function to run program
+    """
+
+    df, _ = synthetic_adverts(n_adverts)
+    df['year'] = df['date'].dt.year
+    n_old = n_adverts - int(n_adverts * NEW_FRACTION)
+
+    with tempfile.TemporaryDirectory() as folder:
+        df.iloc[:n_old].to_csv(os.path.join(folder, 'old.csv'), index=False)
+        df.iloc[n_old:].to_csv(os.path.join(folder, 'new.csv'), index=False)
+        df.to_csv(os.path.join(folder, 'all.csv'), index=False)
+
+        start_time = time.perf_counter()
+        index = title_index.empty_index()
+        title_index.update_index(index, os.path.join(folder, 'old.csv'))
+        title_index.save_index(index, os.path.join(folder, 'index'))
+        print('Built an index of %i adverts in %.2fs' % (n_old, time.perf_counter() - start_time))
+
+        # Add the new adverts as they'd be added after a parse, from a file of just them
+        start_time = time.perf_counter()
+        index = title_index.load_index(os.path.join(folder, 'index'))
+        load_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        n_added = title_index.update_index(index, os.path.join(folder, 'new.csv'))
+        update_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        title_index.save_index(index, os.path.join(folder, 'index'))
+        print('Loaded it in %.2fs, added the %i new adverts in %.2fs and saved it in %.2fs' %
+              (load_time, n_added, update_time, time.perf_counter() - start_time))
+
+        # The index built up in two goes should be exactly the same as one built in one go
+        start_time = time.perf_counter()
+        whole_index = title_index.empty_index()
+        title_index.update_index(whole_index, os.path.join(folder, 'all.csv'))
+        same = all(np.array_equal(np.asarray(index[name]), np.asarray(whole_index[name])) for name in index)
+        print('Built an index of all %i adverts in one go in %.2fs, the same as the updated one: %s' %
+              (n_adverts, time.perf_counter() - start_time, same))
+
+    print('%-60s %10s %10s %10s %8s' % ('query', 'jobs', 'index', 'scan', 'same'))
+
+    for terms, not_terms, any_term in QUERIES:
+        start_time = time.perf_counter()
+        rows = title_index.matching_rows(index, terms, not_terms, any_term)
+        title_index.counts_per_year(index, rows)
+        index_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        scanned = scan_rows(df['job title'], terms, not_terms, any_term)
+        pd.Series(df['year'].to_numpy()[scanned]).value_counts()
+        scan_time = time.perf_counter() - start_time
+
+        query = (' OR ' if any_term else ' AND ').join(terms) + ''.join(' NOT ' + term for term in not_terms)
+        print('%-60s %10i %9.1fms %9.1fms %8s' % (query, len(rows), 1000 * index_time, 1000 * scan_time,
+                                                  np.array_equal(rows, scanned)))
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
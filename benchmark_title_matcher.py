@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from title_matcher import match_titles
+
+# Checks that title_matcher.match_titles flags the same jobs as the per-term str.contains loops that find_jobs.py
+# used to run (kept below as legacy_find_jobs and legacy_enhance), then times both on a synthetic set of job
+# titles.
+#
+# Call as 'python benchmark_title_matcher.py' for 2 million titles, or give the number of titles to use, e.g.
+# 'python benchmark_title_matcher.py 5000000'
+
+# The search terms from find_jobs.py
+
+JOBS_OF_INTEREST = ['data scien', 'data engineer', 'software develop', 'software engineer', 'research engineer',
+                    'bioinformatic']
+AVOID_JOBS = ['fellow', 'lecturer', 'student', 'tutor', 'profess']
+
+# Words to build the synthetic titles from, mixing the search terms with the usual academic job title words
+
+TITLE_WORDS = ['research', 'software', 'engineer', 'data', 'scientist', 'science', 'developer', 'development',
+               'bioinformatics', 'bioinformatician', 'fellow', 'lecturer', 'senior', 'associate', 'assistant',
+               'professor', 'postdoctoral', 'student', 'phd', 'tutor', 'in', 'of', 'and', 'computing', 'chemistry',
+               'technician', 'manager', 'officer', 'analyst', 'head', 'machine', 'learning', 'clinical', 'lab']
+
+
+def synthetic_titles(n_titles, seed=0):
+    """
+    Makes a column of random job titles of two to six words. Like the real data, many titles repeat
+    :param n_titles: the number of titles to make
+    :param seed: the seed for the random number generator
+    :return: a pandas Series of the titles
+    """
+
+    rng = np.random.default_rng(seed)
+    n_distinct = max(1, n_titles // 20)
+    lengths = rng.integers(2, 7, n_distinct)
+    distinct = [' '.join(rng.choice(TITLE_WORDS, length)) for length in lengths]
+
+    return pd.Series(np.array(distinct, dtype=object)[rng.integers(0, n_distinct, n_titles)])
+
+
+def legacy_find_jobs(df, jobs_of_interest):
+    """
+    find_jobs as it was in find_jobs.py, kept as the reference
+    """
+
+    for current_job in jobs_of_interest:
+        df[current_job] = np.where(df['job title'].str.contains(current_job), True, False)
+
+    return df
+
+
+def legacy_enhance(df_original, jobs_of_interest, avoid_jobs):
+    """
+    enhance as it was in find_jobs.py, kept as the reference
+    """
+
+    df=df_original.copy()
+
+    for current_job in jobs_of_interest:
+        mask = df[current_job]==True
+        df.loc[mask, 'any_job'] = True
+
+    for not_job in avoid_jobs:
+        df.loc[:,'not_job'] = np.where(df['job title'].str.contains(not_job), True, False)
+        df.loc[:,'keep_job'] = df['any_job'] & ~df['not_job']
+        bad_jobs = df.loc[df['keep_job']==False]
+        df.drop(bad_jobs.index,inplace=True)
+
+    return df
+
+
+def main(n_titles=2000000):
+    """
+    Main function to run program
+    """
+
+    titles = synthetic_titles(n_titles)
+    print('Titles:                   %i (%i distinct)' % (len(titles), titles.nunique()))
+
+    start_time = time.perf_counter()
+    legacy_df = legacy_find_jobs(pd.DataFrame({'job title': titles}), JOBS_OF_INTEREST)
+    legacy_kept = legacy_enhance(legacy_df, JOBS_OF_INTEREST, AVOID_JOBS)
+    legacy_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    matches = match_titles(titles, JOBS_OF_INTEREST, AVOID_JOBS)
+    matcher_time = time.perf_counter() - start_time
+
+    # The per-term columns should match on every row, and the same rows should be kept
+    term_differences = sum(int((legacy_df[term] != matches[term]).sum()) for term in JOBS_OF_INTEREST)
+    kept_differences = len(set(legacy_kept.index) ^ set(matches.index[matches['keep_job']]))
+
+    print('Per-term differences:     %i' % term_differences)
+    print('Kept rows differences:    %i' % kept_differences)
+    print('Jobs kept:                %i' % matches['keep_job'].sum())
+    print('str.contains loops:       %.2fs (%.0f titles/sec)' % (legacy_time, n_titles / legacy_time))
+    print('match_titles:             %.2fs (%.0f titles/sec)' % (matcher_time, n_titles / matcher_time))
+    print('Speedup:                  %.1fx' % (legacy_time / matcher_time))
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
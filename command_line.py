@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# Helpers for reading the options and flags given on the command line to jobs_to_csv.py, find_jobs.py and
+# dataset_merger.py. Each script reads its arguments in its own parse_args, which is only called from its main,
+# so that the scripts can be imported (e.g. by a scheduler) without them reading sys.argv.
+
+
+def pop_option(args, option, default):
+    """
+    Removes an option and its value (e.g. '--workers 8') from a list of command line arguments
+    :param args: the list of command line arguments, which is modified in place
+    :param option: the name of the option, including the leading dashes
+    :param default: the value to return if the option was not given
+    :return: the value given for the option, or the default
+    """
+
+    if option not in args:
+        return default
+
+    position = args.index(option)
+    if position + 1 == len(args):
+        raise ValueError('%s must be followed by a value' % option)
+
+    value = args[position + 1]
+    del args[position:position + 2]
+
+    return value
+
+
+def pop_flag(args, flag):
+    """
+    Removes a flag (e.g. '--incremental') from a list of command line arguments
+    :param args: the list of command line arguments, which is modified in place
+    :param flag: the name of the flag, including the leading dashes
+    :return: True if the flag was given, False otherwise
+    """
+
+    if flag not in args:
+        return False
+
+    args.remove(flag)
+
+    return True
@@ -1,169 +1,229 @@
 from datetime import datetime
-from matplotlib import pyplot as plt
+import numpy as np
 import pandas as pd
 import sys
 import time
 
-# Takes two csv files produced with 'jobs_to_csv.py' and compares the jobs present in each set, before
-# creating a new csv merging the data from both inputs (prioritising the information in file1 for jobs
-# present in both infiles.
-#
-# Call as 'python dataset_merger.py file1 file2' where file1 and file2 are relative paths to the csvs
-# to be merged.  Saves its output csv in RESULTSPATH directory as RESULTSNAME, and also saves plots to
-# the same directory showing number of jobs present in file 1 but not in file 2 (and vice versa) as a
-# function of year.
+from command_line import pop_flag, pop_option
+from jobs_io import (FORMATS, append_jobs, close_writers, file_format, filename_hashes, load_jobs, parse_dates,
+                     write_jobs)
+from near_duplicates import DUPLICATE_COLUMN, duplicate_clusters
+from salary_stats import PERIOD_FREQUENCIES, period_keys
 
-start_time=time.time()
+# Takes two (or more) csv files produced with 'jobs_to_csv.py' and compares the jobs present in each set, before
+# creating a new csv merging the data from all the inputs (prioritising the information in file1 for jobs
+# present in more than one infile, then file2, and so on).
+#
+# Call as 'python dataset_merger.py file1 file2 [file3 ...]' where file1, file2, etc. are relative paths to the
+# csvs to be merged, in priority order.  Saves its output csv in RESULTSPATH directory as RESULTSNAME, and also
+# saves plots to the same directory showing number of jobs present in file 1 but not in file 2 (and vice versa) as a
+# function of year. With more than two files, the plots (and the log) show the number of jobs present in each file
+# but in none of the others. Add '--period month' (or quarter) to break the differences down by month rather than
+# year; the numbers are also saved to RESULTSPATH as a csv.
+#
+# Add '--dedupe' to also look for adverts which are near duplicates of each other (the same post advertised again
+# under a new filename, see near_duplicates.py), which adds a column to the merged file naming the cluster of
+# duplicates each job is in. 'find_jobs.py --dedupe' then counts each cluster once.
+#
+# The files are read one at a time and the jobs not in an earlier file are written straight out, so merging many
+# files (e.g. a year of weekly parses) costs about one read of each, rather than merging them two at a time and
+# reading the merged file again and again. Jobs are matched up by a hash of their filename.
+#
+# The csvs can also be parquet files (see jobs_io.py), and the merged file is saved in the same format as file1.
+# Add '--no-plots' to skip the plots (and importing matplotlib at all), e.g. for headless batch runs.
+#
+# It can also be imported without side effects and run as main([file1, file2, ...]).
 
 RESULTSPATH = './results/'
 RESULTSNAME = '1_processed_merged_jobs'
 
-args=sys.argv[1:]
 
-# Ensure user has passed two arguments to use as filenames
+def parse_args(argv):
 
-if len(args) != 2:
-	raise ValueError('Must pass 2 values to script (names of the 2 parsed job csvs to be compared)')
+	# Read the command line arguments (without the name of the script), returning the list of filenames, whether
+	# to make the plots, the period to break the differences down by and whether to look for near duplicates
 
-def get_differences(df1, df2):
+	args = list(argv)
+	plots = not pop_flag(args, '--no-plots')
+	period = pop_option(args, '--period', 'year')
+	dedupe = pop_flag(args, '--dedupe')
 
-	# Given two dataframes, return the lists of filenames present in only one set or the other
+	if period not in PERIOD_FREQUENCIES:
+		raise ValueError('--period must be one of: ' + ', '.join(PERIOD_FREQUENCIES))
 
-	# Create sets of the job IDs in each unfiltered frame
-	fileset1=set(df1['filename'])
-	fileset2=set(df2['filename'])
+	# Ensure user has passed at least two arguments to use as filenames
 
-	#   Find all filenames in set 1 but not in set 2
+	if len(args) < 2:
+		raise ValueError('Must pass at least 2 values to script (names of the parsed job csvs to be merged)')
 
-	uniques1 = fileset1.difference(fileset2)
+	return args, plots, period, dedupe
 
-	#   Find all filenames in set 2 but not in set 1
 
-	uniques2 = fileset2.difference(fileset1)
+def file_differences(keys, periods):
 
-	#   Return both lists
+	# Given a list of dataframes of the filename hashes and periods of the jobs in each file, return a dataframe of
+	# the number of jobs in each period (rows) present in each file (columns, numbered from 0) but absent from all
+	# the others. Each job is counted once per period, as a job which is in one period in one file and in another
+	# period in another file is missing from both periods. Every file is done at once, by counting the files each
+	# (filename, period) pair is in, which for two files is an outer join of the pairs with an indicator
 
-	return uniques1, uniques2
+	pairs = pd.concat([df.assign(file=i) for i, df in enumerate(keys)], ignore_index=True).drop_duplicates()
+	n_files = pairs.groupby(['filename', 'period'])['file'].transform('size')
 
+	only = pairs[n_files == 1]
+	differences = only.groupby(['period', 'file']).size().unstack('file')
 
-def compare_jobs(df1, df2):
+	return differences.reindex(index=periods, columns=range(len(keys))).fillna(0).astype(int)
 
-	# Given two dataframes, return the number of filenames present in only one set or the other
 
-	# Get lists of filenames unique to each dataset
-	uniques1, uniques2 = get_differences(df1, df2)
+def merge_files(files, outfilename, logfile, period='year'):
 
-	#   Find number of filenames in set 1 but not in set 2
+	# Given the list of files in priority order, write every job with a filename that isn't in an earlier file to
+	# outfilename, reading one file at a time. Returns the number of jobs in the merged file and a dataframe for each
+	# file of the filename hashes and periods ('year', 'quarter' or 'month') of its jobs, for comparing them
 
-	difference1 = len(uniques1)
+	writers = {}
+	seen = np.array([], dtype=np.uint64)
+	columns = None
+	keys = []
+	len_merged = 0
 
-	#   Find number of filenames in set 2 but not in set 1
+	for path in files:
 
-	difference2 = len(uniques2)
+		df = load_jobs(path, logfile=logfile)
 
-	#   Return both values
+		# Removing bad data (any jobs without a name or year)
 
-	return difference1, difference2
+		df.dropna(subset=['filename','job title','year'], inplace=True)
 
+		# Keep the jobs whose filename wasn't in an earlier file. The hashes of the filenames seen so far are kept
+		# sorted, so they're looked up with a vectorised binary search rather than a set per file
 
-def main(file1, file2):
+		hashes = filename_hashes(df['filename'])
+		positions = np.minimum(np.searchsorted(seen, hashes), max(len(seen) - 1, 0))
+		new = (seen[positions] != hashes) if len(seen) > 0 else np.ones(len(hashes), dtype=bool)
+		seen = np.sort(np.concatenate([seen, hashes[new]]))
 
-	# Initialise logfile
-	logfile = open(RESULTSPATH+'comparer_log.txt', 'w')
-	logdate = datetime.now().strftime('%d/%m/%Y %H.%M.%S')
-	logfile.write('Date and time: %s\n\n' % logdate)
-	logfile.write('Finding difference between jobs listed in "%s" and "%s"\n\n' % (file1,file2))
+		# Every file is written with the columns of file1, in the same order
 
-    # Load csv files into dataframes
-	print('Loading datasets...')
-	df1=pd.read_csv(file1)
-	df2=pd.read_csv(file2)
+		if columns is None:
+			columns = list(df.columns)
+		append_jobs(writers, df.loc[new].reindex(columns=columns), outfilename)
 
-	# Removing bad data (any jobs without a name or year)
+		len_merged += int(new.sum())
+		logfile.write('Added %i of the %i jobs in "%s", the rest were in an earlier file\n\n'
+		              % (new.sum(), len(df), path))
 
-	df1.dropna(subset=['filename','job title','year'], inplace=True)
-	df2.dropna(subset=['filename','job title','year'], inplace=True)
+		# Only the filename hashes and periods of the jobs are kept, for comparing the files
 
-	# Fetch the number of jobs present in each set but absent from the other
-	difference1,difference2=compare_jobs(df1,df2)
+		if period != 'year':
+			df['date'] = parse_dates(df['date'])
+		keys.append(pd.DataFrame({'filename': hashes, 'period': period_keys(df, period).to_numpy()}))
 
-	print('Total jobs in csv1 missing from csv2: ',difference1)
-	logfile.write('Jobs present in "%s" but absent from "%s": %i\n' % (file1,file2,difference1))
+	close_writers(writers)
 
-	print('Total jobs in csv2 missing from csv1: ',difference2)
-	logfile.write('Jobs present in "%s" but absent from "%s": %i\n\n' % (file2,file1,difference2))
+	return len_merged, keys
 
-	print('Calculating differences by year...')
 
-	# Find earliest and latest years in dataset to set up the loop
+def main(files, plots=True, period='year', dedupe=False):
 
-	year_set=set(df1.dropna(subset = ['year'])['year']) | set(df2.dropna(subset = ['year'])['year'])
-	min_year=round(min(year_set))
-	max_year=round(max(year_set))
+	start_time=time.time()
 
-	year_range=range(min_year, max_year+1)
+	# Initialise logfile
+	logfile = open(RESULTSPATH+'comparer_log.txt', 'w')
+	logdate = datetime.now().strftime('%d/%m/%Y %H.%M.%S')
+	logfile.write('Date and time: %s\n\n' % logdate)
+	logfile.write('Merging the jobs listed in %s\n\n' % ', '.join('"%s"' % path for path in files))
 
-	logfile.write('Calculating difference by year between %i and %i.\n\n' % (min_year,max_year))
+	# Merge datasets, a file at a time
 
-	# Repeat the calculation for which jobs are only present in one set, but filter by year
+	print('Merging datasets...')
+	outfilename = RESULTSPATH + RESULTSNAME + '_' + datetime.now().strftime("%Y-%m-%d") + FORMATS[file_format(files[0])]
+	len_merged, keys = merge_files(files, outfilename, logfile, period)
 
-	in_1_not_2 = []
-	in_2_not_1 = []
+	logfile.write('Merged jobs list has a length of %i\n' % len_merged)
+	print('Merged dataset with %i jobs saved to "%s"' % (len_merged, outfilename) )
+	logfile.write('Merged file saved to %s\n\n' % outfilename)
 
-	for year in year_range:
+	# Label the near duplicates in the merged file (this needs all the jobs at once, so the merged file is read back)
 
-		# Filter frames on year=current year to get working df slices
+	if dedupe:
+		print('Finding near duplicates...')
+		merged_df = load_jobs(outfilename)
+		merged_df[DUPLICATE_COLUMN] = duplicate_clusters(merged_df)
+		write_jobs(merged_df, outfilename)
 
-		sub_df1=df1[df1['year'] == year]
-		sub_df2=df2[df2['year'] == year]
+		n_duplicates = int((merged_df[DUPLICATE_COLUMN] != merged_df['filename']).sum())
+		logfile.write('Found %i jobs which are near duplicates of an earlier one, %i jobs are left without them\n\n'
+		              % (n_duplicates, len_merged - n_duplicates))
 
-		# Fetch diff jobs from each subframe
+	# With two files, each is compared with the other; with more, each is compared with all the others
 
-		s_diff1,s_diff2=compare_jobs(sub_df1, sub_df2)
+	if len(files) == 2:
+		logfile.write('Finding difference between jobs listed in "%s" and "%s"\n\n' % (files[0],files[1]))
+		pairs = [(files[0], files[1]), (files[1], files[0])]
+		descriptions = ['"%s" but absent from "%s"' % pair for pair in pairs]
+		titles = ['Jobs in %s but not in %s' % pair for pair in pairs]
+		labels = ['In file 1 but not in 2', 'In file 2 but not in 1']
+		plot_names = ['in_1_not_2', 'in_2_not_1']
+	else:
+		logfile.write('Finding the jobs listed in only one of the files\n\n')
+		descriptions = ['"%s" but absent from all the other files' % path for path in files]
+		titles = ['Jobs only in %s' % path for path in files]
+		labels = ['Only in file %i' % (i + 1) for i in range(len(files))]
+		plot_names = ['only_in_%i' % (i + 1) for i in range(len(files))]
 
-		# add to arrays to be plotted on a yearly basis
+	# Fetch the number of jobs present in each set but absent from the others
 
-		in_1_not_2.append(s_diff1)
-		in_2_not_1.append(s_diff2)
+	totals = file_differences([df.assign(period='all') for df in keys], ['all']).iloc[0]
 
-		logfile.write('%s:\n' % year)
-		logfile.write('In file 1 but not in 2: %i\n' % s_diff1)
-		logfile.write('In file 2 but not in 1: %i\n\n' % s_diff2)
+	for i, description in enumerate(descriptions):
+		print('Total jobs in csv%i missing from the others: ' % (i + 1), totals[i])
+		logfile.write('Jobs present in %s: %i\n' % (description, totals[i]))
+	logfile.write('\n')
 
-	# Prepare plots
+	print('Calculating differences by %s...' % period)
 
-	plt.figure()
-	plt.title('Jobs in %s but not in %s' % (file1, file2))
-	plt.plot(year_range, in_1_not_2)
-	plt.savefig(RESULTSPATH + 'in_1_not_2.png')
-	plt.close()
+	# Find earliest and latest periods in dataset to set up the report
 
-	plt.figure()
-	plt.title('Jobs in %s but not in %s' % (file2, file1))
-	plt.plot(year_range, in_2_not_1)
-	plt.savefig(RESULTSPATH + 'in_2_not_1.png')
-	plt.close()
+	all_periods = pd.concat([df['period'] for df in keys]).dropna()
+	if period == 'year':
+		periods = pd.Index(range(round(all_periods.min()), round(all_periods.max()) + 1), name='period')
+	else:
+		periods = pd.period_range(all_periods.min(), all_periods.max(), name='period')
 
-	# Filter dataset 2 to only include those not present in 1
+	logfile.write('Calculating difference by %s between %s and %s.\n\n' % (period, periods[0], periods[-1]))
 
-	_, uniques2 = get_differences(df1, df2)
-	df2_extras=df2[df2['filename'].isin(uniques2)]
+	# Count the jobs only present in one set for every period at once
 
-	# Merge datasets
+	differences = file_differences(keys, periods)
 
-	print('Merging datasets...')
-	merged_df = pd.concat([df1, df2_extras])
+	for key, counts in differences.iterrows():
+		logfile.write('%s:\n' % key)
+		for label, count in zip(labels, counts):
+			logfile.write('%s: %i\n' % (label, count))
+		logfile.write('\n')
 
-	len_merged = len(merged_df)
-	logfile.write('Merged jobs list has a length of %i\n' % len_merged)
+	differences.columns = labels
+	differences.rename_axis(period).to_csv(RESULTSPATH + 'differences_by_' + period + '.csv')
 
-	outfilename = RESULTSPATH + RESULTSNAME + '_' + datetime.now().strftime("%Y-%m-%d") + '.csv'
-	merged_df.to_csv(outfilename, index=False)
+	# Prepare plots (matplotlib is slow to import, so it's only imported when there's something to plot)
+
+	if plots:
+		from matplotlib import pyplot as plt
+
+		x = periods.to_timestamp() if period != 'year' else periods
+
+		for title, label, plot_name in zip(titles, labels, plot_names):
+			plt.figure()
+			plt.title(title)
+			plt.plot(x, differences[label])
+			plt.savefig(RESULTSPATH + plot_name + '.png')
+			plt.close()
 
-	print('Merged dataset with %i jobs saved to "%s"' % (len_merged, outfilename) )
-	logfile.write('Merged file saved to %s\n\n' % outfilename)
 	logfile.write('Processing took %fs' % (time.time() - start_time) )
 
 	logfile.close()
 
-main(*args)
\ No newline at end of file
+if __name__ == '__main__':
+	main(*parse_args(sys.argv[1:]))
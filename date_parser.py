@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import re
+from datetime import datetime
+from functools import lru_cache
+
+import pandas as pd
+
+# Turns the text from the 'Placed on' cell of a job advert into the date and year columns of the processed jobs.
+# Dates are normalised to ISO-8601 (YYYY-MM-DD) and years are integers, so that later stages can read them with
+# a fixed format rather than guessing at each one. Used by jobs_to_csv.py when parsing adverts, and (through
+# iso_dates and years_from_dates, which do the same job over a whole pandas column at once) by rederive_fields.py.
+
+# The ordinal suffix on the day (the 'th' in '4th March 2015')
+ORDINAL = re.compile(r'(\d)(st|nd|rd|th)\b')
+
+# A date that's already in ISO-8601 form, possibly with a time after it
+ISO_DATE = re.compile(r'(\d{4}-\d{2}-\d{2})')
+
+# 'Sept', which some adverts use for September but strptime doesn't know
+SEPT = re.compile(r'\bsept\b', re.IGNORECASE)
+
+# The forms the dates take in the adverts once the ordinal suffix and any words before the date are removed
+DATE_FORMATS = ('%d %B %Y', '%d %b %Y', '%B %d %Y', '%d/%m/%Y', '%d %B %y', '%d %b %y', '%d/%m/%y')
+
+# A year in the text of a date that can't be read in full
+YEAR = re.compile(r'\b(?:19|20)\d{2}\b')
+
+
+def clean_date(date):
+    """
+    Tidy up the date on which the advert was placed, as the original parser did (kept so that the fields from
+    jobs_to_csv.extract_fields can be checked against the find_* functions)
+    :param date: the text from the date cell of an advert
+    :return: the date without the ordinal suffixes on the day
+    """
+
+    return date.replace('th','').replace('1st','1').replace('2nd','2').replace('3rd','3')
+
+
+@lru_cache(maxsize=None)
+def iso_date(date):
+    """
+    Normalise the date on which the advert was placed to ISO-8601. There are only a few thousand distinct dates
+    across all the adverts, so each is only worked out once
+    :param date: the text from the date cell of an advert
+    :return: the date as 'YYYY-MM-DD', or '' if there's no date or it can't be read
+    """
+
+    iso_match = ISO_DATE.match(date.strip())
+    if iso_match:
+        return iso_match.group(1)
+
+    words = ORDINAL.sub(r'\1', SEPT.sub('Sep', date.replace(',', ' '))).split()
+
+    # Try without each of the words at the start in turn, as some adverts start with the day of the week or
+    # 'Placed on:'
+    for start in range(len(words)):
+        text = ' '.join(words[start:])
+        for date_format in DATE_FORMATS:
+            try:
+                return datetime.strptime(text, date_format).date().isoformat()
+            except ValueError:
+                continue
+
+    return ''
+
+
+def year_from_date(date, date_text=''):
+    """
+    Extract year directly from the date, or from the text of the date if it couldn't be read
+    :param date: a date normalised by iso_date
+    :param date_text: the text from the date cell of the advert, for when date is ''
+    :return: the year as an integer, or '' if there's no date and no year in the text
+    """
+
+    if date != '':
+        return int(date[:4])
+
+    year_match = YEAR.search(date_text)
+    if year_match:
+        return int(year_match.group(0))
+
+    return ''
+
+
+def iso_dates(dates):
+    """
+    Does the same job as iso_date over a pandas Series of date text, only working out each distinct date once
+    :param dates: a Series of the text from the date cells of adverts (missing values can be NaN)
+    :return: a Series of the dates as 'YYYY-MM-DD' ('' where there was no date)
+    """
+
+    dates = dates.fillna('').astype(str)
+
+    return dates.map({date: iso_date(date) for date in dates.unique()})
+
+
+def years_from_dates(dates, date_texts=None):
+    """
+    Does the same job as year_from_date over a pandas Series of dates
+    :param dates: a Series of dates normalised by iso_dates
+    :param date_texts: a Series of the text from the date cells, for the dates that couldn't be read (optional)
+    :return: a Series of the years as nullable integers (missing where there was no date or year)
+    """
+
+    years = pd.to_numeric(dates.str[:4], errors='coerce').astype('Int64')
+
+    if date_texts is not None:
+        text_years = date_texts.fillna('').astype(str).str.extract('(' + YEAR.pattern + ')', expand=False)
+        years = years.fillna(pd.to_numeric(text_years, errors='coerce').astype('Int64'))
+
+    return years
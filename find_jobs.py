@@ -2,60 +2,166 @@
 # encoding: utf-8
 
 import pandas as pd
-from matplotlib import pyplot as plt
-import numpy as np
 import time
 from glob import glob
 from datetime import datetime
+import os
+import re
 import sys
-
+from collections import Counter
+
+from aggregate_store import ALL_JOBS, add_jobs, load_store, new_adverts, save_store, store_totals
+from command_line import pop_option, pop_flag
+from institutions import (INSTITUTION_NAMES_FILE, institutions_per_year, load_institution_names,
+                          resolve_organisations, save_institution_names)
+from jobs_io import (FORMATS, file_columns, file_format, load_jobs, iter_jobs, append_jobs, close_writers, memory_usage,
+                     parse_dates, write_jobs)
+from near_duplicates import DUPLICATE_COLUMN, collapse_duplicates
+from render_plots import PLOT_MANIFEST_NAME, bar_plot, line_plot, render_plots
+from salary_sketch import merge_sketches, sketch_salaries, sketch_stats
+from salary_stats import aggregate_salaries, salary_table
+from time_series import period_counts, time_series_table
+from title_matcher import load_profiles, match_profiles, match_titles
 
 RESULTSPATH = './results/'
 OUTRESULTSPATH = './results/'
 MERGEDFILE_ROOT = '1_processed_merged_jobs'
 RESULTSFILE_ROOT = '1_processed_jobs'
 
+# The columns of the parsed job data used here; the raw date and salary text aren't needed, so they aren't read
+ANALYSIS_COLUMNS = ['filename', 'job title', 'date', 'year', 'salary', 'role', 'organisation', 'location']
+
 # Add a list of job titles that you want to search for here; stems such as 'scien' will catch 'science', 'scientist' etc
 jobs_of_interest = ['data scien', 'data engineer', 'software develop', 'software engineer', 'research engineer', 'bioinformatic']
 
 # Add a list of job titles that you're not interested in here
 avoid_jobs = [ 'fellow', 'lecturer', 'student', 'tutor', 'profess']
 
+# Rather than editing the lists above, several sets of job titles can be searched for at once by passing a json file
+# of named profiles, each with its own lists (see job_profiles.json and title_matcher.load_profiles), e.g.
+#  > python find_jobs.py ./results/1_processed_jobs_2023-09-01.csv --profiles job_profiles.json
+#
+# The dataset is only loaded and searched once, and the 3_ and 4_ results and the plots are saved for each profile
+# with the profile's name added to the filename
+
+PROFILES = None
+
+# Add '--no-plots' on the command line to skip the plots (and importing matplotlib at all), for headless batch
+# runs. The csv results are still saved
 
-if len(sys.argv)>1:
+PLOTS = True
 
-    RESULTSPATH=''
-    RESULTSFILENAME=sys.argv[1]
-    RESULTSDATE=datetime.now().strftime("%Y-%m-%d")
+# The plots are drawn once the analysis is done (see render_plots.py), across WORKERS processes. Override this
+# with '--workers N' on the command line. Plots whose data hasn't changed since the last run aren't drawn again
 
-else:
+WORKERS = 1
 
-    # Fetch list of viable parsed csv files
-    single_csvs=glob(RESULTSPATH+RESULTSFILE_ROOT+'_*.csv')
-    merged_csvs=glob(RESULTSPATH+MERGEDFILE_ROOT+'_*.csv')
+# Add '--stream' on the command line to read the input CHUNK_SIZE rows at a time rather than all at once, for data
+# that doesn't fit comfortably in memory. The 2_ and 3_ results are written a chunk at a time, and the counts and
+# salaries behind the other results are added up as it goes (see salary_sketch.py), so the results are the same but
+# memory use depends on the chunk size rather than the size of the data. Override the chunk size with
+# '--chunk-size N'
 
-    parsed_csvs = single_csvs + merged_csvs
+STREAM = False
+CHUNK_SIZE = 100000
 
-    # Automatically fetch the most recent csv, prioritising merged files
-    parsed_csvs.sort()
-    RESULTSFILENAME = parsed_csvs[-1].split('/')[-1]
+# Add '--store' on the command line to keep running totals of the data in STORE_NAME in the OUTRESULTSPATH (see
+# aggregate_store.py). Each run then only searches the adverts that weren't in the input last time, and the 4_
+# summaries, salary stats and plots are worked out from the totals. The input is read in chunks, as with '--stream',
+# and the 2_ and 3_ results aren't written
 
-    # Uncomment the line below to override this and manually pick an input file
-    #RESULTSFILENAME = './processed_jobs_2000-01-01.csv'
+STORE = False
+STORE_NAME = 'aggregate_store'
 
-    # Fetch the RESULTSDATE from the results filename
-    RESULTSDATE = RESULTSFILENAME[-14:-4]
+# Add '--dedupe' on the command line to count each post only once, however many times it was advertised (or
+# scraped): near duplicate adverts (see near_duplicates.py) are collapsed to the first one before the search. If the
+# input already has the duplicate clusters (e.g. from 'dataset_merger.py --dedupe') they're used as they are. This
+# needs the whole dataset at once, so it can't be used with '--stream' or '--store'
 
-    print( 'Found parsed job data data at', RESULTSFILENAME )
+DEDUPE = False
 
-def import_csv_to_df(location, filename):
+# The input file and the date and extension used for the results, which are set from the command line by
+# parse_args (see main)
+
+RESULTSFILENAME = None
+RESULTSDATE = None
+RESULTSEXTENSION = FORMATS['csv']
+
+
+def parse_args(argv):
+    """
+    Sets the global config values from the command line arguments. If no input file is given, the most recent
+    parsed job data in RESULTSPATH is used
+    :param argv: the list of command line arguments, without the name of the script
+    :return: nothing, sets the global config values
     """
-    Imports a csv file into a Pandas dataframe
-    :params: an csv file and a filename from that file
+
+    global RESULTSPATH, RESULTSFILENAME, RESULTSDATE, RESULTSEXTENSION, PROFILES, PLOTS, WORKERS
+    global STREAM, CHUNK_SIZE, STORE, DEDUPE
+
+    args = list(argv)
+
+    PROFILES = pop_option(args, '--profiles', None)
+    PLOTS = not pop_flag(args, '--no-plots')
+    WORKERS = int(pop_option(args, '--workers', 1))
+    STREAM = pop_flag(args, '--stream')
+    STORE = pop_flag(args, '--store')
+    CHUNK_SIZE = int(pop_option(args, '--chunk-size', 100000))
+    DEDUPE = pop_flag(args, '--dedupe')
+
+    if DEDUPE and (STREAM or STORE):
+        raise ValueError('--dedupe needs the whole dataset at once, so it can\'t be used with --stream or --store')
+
+    if len(args)>0:
+
+        RESULTSPATH=''
+        RESULTSFILENAME=args[0]
+        RESULTSDATE=datetime.now().strftime("%Y-%m-%d")
+
+    else:
+
+        # Fetch list of viable parsed csv (or parquet) files
+        RESULTSPATH=OUTRESULTSPATH
+        single_csvs=[]
+        merged_csvs=[]
+        for extension in FORMATS.values():
+            single_csvs+=glob(RESULTSPATH+RESULTSFILE_ROOT+'_*'+extension)
+            merged_csvs+=glob(RESULTSPATH+MERGEDFILE_ROOT+'_*'+extension)
+
+        parsed_csvs = single_csvs + merged_csvs
+
+        if len(parsed_csvs) == 0:
+            raise ValueError('No parsed job data found in "%s", pass the file to analyse' % RESULTSPATH)
+
+        # Automatically fetch the most recent csv, prioritising merged files
+        parsed_csvs.sort()
+        RESULTSFILENAME = parsed_csvs[-1].split('/')[-1]
+
+        # Uncomment the line below to override this and manually pick an input file
+        #RESULTSFILENAME = './processed_jobs_2000-01-01.csv'
+
+        # Fetch the RESULTSDATE from the results filename
+        RESULTSDATE = os.path.splitext(RESULTSFILENAME)[0][-10:]
+
+        print( 'Found parsed job data data at', RESULTSFILENAME )
+
+    # The 2_ and 3_ results hold the same data as the input, so they are saved in the same format (csv or parquet)
+    RESULTSEXTENSION = FORMATS[file_format(RESULTSFILENAME)]
+
+
+def import_csv_to_df(location, filename, logfile=None):
+    """
+    Imports a csv (or parquet) file into a Pandas dataframe, reading only the ANALYSIS_COLUMNS (and the duplicate
+    clusters, if they're there and needed) with compact column types (see jobs_io.load_jobs)
+    :params: an csv file and a filename from that file, and optionally the log file to record the memory used in
     :return: a df
     """
 
-    return pd.read_csv(location + filename)
+    columns = list(ANALYSIS_COLUMNS)
+    if DEDUPE and DUPLICATE_COLUMN in file_columns(location + filename):
+        columns.append(DUPLICATE_COLUMN)
+
+    return load_jobs(location + filename, columns=columns, logfile=logfile)
 
 
 def export_to_csv(df, location, filename, index_write):
@@ -84,7 +190,7 @@ def date_and_sort(df):
     """
 
     df = df[df['date']!='no_data']
-    df['date'] = pd.to_datetime(df['date'])
+    df['date'] = parse_dates(df['date'])
     df.sort_values(by=['date'], inplace=True, ascending=True)
 
     return df
@@ -102,17 +208,20 @@ def jobs_per_year(df):
     return jobs_per_year_dict
 
 
-def find_jobs(df, jobs_of_interest):
+def find_jobs(df, jobs_of_interest, matches=None):
     """
     Searches the job titles to find titles of interest.
     :param df: the parsed info from the job adverts
+    :param matches: the result of title_matcher.match_titles on the job titles, if it's already been worked out
     :return: a df with additional cols identifying rows of interest
     """
 
-    for current_job in jobs_of_interest:
-        df[current_job] = np.where(df['job title'].str.contains(current_job), True, False)
+    # This finds the rows where the job title matches each search term and creates a new column marked as True
+    if matches is None:
+        matches = match_titles(df['job title'], jobs_of_interest)
 
-    # These find the rows where the job title matches the search term and creates a new column marked as True
+    for current_job in jobs_of_interest:
+        df[current_job] = matches[current_job]
 
     #df['research software engineer'] = np.where(df['job title'].str.contains('research software engineer'), True, False)
     #df['software developer'] = np.where(df['job title'].str.contains('software developer'), True, False)
@@ -122,27 +231,22 @@ def find_jobs(df, jobs_of_interest):
     return df
 
 
-def enhance(df_original, jobs_of_interest, avoid_jobs):
+def enhance(df_original, jobs_of_interest, avoid_jobs, matches=None):
 
-    # Create copt of original dataset to work on rather than manipulating the original
+    # Match the titles against both lists in one go, unless it's already been done
 
-    df=df_original.copy()
+    if matches is None:
+        matches = match_titles(df_original['job title'], jobs_of_interest, avoid_jobs)
 
-    # Create a column which identifies rows which include any of the jobs of interest
+    # The any_job col identifies rows which include any of the jobs of interest, and not_job those which include
+    # any of the avoid_jobs. The any_job col AND "NOT of not_job" (keep_job) will result in True only for those jobs
+    # that include terms from the jobs_of_interest list and do not include terms from the avoid_jobs list
 
-    for current_job in jobs_of_interest:
-        mask = df[current_job]==True
-        df.loc[mask, 'any_job'] = True
-
-    # Flag jobs that are not of interest and remove them
-    for not_job in avoid_jobs:
-        df.loc[:,'not_job'] = np.where(df['job title'].str.contains(not_job), True, False)
-        # The any_job col AND "NOT of not_job" will result in True only for those jobs that include
-        # terms from the jobs_of_interest list and do not include terms from the avoid_jobs list
-        df.loc[:,'keep_job'] = df['any_job'] & ~df['not_job']
-        # Limit the df to only those jobs of interest
-        bad_jobs = df.loc[df['keep_job']==False]
-        df.drop(bad_jobs.index,inplace=True)
+    # Limit the df to only those jobs of interest, which makes a copy of just those rows to work on rather than
+    # copying the whole of the original dataset
+    keep = matches['keep_job']
+    df = df_original[keep].copy()
+    df[['any_job', 'not_job', 'keep_job']] = matches.loc[keep, ['any_job', 'not_job', 'keep_job']]
 
     return df
 
@@ -151,6 +255,14 @@ def summary_of_job_num(df_interest, jobs_per_year_dict):
 
     found_jobs_per_year_dict = df_interest.value_counts(subset='year').to_dict()
 
+    return summarise_job_counts(found_jobs_per_year_dict, jobs_per_year_dict)
+
+
+def summarise_job_counts(found_jobs_per_year_dict, jobs_per_year_dict):
+
+    # Does the work of summary_of_job_num from the number of jobs of interest per year, which the streaming mode
+    # adds up a chunk at a time
+
     year_list = []
     num_all_list = []
     num_rse_list = []
@@ -169,237 +281,424 @@ def summary_of_job_num(df_interest, jobs_per_year_dict):
     df_summ['percentage rse jobs'] = percent_list
 
     df_summ.sort_values(by = ['year'], inplace = True, ascending = True)
+    df_summ.reset_index(drop = True, inplace = True)
 
     return df_summ
 
 
-def plot_job_summary(raw_data,interest_data,summary):
+def profile_names(name):
+    """
+    Works out how a profile's results are labelled
+    :param name: the name of the profile ('' for the lists at the top of this file)
+    :return: the suffix added to the filenames of the profile's results, and the name of its jobs on the plots
+    """
+
+    if name == '':
+        return '', 'RSE Jobs'
+
+    return '_' + re.sub(r'\W+', '_', name.lower()), name + ' jobs'
+
 
-    export_to_csv(summary, OUTRESULTSPATH, 'jobs_by_year'+RESULTSDATE, False)
+def job_time_series(all_dates,interest_dates,label='RSE Jobs',suffix=''):
+    """
+    Counts all the jobs and the jobs of interest per week, month and year, and saves the counts (in the same format
+    as the input data)
+    :param all_dates: the number of adverts on each date, as a Series indexed by date (e.g. from value_counts)
+    :param interest_dates: the same for the jobs of interest
+    :param label: the name of the jobs of interest in the table
+    :param suffix: added to the filenames to tell the results of different profiles apart
+    :return: the table of counts (see time_series.time_series_table)
+    """
 
-    plt.figure()
-    summary.plot('year','number rse jobs',style = 'x-')
-    #plt.xlim(summary['year'].min(),summary['year'].max())
-    plt.grid(False)
-    plt.savefig(OUTRESULTSPATH + 'rse_jobs_per_year_' + RESULTSDATE + '.png')
-    plt.close()
+    series = time_series_table({label: interest_dates, 'All Jobs': all_dates})
+    write_jobs(series, OUTRESULTSPATH + 'jobs_over_time' + suffix + '_' + RESULTSDATE + RESULTSEXTENSION)
 
-    plt.figure()
-    summary.plot('year','number all jobs',style = 'x-')
-    #plt.xlim(summary['year'].min(),summary['year'].max())
-    plt.grid(False)
-    plt.savefig(OUTRESULTSPATH + 'all_jobs_per_year_' + RESULTSDATE + '.png')
-    plt.close()
+    return series
 
-    datespan = (raw_data['date'].max()-raw_data['date'].min()).days
 
-    plt.figure()
-    ax = plt.axes()
-    raw_data.hist('date',bins = datespan // 28,ax=ax)
-    plt.grid(False)
-    plt.savefig(OUTRESULTSPATH + 'all_jobs_per_week_' + RESULTSDATE + '.png')
-    plt.close()
+def job_summary_plots(series,summary,label='RSE Jobs',suffix=''):
+    """
+    Describes the plots of the number of jobs over time, which are drawn by render_plots
+    :param series: the number of jobs per week, month and year (see job_time_series)
+    :param summary: the summary of the number of jobs per year (see summary_of_job_num)
+    :param label: the name of the jobs of interest in series
+    :param suffix: added to the filenames to tell the results of different profiles apart
+    :return: a list of the plots
+    """
+
+    plots = [line_plot(summary, OUTRESULTSPATH + 'rse_jobs_per_year' + suffix + '_' + RESULTSDATE + '.png',
+                       'year', ['number rse jobs'], style='x-'),
+             line_plot(summary, OUTRESULTSPATH + 'all_jobs_per_year_' + RESULTSDATE + '.png',
+                       'year', ['number all jobs'], style='x-')]
 
-    plt.figure()
-    ax = plt.axes()
-    interest_data.hist('date',bins = datespan // 28,ax=ax)
-    plt.grid(False)
-    plt.savefig(OUTRESULTSPATH + 'rse_jobs_per_week_' + RESULTSDATE + '.png')
-    plt.close()
+    # The number of adverts in each week across the whole period
+    plots.append(bar_plot(period_counts(series, 'week', 'All Jobs'),
+                          OUTRESULTSPATH + 'all_jobs_per_week_' + RESULTSDATE + '.png', 'date'))
+    plots.append(bar_plot(period_counts(series, 'week', label),
+                          OUTRESULTSPATH + 'rse_jobs_per_week' + suffix + '_' + RESULTSDATE + '.png', 'date'))
 
+    return plots
 
-def get_and_plot_salaries(df,df2=None):
 
-    # Fetch the minimum and maximum years in the dataset
+def year_range(years):
+    """
+    Finds every year from the first to the last of some years
+    :param years: an iterable of years (missing years are skipped)
+    :return: a range of the years
+    """
 
-    year_set=set(df['year'])
+    year_set={year for year in years if pd.notna(year)}
     min_year=round(min(year_set))
     max_year=round(max(year_set))
 
-    years=range(min_year,max_year+1)
+    return range(min_year,max_year+1)
 
-    # Store four values for plotting: mean salary (stored in 'salary'), clipped mean salary (mean
+
+def get_salaries(df,df2=None,label='RSE Jobs',suffix=''):
+    """
+    Works out the salary stats for each year, saves them and describes the plots of them
+    :param df: the jobs of interest
+    :param df2: all the jobs, to compare with (optional)
+    :param label: the name of the jobs in df on the plots
+    :param suffix: added to the filenames to tell the results of different profiles apart
+    :return: a list of the plots, which are drawn by render_plots
+    """
+
+    # Fetch the minimum and maximum years in the dataset
+
+    years=year_range(df['year'])
+
+    # Calculate four values for plotting for each year in the range: mean salary, clipped mean salary (mean
     # of the salaries after removing values outside the IQR, to remove outlier influence), max salary
-    # and min salary.
+    # and min salary. The second dataset, if given, is done at the same time
 
-    df_data={
-        'salaries':[],
-        'clipped_salaries':[],
-        'max_salaries':[],
-        'min_salaries':[],
-    }
+    cohorts = {label: df}
+    if df2 is not None:
+        cohorts['All Jobs'] = df2
 
-    # Create slices of the dataset per year in the range
+    salaries = aggregate_salaries(cohorts, 'year', years)
 
-    for year in years:
-        df_slice=df[df['year'] == year]
+    return salary_plots(salaries, list(cohorts), suffix)
 
-        # Remove all jobs with no salary data
 
-        df_slice=df_slice.dropna(subset = ['salary'])
+def salary_plots(salaries, cohorts, suffix=''):
+    """
+    Saves the salary stats and describes the plots of them
+    :param salaries: the salary stats for each cohort in each year (see salary_stats.aggregate_salaries)
+    :param cohorts: the list of the cohorts in salaries, with the jobs of interest first
+    :param suffix: added to the filenames to tell the results of different profiles apart
+    :return: a list of the plots, which are drawn by render_plots
+    """
 
-        # If no jobs were present in a given year, append NaNs
+    export_to_csv(salaries, OUTRESULTSPATH, 'salaries_by_year' + suffix + '_' + RESULTSDATE, False)
 
-        if len(df_slice)==0:
-            df_data['salaries'].append(np.nan)
-            df_data['clipped_salaries'].append(np.nan)
-            df_data['max_salaries'].append(np.nan)
-            df_data['min_salaries'].append(np.nan)
+    # Define the plotter for compactness' sake
 
-        else:
+    def plot_salaries(stat, title, filename):
 
-            # Calculate interquartile range for clipped_salaries
+        return line_plot(salary_table(salaries, stat), OUTRESULTSPATH + filename + suffix + '_' + RESULTSDATE + '.png',
+                         None, cohorts, title=title, xlabel='Year', ylabel='Salary (£/yr)',
+                         legend=len(cohorts) > 1)
 
-            Q1 = df_slice['salary'].quantile(0.25)
-            Q3 = df_slice['salary'].quantile(0.75)
+    return [plot_salaries('mean','Mean Salaries','rse_salary_per_year'),
+            plot_salaries('clipped_mean','Mean Salaries','rse_salary_per_year_clipped'),
+            plot_salaries('max','Max Salaries','max_rse_salary_per_year'),
+            plot_salaries('min','Min Salaries','min_rse_salary_per_year')]
 
-            # Remove values outside the IQR for clipped_salaries
 
-            iq_df_slice = df_slice.query('@Q1 <= salary <= @Q3')
+def organisation_counts(df):
+    """
+    Counts the jobs at each organisation in each year, for the number of unique institutions
+    :param df: the jobs
+    :return: a Series of the number of jobs indexed by year and organisation (jobs without either are left out)
+    """
 
-            # Append mean, clipped mean, max and min salaries to the lists
+    data = pd.DataFrame({'year': pd.to_numeric(df['year'], errors='coerce'),
+                         'organisation': df['organisation'].astype(object)}).dropna()
 
-            df_data['salaries'].append(np.mean(df_slice['salary']))
-            df_data['clipped_salaries'].append(np.mean(iq_df_slice['salary']))
-            df_data['max_salaries'].append(np.max(df_slice['salary']))
-            df_data['min_salaries'].append(np.min(df_slice['salary']))
+    return data.astype({'year': 'int64'}).groupby(['year', 'organisation']).size()
 
-    # Repeat the process for the second dataset if given
 
-    if df2 is not None:
-        df2_data={
-            'salaries':[],
-            'clipped_salaries':[],
-            'max_salaries':[],
-            'min_salaries':[],
-        }
-
-        for year in years:
-            df_slice=df2[df2['year'] == year]
-            df_slice=df_slice.dropna(subset = ['salary'])
-
-            if len(df_slice)==0:
-                df2_data['salaries'].append(np.nan)
-                df2_data['clipped_salaries'].append(np.nan)
-                df2_data['max_salaries'].append(np.nan)
-                df2_data['min_salaries'].append(np.nan)
-            
-            else:
-                Q1 = df_slice['salary'].quantile(0.25)
-                Q3 = df_slice['salary'].quantile(0.75)
-
-                iq_df_slice = df_slice.query('@Q1 <= salary <= @Q3')
-
-                df2_data['salaries'].append(np.mean(df_slice['salary']))
-                df2_data['clipped_salaries'].append(np.mean(iq_df_slice['salary']))
-                df2_data['max_salaries'].append(np.max(df_slice['salary']))
-                df2_data['min_salaries'].append(np.min(df_slice['salary']))
+def new_totals():
+    """
+    Starts the running totals kept by the streaming mode for a set of jobs (all of them, or the jobs of interest)
+    :return: a dict of the number of jobs, the number of jobs in each year (a Counter), the number of jobs on each
+    date (a Series indexed by date), the salary sketch (see salary_sketch.py) and the number of jobs at each
+    organisation in each year (see organisation_counts)
+    """
+
+    return {'jobs': 0, 'years': Counter(), 'dates': None, 'salaries': None,
+            'organisations': organisation_counts(pd.DataFrame({'year': [], 'organisation': []}))}
+
+
+def add_to_totals(totals, df, cohort):
+    """
+    Adds a chunk of jobs to the running totals
+    :param totals: the running totals (see new_totals), which are updated
+    :param df: the chunk of jobs
+    :param cohort: the name of the jobs in the salary stats, e.g. 'All Jobs'
+    :return: nothing
+    """
+
+    totals['jobs'] += len(df)
+    totals['years'].update(df.value_counts(subset='year').to_dict())
+
+    dates = df['date'].value_counts()
+    if totals['dates'] is not None:
+        dates = pd.concat([totals['dates'], dates]).groupby(level=0).sum()
+    totals['dates'] = dates
+
+    totals['salaries'] = merge_sketches([totals['salaries'], sketch_salaries({cohort: df}, 'year')])
+
+    organisations = pd.concat([totals['organisations'], organisation_counts(df)])
+    totals['organisations'] = organisations.groupby(level=['year', 'organisation']).sum()
+
+
+def analyse_in_chunks(profiles, logfile, store=None):
+    """
+    Does the searching of the job titles a chunk of the input at a time, writing out the 2_ and 3_ results as it
+    goes and keeping running totals for the rest of the results, so that only one chunk is ever in memory
+    :param profiles: a dict of profile name to a tuple of the list of jobs of interest and the list of jobs to avoid
+    :param logfile: the open log file
+    :param store: the aggregate store (see aggregate_store.py), if one is being used. Only the adverts that aren't
+    in the store already are searched, and they're added to the store rather than to the running totals. The 2_ and
+    3_ results aren't written, as they'd only hold the new adverts
+    :return: the running totals (see new_totals) of all the jobs with titles, and a dict of profile name to the
+    running totals of the profile's jobs of interest
+    """
+
+    all_totals = new_totals()
+    profile_totals = {name: new_totals() for name in profiles}
+
+    writers = {}
+    n_parsed = 0
+    n_new = 0
+    largest_chunk = 0
+
+    try:
+        for chunk in iter_jobs(RESULTSPATH + RESULTSFILENAME, ANALYSIS_COLUMNS, CHUNK_SIZE):
+            n_parsed += len(chunk)
+            print('Analysed ' + str(n_parsed) + ' jobs', end='\r')
+
+            if store is not None:
+                chunk = new_adverts(store, chunk)
+
+            chunk['date'] = parse_dates(chunk['date'])
+            chunk = clean_job_titles(chunk)
+            n_new += len(chunk)
+
+            all_matches = match_profiles(chunk['job title'], profiles)
+            data_columns = list(chunk.columns)
+            for name, (profile_jobs, _) in profiles.items():
+                chunk = find_jobs(chunk, profile_jobs, all_matches[name])
+
+            largest_chunk = max(largest_chunk, memory_usage(chunk))
+            if store is None:
+                add_to_totals(all_totals, chunk, 'All Jobs')
+                append_jobs(writers, chunk, OUTRESULTSPATH + '2_named_processed_jobs_' + RESULTSDATE + RESULTSEXTENSION)
+
+            interest_jobs = {}
+            for name, (profile_jobs, profile_avoid) in profiles.items():
+                suffix, label = profile_names(name)
+
+                profile_columns = data_columns + [job for job in dict.fromkeys(profile_jobs) if job not in data_columns]
+                df_interest = enhance(chunk[profile_columns], profile_jobs, profile_avoid, all_matches[name])
+
+                if store is None:
+                    add_to_totals(profile_totals[name], df_interest, label)
+                    append_jobs(writers, df_interest,
+                                OUTRESULTSPATH + '3_identified_jobs' + suffix + '_' + RESULTSDATE + RESULTSEXTENSION)
+                else:
+                    interest_jobs[name] = df_interest
+
+            if store is not None:
+                add_jobs(store, chunk, interest_jobs)
+
+    finally:
+        close_writers(writers)
+
+    # With a store, the totals are everything in the store, the new adverts included
+    if store is not None:
+        all_totals = store_totals(store, ALL_JOBS, 'All Jobs')
+        profile_totals = {name: store_totals(store, name, profile_names(name)[1]) for name in profiles}
+
+    logfile.write('Read the data in chunks of up to ' + str(CHUNK_SIZE) + ' jobs' + '\n \n')
+    logfile.write('There were ' + str(n_parsed) + ' parsed job adverts' + '\n \n')
+    if store is not None:
+        logfile.write(str(n_new) + ' new jobs with job titles were added to the aggregate store' + '\n \n')
+    logfile.write('There are ' + str(all_totals['jobs']) + ' jobs with job titles' + '\n \n')
+    logfile.write('With a column for each search term the largest chunk used %.1f MB of memory\n \n'
+                  % (largest_chunk / 1e6))
+
+    return all_totals, profile_totals
 
-    # Define the plotter for compactness' sake
 
-    def plot_salaries(data_label, title, filename):
-
-        plt.figure()
-        plt.title(title)
-        plt.plot(years,df_data[data_label],label='RSE Jobs')
-        plt.xlabel('Year')
-        plt.ylabel('Salary (£/yr)')
-        if df2 is not None:
-            plt.plot(years,df2_data[data_label],label='All Jobs')
-            plt.legend()
-        plt.savefig(OUTRESULTSPATH + filename + '_' + RESULTSDATE + '.png')
-
-    plot_salaries('salaries','Mean Salaries','rse_salary_per_year')
-    plot_salaries('clipped_salaries','Mean Salaries','rse_salary_per_year_clipped')
-    plot_salaries('max_salaries','Max Salaries','max_rse_salary_per_year')
-    plot_salaries('min_salaries','Min Salaries','min_rse_salary_per_year')
-
-#    plt.figure()
-#    plt.title('Mean Salaries')
-#    plt.plot(years,salaries,label='RSE Jobs')
-#    if df2 is not None:
-#        plt.plot(years,salaries2,label='All Jobs')
-#       plt.legend()
-#    plt.savefig(OUTRESULTSPATH + 'rse_salary_per_year_' + RESULTSDATE + '.png')
-
-#    plt.figure()
-#    plt.title('Max Salaries')
-#    plt.plot(years,max_salaries,label='RSE Jobs')
-#    if df2 is not None:
-#        print('===MAX===')
-#        print(df2.loc[df2['salary'].idxmax()])
-#        plt.plot(years,max_salaries2,label='All Jobs')
-#        plt.legend()
-#    plt.savefig(OUTRESULTSPATH + 'max_rse_salary_per_year_' + RESULTSDATE + '.png')
-
-#    plt.figure()
-#    plt.title('Min salaries')
-#    plt.plot(years,min_salaries,label='RSE Jobs')
-#    if df2 is not None:
-#        print('===MIN===')
-#        print(df2.loc[df2['salary'].idxmin()])
-#        plt.plot(years,min_salaries2,label='All Jobs')
-#        plt.legend()
-#    plt.savefig(OUTRESULTSPATH + 'min_rse_salary_per_year_' + RESULTSDATE + '.png')
-
-
-def main():
+def main(argv=None):
     """
     Main function to run program
+    :param argv: the list of command line arguments, without the name of the script (defaults to sys.argv[1:]),
+    e.g. ['./results/1_processed_jobs_2023-09-01.csv', '--no-plots']
     """
 
+    parse_args(sys.argv[1:] if argv is None else argv)
+
     start_time = time.time()
 
     # Logging
     file = open(OUTRESULTSPATH + 'find_jobs_log.txt', 'w')
     logdate = datetime.now().strftime('%d/%m/%Y %H.%M.%S')
     file.write('Date and time: ' + str(logdate) + '\n \n')
-    file.write('Analysing job list in "'+RESULTSFILENAME+'"')
-    # Get parsed job advert data
-    df = import_csv_to_df(RESULTSPATH, RESULTSFILENAME)
-    # Convert date column to datetime objects
-    print('Extracting date information...')
-    df['date']= pd.to_datetime(df['date'],format='mixed')
+    file.write('Analysing job list in "'+RESULTSFILENAME+'"' + '\n \n')
 
-    # Logging
-    file.write('There were ' + str(len(df)) + ' parsed job adverts' + '\n \n')
+    # Either search for the lists at the top of this file, or for every profile in the PROFILES file. The
+    # results of the lists at the top are saved without a suffix, as they always have been
+    if PROFILES is None:
+        profiles = {'': (jobs_of_interest, avoid_jobs)}
+    else:
+        profiles = load_profiles(PROFILES)
+        file.write('Searching for the ' + str(len(profiles)) + ' profiles in "' + PROFILES + '"\n \n')
 
-    df = clean_job_titles(df)
-    # Logging
-    file.write('There are ' + str(len(df)) + ' jobs with job titles' + '\n \n')
+    if STORE:
 
-    # Enrich data by searching job titles finding roles of interest
-    df = find_jobs(df, jobs_of_interest)
-    # Get dates working and sort by date
-    #df = date_and_sort(df)
-    file.write('There are ' + str(len(df)) + ' jobs with a full complement of data' + '\n \n')
+        # Add the new adverts to the aggregate store, and work out the results from everything in it
+        store, restarted = load_store(OUTRESULTSPATH + STORE_NAME, profiles)
+        if restarted:
+            file.write('Starting a new aggregate store in "' + OUTRESULTSPATH + STORE_NAME + '"\n \n')
 
-    # Get number of jobs per year
-    jobs_per_year_dict = jobs_per_year(df)
-    # Export just the data of interest
-    df_interest=enhance(df, jobs_of_interest, avoid_jobs)
+        all_totals, profile_totals = analyse_in_chunks(profiles, file, store)
+        save_store(store, OUTRESULTSPATH + STORE_NAME)
 
-    # Calculate a summary of the data
-    df_summ = summary_of_job_num(df_interest, jobs_per_year_dict)
+        jobs_per_year_dict = all_totals['years']
+        all_dates = all_totals['dates']
+        all_organisations = all_totals['organisations']
 
-    # Make plots based on the data summary
+    elif STREAM:
 
-    plot_job_summary(df,df_interest,df_summ)
+        # Work through the data a chunk at a time, which writes the 2_ and 3_ results as it goes
+        all_totals, profile_totals = analyse_in_chunks(profiles, file)
 
-    # Collect salary stats on the data on a per-year basis
+        jobs_per_year_dict = all_totals['years']
+        all_dates = all_totals['dates']
+        all_organisations = all_totals['organisations']
 
-    get_and_plot_salaries(df_interest,df)
+    else:
 
-    # Export data
-    export_to_csv(df, OUTRESULTSPATH, '2_named_processed_jobs_'+RESULTSDATE, False)
+        # Get parsed job advert data
+        df = import_csv_to_df(RESULTSPATH, RESULTSFILENAME, file)
+        # Convert date column to datetime objects
+        print('Extracting date information...')
+        df['date'] = parse_dates(df['date'])
 
-    # Logging
-    file.write('There are ' + str(len(df_interest)) + ' jobs with the job title of interest' + '\n \n')
-    # Export enhanced data
-    export_to_csv(df_interest, OUTRESULTSPATH, '3_identified_jobs_'+RESULTSDATE, False)
+        # Logging
+        file.write('There were ' + str(len(df)) + ' parsed job adverts' + '\n \n')
+
+        df = clean_job_titles(df)
+        # Logging
+        file.write('There are ' + str(len(df)) + ' jobs with job titles' + '\n \n')
+
+        if DEDUPE:
+            df, n_duplicates = collapse_duplicates(df)
+            file.write('Removed ' + str(n_duplicates) + ' adverts which were near duplicates of earlier ones, ' +
+                       'leaving ' + str(len(df)) + ' jobs' + '\n \n')
+
+        # Enrich data by searching job titles finding roles of interest (and the ones to avoid, for later). The titles
+        # are searched for every profile in one go
+        all_matches = match_profiles(df['job title'], profiles)
+        data_columns = list(df.columns)
+        for name, (profile_jobs, _) in profiles.items():
+            df = find_jobs(df, profile_jobs, all_matches[name])
+        # Get dates working and sort by date
+        #df = date_and_sort(df)
+        file.write('There are ' + str(len(df)) + ' jobs with a full complement of data' + '\n \n')
+        file.write('With a column for each search term the data uses %.1f MB of memory\n \n' % (memory_usage(df) / 1e6))
+
+        # Get number of jobs per year
+        jobs_per_year_dict = jobs_per_year(df)
+        all_dates = df['date'].value_counts()
+        all_organisations = organisation_counts(df)
+
+        # Export data
+        write_jobs(df, OUTRESULTSPATH + '2_named_processed_jobs_' + RESULTSDATE + RESULTSEXTENSION)
+
+    # The plots for every profile are collected up and drawn together at the end
+    plots = []
+
+    # Work out the institution of every organisation name, using the ones found by earlier runs so only new names
+    # need matching up. All the jobs are used, so each institution is named after its most common spelling overall
+    institution_names = load_institution_names(OUTRESULTSPATH + INSTITUTION_NAMES_FILE)
+    n_new_names = resolve_organisations(all_organisations.groupby(level='organisation').sum(), institution_names)
+
+    for name, (profile_jobs, profile_avoid) in profiles.items():
+
+        suffix, label = profile_names(name)
+
+        if STREAM or STORE:
+            totals = profile_totals[name]
+            n_interest = totals['jobs']
+            found_jobs_per_year_dict = totals['years']
+            interest_dates = totals['dates']
+            interest_organisations = totals['organisations']
+
+        else:
+            # Export just the data of interest, with the columns for this profile's search terms
+            profile_columns = data_columns + [job for job in dict.fromkeys(profile_jobs) if job not in data_columns]
+            df_interest=enhance(df[profile_columns], profile_jobs, profile_avoid, all_matches[name])
+
+            # Export enhanced data
+            write_jobs(df_interest,
+                       OUTRESULTSPATH + '3_identified_jobs' + suffix + '_' + RESULTSDATE + RESULTSEXTENSION)
+
+            n_interest = len(df_interest)
+            found_jobs_per_year_dict = df_interest.value_counts(subset='year').to_dict()
+            interest_dates = df_interest['date'].value_counts()
+            interest_organisations = organisation_counts(df_interest)
+
+        # Logging
+        file.write('There are ' + str(n_interest) + ' jobs with the job title of interest' +
+                   (' for ' + name if name else '') + '\n \n')
+
+        # Calculate a summary of the data
+        df_summ = summarise_job_counts(found_jobs_per_year_dict, jobs_per_year_dict)
+
+        # Export data
+        export_to_csv(df_summ, OUTRESULTSPATH, '4_summary_identified_jobs' + suffix + '_' + RESULTSDATE, False)
+
+        # There's nothing to plot if none of the jobs matched
+        if n_interest == 0:
+            continue
+
+        export_to_csv(df_summ, OUTRESULTSPATH, 'jobs_by_year'+suffix+RESULTSDATE, False)
+
+        # Count the jobs per week, month and year, and make plots based on the data summary
+
+        series = job_time_series(all_dates,interest_dates,label,suffix)
+        plots += job_summary_plots(series,df_summ,label,suffix)
+
+        # Count the unique institutions advertising these jobs each year
+
+        df_institutions = institutions_per_year(interest_organisations, institution_names,
+                                                year_range(found_jobs_per_year_dict))
+        export_to_csv(df_institutions, OUTRESULTSPATH, 'unique_institutions_by_year' + suffix + '_' + RESULTSDATE,
+                      False)
+
+        # Collect salary stats on the data on a per-year basis
+
+        if STREAM or STORE:
+            salaries = sketch_stats(merge_sketches([totals['salaries'], all_totals['salaries']]),
+                                    [label, 'All Jobs'], 'year', year_range(found_jobs_per_year_dict))
+            plots += salary_plots(salaries, [label, 'All Jobs'], suffix)
+        else:
+            plots += get_salaries(df_interest,df,label,suffix)
+
+    save_institution_names(institution_names, OUTRESULTSPATH + INSTITUTION_NAMES_FILE)
+    file.write('Matched ' + str(n_new_names) + ' new organisation names to institutions, ' +
+               str(len(set(institution_names.values()) - {''})) + ' institutions are known' + '\n \n')
 
-    # Export data
-    export_to_csv(df_summ, OUTRESULTSPATH, '4_summary_identified_jobs_'+RESULTSDATE, False)
+    if PLOTS:
+        print('Drawing plots...')
+        n_drawn, n_skipped = render_plots(plots, OUTRESULTSPATH + PLOT_MANIFEST_NAME, WORKERS)
+        file.write('Drew ' + str(n_drawn) + ' plots with ' + str(WORKERS) + ' worker process(es), ' + str(n_skipped) +
+                   ' were unchanged since the last run' + '\n \n')
 
     print("--- %s seconds ---" % round((time.time() - start_time),1))
     file.write('Processing took ' + str(round((time.time() - start_time),1)) + '\n')
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import math
+import os
+import re
+
+import pandas as pd
+
+# Works out which institution each organisation name in the adverts belongs to, for the number of institutions
+# employing RSEs (Outcome Indicator 1.2.2). The organisation is whatever comes before the first '-' in the advert's
+# heading, so the same university turns up under many spellings ('univ. of bristol', 'university of bristol',
+# 'bristol university', ...).
+#
+# Each name is tidied up into a matching key (lowercase, abbreviations spelled out, punctuation and filler words
+# dropped, and the words sorted, so word order doesn't matter), and names with the same number of words are matched
+# on the character trigrams of their keys. The spellings of the institutions found so far are kept in an inverted
+# index of trigram to spelling, so a new name is only compared with the spellings which share enough of its rarer
+# trigrams to possibly match (rather than with every one), and joins the institution of the most similar one if it's
+# similar enough, or starts a new institution. Each institution is then named after its most common spelling (by the
+# number of jobs, with ties broken alphabetically), so the names come out the same however many runs the names were
+# resolved over.
+#
+# Every name resolved is kept in INSTITUTION_NAMES_FILE (a csv of organisation and institution), so the matching
+# only has to be done for names that haven't been seen before. The file can be edited by hand to fix a bad match:
+# names with the same institution in it are always counted as one institution (which is renamed after its most
+# common spelling on the next run).
+
+INSTITUTION_NAMES_FILE = 'institution_names.csv'
+
+# How alike two matching keys need to be (the Dice coefficient of their trigrams) to be the same institution
+
+MATCH_THRESHOLD = 0.85
+
+# Words which are spelled in several ways, and words which don't help tell institutions apart
+
+ABBREVIATIONS = {'univ': 'university', 'uni': 'university', 'inst': 'institute', 'coll': 'college',
+                 'st': 'saint', 'hosp': 'hospital'}
+FILLER_WORDS = {'the', 'of', 'and', 'for', 'in', 'at'}
+
+
+def matching_key(name):
+    """
+    Tidies up an organisation name into the key it's matched on
+    :param name: the organisation name from the advert
+    :return: the key, e.g. 'bristol university' for 'The Univ. of Bristol' (and "king's" becomes 'kings')
+    """
+
+    words = re.findall(r'[a-z0-9]+', str(name).lower().replace('&', ' and ').replace("'", ''))
+    words = {ABBREVIATIONS.get(word, word) for word in words} - FILLER_WORDS
+
+    return ' '.join(sorted(words))
+
+
+def trigrams(key):
+    """
+    Splits a matching key into its character trigrams
+    :param key: the matching key
+    :return: the set of trigrams (padded with spaces, so short keys still have some)
+    """
+
+    padded = '  ' + key + ' '
+
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def load_institution_names(path):
+    """
+    Loads the organisation names resolved by earlier runs
+    :param path: the path to the csv
+    :return: a dict of organisation name to institution, empty if there's no file yet
+    """
+
+    if not os.path.exists(path):
+        return {}
+
+    names = pd.read_csv(path, dtype=str, keep_default_na=False)
+
+    return dict(zip(names['organisation'], names['institution']))
+
+
+def save_institution_names(names, path):
+    """
+    Saves the resolved organisation names
+    :param names: a dict of organisation name to institution
+    :param path: the path to the csv
+    :return: nothing, saves the csv
+    """
+
+    names = pd.DataFrame({'organisation': list(names), 'institution': list(names.values())})
+    names.sort_values(['institution', 'organisation']).to_csv(path + '.tmp', index=False)
+    os.replace(path + '.tmp', path)
+
+
+def resolve_organisations(organisations, names, threshold=MATCH_THRESHOLD):
+    """
+    Works out the institution of every organisation name which isn't already known, then names each institution
+    after its most common spelling (see canonical_names)
+    :param organisations: the number of jobs with each organisation name, as a Series indexed by name (all the jobs,
+    so that the most common spellings are the same whether or not some names were resolved by earlier runs)
+    :param names: a dict of organisation name to institution, which is updated with the new names
+    :param threshold: how alike two matching keys need to be to be the same institution
+    :return: the number of new names resolved
+    """
+
+    # The inverted index of the spellings known so far (each institution has all its spellings in it, so a new
+    # name can match any of them), with the trigrams, number of words and institution of each
+    spellings = []
+    spelling_trigrams = []
+    spelling_words = []
+    index = {}
+
+    def add_spelling(key, institution):
+        grams = trigrams(key)
+        for gram in grams:
+            index.setdefault(gram, []).append(len(spellings))
+        spellings.append(institution)
+        spelling_trigrams.append(grams)
+        spelling_words.append(len(key.split()))
+
+    known = {}
+    for name, institution in names.items():
+        key = matching_key(name)
+        if key != '' and key not in known:
+            known[key] = institution
+            add_spelling(key, institution)
+
+    new_names = organisations[~organisations.index.isin(list(names))]
+    new_names = new_names.groupby(level=0).sum().sort_values(ascending=False, kind='stable')
+
+    for name in new_names.index:
+        key = matching_key(name)
+
+        # Names without any letters or numbers don't belong to an institution
+        if key == '':
+            names[name] = ''
+            continue
+
+        if key in known:
+            names[name] = known[key]
+            continue
+
+        grams = trigrams(key)
+
+        # A match has to share at least this many trigrams, so it has to share at least one of the rarest ones
+        # of the rest: only those are looked up in the index
+        needed = math.ceil(threshold * len(grams) / (2 - threshold))
+        rarest = sorted(grams, key=lambda gram: len(index.get(gram, [])))[:len(grams) - needed + 1]
+        candidates = sorted({candidate for gram in rarest for candidate in index.get(gram, [])})
+
+        # Then the candidates are compared properly. Names with a different number of words aren't the same
+        # institution however alike they are, e.g. 'university of birmingham' and 'birmingham city university'
+        best, best_score = None, threshold
+        for candidate in candidates:
+            if spelling_words[candidate] != len(key.split()):
+                continue
+            shared = len(grams & spelling_trigrams[candidate])
+            score = 2 * shared / (len(grams) + len(spelling_trigrams[candidate]))
+            if score > best_score or (best is None and score >= best_score):
+                best, best_score = candidate, score
+
+        institution = str(name).strip() if best is None else spellings[best]
+        known[key] = institution
+        add_spelling(key, institution)
+        names[name] = institution
+
+    canonical_names(names, organisations)
+
+    return len(new_names)
+
+
+def canonical_names(names, organisations):
+    """
+    Names each institution after the spelling with the most jobs (and the first alphabetically where several have
+    the same number), so the names only depend on the jobs and not on the order the names were resolved in
+    :param names: a dict of organisation name to institution, which is updated with the new institution names
+    :param organisations: the number of jobs with each organisation name, as a Series indexed by name
+    :return: nothing
+    """
+
+    counts = organisations.groupby(level=0).sum()
+    spellings = pd.DataFrame({'institution': list(names.values()),
+                              'spelling': [str(name).strip() for name in names],
+                              'jobs': counts.reindex(list(names), fill_value=0).to_numpy()})
+    spellings = spellings[spellings['institution'] != '']
+
+    spellings = spellings.groupby(['institution', 'spelling'], as_index=False)['jobs'].sum()
+    spellings = spellings.sort_values(['jobs', 'spelling'], ascending=[False, True], kind='stable')
+    renamed = spellings.drop_duplicates('institution').set_index('institution')['spelling'].to_dict()
+
+    for name, institution in names.items():
+        names[name] = renamed.get(institution, institution)
+
+
+def institutions_per_year(organisation_counts, names, years=None):
+    """
+    Counts the unique institutions in each year
+    :param organisation_counts: the number of jobs with each organisation name in each year, as a Series indexed by
+    year and organisation
+    :param names: a dict of organisation name to institution, covering every name in organisation_counts
+    :param years: the years to include (years without any jobs get 0), or None for the years in organisation_counts
+    :return: a df with a row per year, and the 'year', the number of 'unique institutions' and the number of 'jobs'
+    """
+
+    table = organisation_counts.rename('jobs').reset_index()
+    table['institution'] = table['organisation'].astype(object).map(names).replace('', None)
+
+    per_year = table.groupby('year').agg(**{'unique institutions': ('institution', 'nunique'),
+                                            'jobs': ('jobs', 'sum')})
+    if years is not None:
+        per_year = per_year.reindex(list(years), fill_value=0)
+
+    return per_year.rename_axis('year').reset_index()
@@ -0,0 +1,376 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import numpy as np
+import pandas as pd
+
+# Reads and writes the parsed job data for jobs_to_csv.py, dataset_merger.py and find_jobs.py, either as csv or
+# as parquet. Parquet keeps the column types, stores the organisation, location and role (which repeat a lot) as
+# dictionaries and lets a script read just the columns it needs, so a decade of adverts loads in a fraction of the
+# time and takes a fraction of the space of the csv. The format is picked by the file extension.
+#
+# Parquet needs pyarrow ('pip install pyarrow'), which is only imported when a parquet file is read or written, so
+# the csv files work without it.
+
+FORMATS = {'csv': '.csv', 'parquet': '.parquet'}
+
+# The types of the columns written by jobs_to_csv.py, so the csv doesn't have to be scanned to guess them. Dates
+# are ISO-8601 text, and are converted to datetimes by the scripts that need them
+
+COLUMN_DTYPES = {'filename': str, 'job title': str, 'date': str, 'year': 'Int64', 'salary': 'float64', 'role': str,
+                 'organisation': str, 'location': str, 'date text': str, 'salary text': str}
+
+# Columns with only a few thousand distinct values, which are dictionary encoded in parquet (and so read back as
+# pandas categoricals)
+
+DICTIONARY_COLUMNS = ['role', 'organisation', 'location']
+
+# The types the columns are loaded with for analysis (see load_jobs). The few thousand organisations, locations and
+# roles are repeated across millions of adverts, so they're loaded as categoricals (one copy of each name, and a
+# small code per advert) rather than as a python string per advert, and the years fit in 16 bits
+
+COMPACT_DTYPES = dict(COLUMN_DTYPES, year='Int16', **{column: 'category' for column in DICTIONARY_COLUMNS})
+
+
+def import_pyarrow():
+    """
+    Imports pyarrow, which is only needed for parquet files
+    :return: the pyarrow module, with pyarrow.parquet loaded
+    """
+
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('Reading and writing parquet files needs pyarrow, install it with "pip install pyarrow"')
+
+    return pyarrow
+
+
+def file_format(path):
+    """
+    Works out the format of a jobs file from its extension
+    :param path: the path to the file
+    :return: 'parquet' for .parquet files, otherwise 'csv'
+    """
+
+    if path.endswith(FORMATS['parquet']):
+        return 'parquet'
+
+    return 'csv'
+
+
+def parquet_type(column, inferred_type):
+    """
+    Picks the parquet type for a column
+    :param column: the name of the column
+    :param inferred_type: the type pyarrow worked out from the data, used for columns it doesn't know about
+    :return: the pyarrow type to store the column as
+    """
+
+    pa = import_pyarrow()
+
+    if column in DICTIONARY_COLUMNS:
+        return pa.dictionary(pa.int32(), pa.string())
+
+    # Dates that have already been converted to datetimes (e.g. by find_jobs.py) are kept as they are
+    if COLUMN_DTYPES.get(column) is str and not pa.types.is_timestamp(inferred_type):
+        return pa.string()
+
+    if COLUMN_DTYPES.get(column) == 'Int64':
+        return pa.int64()
+
+    if COLUMN_DTYPES.get(column) == 'float64':
+        return pa.float64()
+
+    return inferred_type
+
+
+def to_table(df):
+    """
+    Turns a df of job data into an arrow table with the column types fixed, so that every file (and every batch
+    of a file) has the same schema whatever is in it
+    :param df: the job data
+    :return: a pyarrow Table
+    """
+
+    pa = import_pyarrow()
+
+    # Blank text is stored as missing, so the data reads back the same as it would from the csv
+    text_columns = [column for column in df.columns
+                    if COLUMN_DTYPES.get(column) is str and pd.api.types.is_string_dtype(df[column])]
+    df = df.copy()
+    df[text_columns] = df[text_columns].mask(df[text_columns] == '')
+    for column in COLUMN_DTYPES:
+        if column in df.columns and COLUMN_DTYPES[column] is not str:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype(COLUMN_DTYPES[column])
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    schema = pa.schema([pa.field(field.name, parquet_type(field.name, field.type)) for field in table.schema],
+                       metadata=table.schema.metadata)
+
+    return table.cast(schema)
+
+
+def read_jobs(path, columns=None, compact=False):
+    """
+    Reads a file of job data written by any of the scripts
+    :param path: the path to a .csv or .parquet file
+    :param columns: the list of columns to read, or None to read all of them. Only these columns are read from disk
+    for parquet files, which is much quicker than reading them all (and only these are kept for csv files)
+    :param compact: if True, the columns are given the COMPACT_DTYPES rather than the COLUMN_DTYPES
+    :return: a df of the job data
+    """
+
+    dtypes = COMPACT_DTYPES if compact else COLUMN_DTYPES
+
+    if file_format(path) == 'parquet':
+        import_pyarrow()
+        df = pd.read_parquet(path, columns=columns)
+
+        # Parquet already brings the dictionary columns back as categoricals, so it's just the numbers to shrink
+        if compact:
+            numeric = {column: dtypes[column] for column in df.columns if dtypes.get(column) in ('Int16', 'float64')}
+            df = df.astype(numeric)
+
+        return df
+
+    return pd.read_csv(path, dtype=dtypes, usecols=columns)
+
+
+def iter_jobs(path, columns=None, chunk_size=100000):
+    """
+    Reads a file of job data a chunk of rows at a time, with the columns given the COMPACT_DTYPES (see load_jobs),
+    so that only one chunk is ever in memory
+    :param path: the path to a .csv or .parquet file
+    :param columns: the list of columns to read, or None to read all of them
+    :param chunk_size: the (largest) number of rows in each chunk
+    :return: a generator of dfs of the job data, in the same order as the file. The categories of the categorical
+    columns differ from chunk to chunk
+    """
+
+    if file_format(path) == 'parquet':
+        pq = import_pyarrow().parquet
+        numeric = {column: dtype for column, dtype in COMPACT_DTYPES.items() if dtype in ('Int16', 'float64')}
+        start = 0
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns):
+            df = batch.to_pandas()
+            df.index += start
+            start += len(df)
+            yield df.astype({column: dtype for column, dtype in numeric.items() if column in df.columns})
+        return
+
+    with pd.read_csv(path, dtype=COMPACT_DTYPES, usecols=columns, chunksize=chunk_size) as reader:
+        yield from reader
+
+
+def append_jobs(writers, df, path):
+    """
+    Appends a chunk of job data to a csv or parquet file, formatted the same way as write_jobs would write it. The
+    file is created (with the columns of the first chunk) the first time it's written to
+    :param writers: a dict of path to the open csv file or ParquetWriter, which is updated when a file is created
+    :param df: the chunk of job data
+    :param path: the path to the .csv or .parquet file
+    :return: nothing, writes to the file
+    """
+
+    if path not in writers:
+        if file_format(path) == 'parquet':
+            writers[path] = open_parquet_writer(path, df)
+        else:
+            writers[path] = open(path, 'w', newline='')
+            df.to_csv(writers[path], index=False)
+            return
+
+    if file_format(path) == 'parquet':
+        write_parquet_batch(writers[path], df)
+    else:
+        df.to_csv(writers[path], header=False, index=False)
+
+
+def close_writers(writers):
+    """
+    Closes all the files opened by append_jobs
+    :param writers: the dict of path to the open csv file or ParquetWriter
+    :return: nothing
+    """
+
+    for writer in writers.values():
+        writer.close()
+
+
+def memory_usage(df):
+    """
+    Works out how much memory a df takes up, including the strings it holds
+    :param df: the df
+    :return: the number of bytes
+    """
+
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def plain_memory_usage(df):
+    """
+    Works out how much memory a df loaded with load_jobs would take up if it had been loaded without the compact
+    types, i.e. with the text of every advert's organisation, location and role and with the years as 64 bit numbers.
+    The columns are converted one at a time, so this only ever needs the memory for one extra column
+    :param df: the df
+    :return: the number of bytes
+    """
+
+    n_bytes = int(df.index.memory_usage(deep=True))
+    for column in df.columns:
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(values.cat.categories.dtype)
+        elif column in COLUMN_DTYPES and COLUMN_DTYPES[column] != COMPACT_DTYPES[column]:
+            values = values.astype(COLUMN_DTYPES[column])
+        n_bytes += int(values.memory_usage(index=False, deep=True))
+
+    return n_bytes
+
+
+def parse_dates(dates):
+    """
+    Converts the date column to datetime objects. jobs_to_csv.py writes dates as ISO-8601, so they can be read with
+    a fixed format; files parsed before that have free text dates, which need the (much slower) mixed format
+    :param dates: the date column of the parsed job advert data
+    :return: the dates as datetime objects
+    """
+
+    try:
+        return pd.to_datetime(dates, format='%Y-%m-%d')
+    except ValueError:
+        return pd.to_datetime(dates, format='mixed')
+
+
+def file_columns(path):
+    """
+    Finds the columns of a file of job data without reading the data
+    :param path: the path to a .csv or .parquet file
+    :return: a list of the column names
+    """
+
+    if file_format(path) == 'parquet':
+        return import_pyarrow().parquet.read_schema(path).names
+
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def filename_hashes(filenames):
+    """
+    Hashes the filenames of some adverts, which identify them, so that adverts can be matched up quickly as numbers
+    rather than strings. The hash of a filename is the same whatever type the column was loaded as
+    :param filenames: a Series of the filenames
+    :return: a numpy array of the (64 bit) hashes
+    """
+
+    return pd.util.hash_pandas_object(filenames, index=False).to_numpy()
+
+
+def sorted_contains(sorted_hashes, hashes):
+    """
+    Checks which of some hashes are in a sorted array of hashes, with a vectorised binary search
+    :param sorted_hashes: a sorted numpy array of hashes
+    :param hashes: a numpy array of the hashes to look for
+    :return: a numpy array of True/False, True for the hashes that are in sorted_hashes
+    """
+
+    if len(sorted_hashes) == 0:
+        return np.zeros(len(hashes), dtype=bool)
+
+    places = np.minimum(np.searchsorted(sorted_hashes, hashes), len(sorted_hashes) - 1)
+
+    return sorted_hashes[places] == hashes
+
+
+def sorted_insert(sorted_hashes, hashes):
+    """
+    Adds some hashes to a sorted array of hashes. Only the new hashes are sorted, then they're slotted in, so adding
+    a few hashes to a big array doesn't sort the whole array again
+    :param sorted_hashes: a sorted numpy array of hashes
+    :param hashes: a numpy array of the hashes to add
+    :return: the sorted array with the hashes added
+    """
+
+    hashes = np.sort(hashes)
+
+    return np.insert(sorted_hashes, np.searchsorted(sorted_hashes, hashes), hashes)
+
+
+def load_jobs(path, columns=None, logfile=None):
+    """
+    Loads a file of job data for analysis, with the columns given the COMPACT_DTYPES so that it takes up as little
+    memory as possible. Used by find_jobs.py and dataset_merger.py
+    :param path: the path to a .csv or .parquet file
+    :param columns: the list of columns to read, or None to read all of them
+    :param logfile: an open log file to record the memory used by the data in, if given
+    :return: a df of the job data
+    """
+
+    df = read_jobs(path, columns=columns, compact=True)
+
+    if logfile is not None:
+        logfile.write('Loaded %i jobs from "%s" using %.1f MB of memory (%.1f MB without the compact column types)\n\n'
+                      % (len(df), path, memory_usage(df) / 1e6, plain_memory_usage(df) / 1e6))
+
+    return df
+
+
+def write_jobs(df, path):
+    """
+    Writes a df of job data in the format given by the extension of path
+    :param df: the job data
+    :param path: the path to a .csv or .parquet file
+    :return: nothing, saves the file
+    """
+
+    if file_format(path) == 'parquet':
+        import_pyarrow().parquet.write_table(to_table(df), path)
+    else:
+        df.to_csv(path, index=False)
+
+
+def open_parquet_writer(path, df):
+    """
+    Opens a parquet file to be written a batch at a time with write_parquet_batch
+    :param path: the path to the .parquet file
+    :param df: a df with the columns that will be written (e.g. the first batch)
+    :return: a pyarrow ParquetWriter, which must be closed once all the batches are written
+    """
+
+    return import_pyarrow().parquet.ParquetWriter(path, to_table(df).schema)
+
+
+def write_parquet_batch(writer, df):
+    """
+    Appends a batch of job data to a parquet file opened with open_parquet_writer
+    :param writer: the open ParquetWriter
+    :param df: the batch of job data
+    :return: nothing, writes to the file
+    """
+
+    writer.write_table(to_table(df).cast(writer.schema))
+
+
+def merge_parquet_files(paths, path):
+    """
+    Concatenates parquet files of job data with the same columns, one file at a time
+    :param paths: the list of paths to the files to merge
+    :param path: the path to save the merged file to
+    :return: the number of rows in the merged file
+    """
+
+    pq = import_pyarrow().parquet
+
+    n_rows = 0
+    writer = None
+    for current_path in paths:
+        table = pq.read_table(current_path)
+        if writer is None:
+            writer = pq.ParquetWriter(path, table.schema)
+        writer.write_table(table.cast(writer.schema))
+        n_rows += table.num_rows
+    writer.close()
+
+    return n_rows
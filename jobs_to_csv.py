@@ -3,14 +3,26 @@
 
 import pandas as pd
 from bs4 import BeautifulSoup
-import numpy as np
+import csv
 import glob
+import hashlib
+import io
+import itertools
 import os
 import re
 import sys
+import tarfile
 import time
+import zipfile
+import zlib
+from multiprocessing import Pool
 from datetime import datetime
-from collections import OrderedDict
+from collections import Counter, namedtuple
+
+from command_line import pop_option, pop_flag
+from date_parser import clean_date, iso_date, year_from_date
+from jobs_io import FORMATS, file_format, open_parquet_writer, write_parquet_batch, write_jobs, merge_parquet_files
+from salary_parser import parse_salary
 
 
 # Default values for datastore and resultspath when not specified at command line
@@ -18,417 +30,1180 @@ from collections import OrderedDict
 DATASTORE = './job_ads/'
 RESULTSPATH = './results/'
 
-# DATASTORE and RESULTSPATH can be overridden by passing these arguments when running this script on the command line,
-# e.g. 
+# Number of worker processes used to parse the adverts (1 parses them serially in this process) and the
+# number of filenames handed to a worker at a time. Override the former with '--workers N' on the command line.
+
+WORKERS = 1
+CHUNKSIZE = 64
+
+# Add '--incremental' on the command line to only parse the adverts that are new or have changed since the
+# last run. What was parsed from each advert is remembered in MANIFEST_NAME, which is kept in the RESULTSPATH
+# alongside the 1_processed_jobs_*.csv files
+
+INCREMENTAL = False
+MANIFEST_NAME = 'job_parser_manifest.csv'
+
+# Add '--stream' on the command line to write the parsed jobs to the csv BATCH_SIZE rows at a time as they are
+# parsed, rather than collecting them all in memory first
+
+STREAM = False
+BATCH_SIZE = 1000
+
+# Add '--shard i/N' on the command line to only parse the i-th of N slices of the adverts (i counts from 1), so
+# that several machines can share the work. Adverts are split between the shards by a hash of their filename, so
+# every machine agrees on which shard each advert belongs to. Each shard's results are saved with SHARD_ROOT in
+# place of the usual '1_processed_jobs' and, once every shard has finished, '--reduce N' stitches the N of them
+# back together into a single 1_processed_jobs_*.csv
+
+SHARD = None
+REDUCE = None
+SHARD_ROOT = 'shard_{}_of_{}_processed_jobs'
+
+# Add '--format parquet' on the command line to save the results as parquet rather than csv (see jobs_io.py). The
+# manifest used by '--incremental' is always a csv
+
+FORMAT = 'csv'
+
+# The DATASTORE can also be a tar or zip archive of job adverts, or a directory of them, in which case the adverts
+# are read straight out of the archives. ArchiveMember holds an advert read from an archive (contents is None for
+# files which aren't job adverts, as they are never parsed)
+
+ARCHIVE_EXTENSIONS = ('.tar', '.tar.gz', '.tgz', '.zip')
+ArchiveMember = namedtuple('ArchiveMember', ['name', 'size', 'mtime', 'contents'])
+
+# The columns of the processed jobs csv, and the extra columns used to recognise unchanged adverts in the manifest.
+# The text of the date and salary cells is kept as it was in the advert, so that the date, year and salary can be
+# worked out again (with rederive_fields.py) without parsing the html
+
+COLUMNS = ['filename', 'job title', 'date', 'year', 'salary', 'role', 'organisation', 'location', 'date text',
+           'salary text']
+MANIFEST_COLUMNS = ['size', 'mtime', 'hash']
+
+# DATASTORE and RESULTSPATH can be overridden by passing these arguments when running this script on the command line
+# (or to main, when it's imported), e.g. 
 #  > python jobs_to_csv.py ./job_ads_simon ./simon_results
+#
+# where ./job_ads_simon can also be an archive of adverts or a directory of archives, e.g.
+#  > python jobs_to_csv.py ./job_ads_2023-09.tar.gz ./simon_results
+#
+# Add '--workers N' to parse the adverts across N processes, e.g.
+#  > python jobs_to_csv.py ./job_ads_simon ./simon_results --workers 8
+#
+# and '--incremental' to reuse the results for adverts that haven't changed since the last run, e.g.
+#  > python jobs_to_csv.py ./job_ads_simon ./simon_results --incremental
+#
+# and '--stream' to write the results as they are parsed, which keeps the memory use flat, e.g.
+#  > python jobs_to_csv.py ./job_ads_simon ./simon_results --stream
+#
+# and '--shard i/N' to parse one slice of the adverts, then '--reduce N' to stitch the slices together, e.g.
+#  > python jobs_to_csv.py ./job_ads_simon ./simon_results --shard 1/2
+#  > python jobs_to_csv.py ./job_ads_simon ./simon_results --shard 2/2
+#  > python jobs_to_csv.py ./job_ads_simon ./simon_results --reduce 2
+#
+# and '--format parquet' to save the results as parquet, e.g.
+#  > python jobs_to_csv.py ./job_ads_simon ./simon_results --format parquet
+
+
+def parse_shard(shard):
+    """
+    Reads the value given for '--shard'
+    :param shard: a string of the form 'i/N'
+    :return: a tuple of i and N
+    """
+
+    try:
+        shard_number, n_shards = (int(value) for value in shard.split('/'))
+    except ValueError:
+        raise ValueError('--shard must be given as i/N, e.g. 1/4')
+
+    if not 1 <= shard_number <= n_shards:
+        raise ValueError('--shard i/N needs i to be between 1 and N')
 
-in_args=sys.argv
+    return shard_number, n_shards
 
-if len(in_args)<3:
 
-    pass
+def parse_args(argv):
+    """
+    Sets the global config values (DATASTORE, RESULTSPATH, WORKERS, etc) from the command line arguments. Anything
+    that isn't given goes back to its default
+    :param argv: the list of command line arguments, without the name of the script
+    :return: nothing, sets the global config values
+    """
+
+    global DATASTORE, RESULTSPATH, WORKERS, INCREMENTAL, STREAM, SHARD, REDUCE, FORMAT
+
+    args = list(argv)
+
+    WORKERS = int(pop_option(args, '--workers', 1))
+    INCREMENTAL = pop_flag(args, '--incremental')
+    STREAM = pop_flag(args, '--stream')
+    SHARD = pop_option(args, '--shard', None)
+    REDUCE = pop_option(args, '--reduce', None)
+    FORMAT = pop_option(args, '--format', 'csv')
+
+    if FORMAT not in FORMATS:
+        raise ValueError('--format must be one of: ' + ', '.join(FORMATS))
+
+    if SHARD is not None:
+        SHARD = parse_shard(SHARD)
+
+    if REDUCE is not None:
+        REDUCE = int(REDUCE)
+
+    if len(args)<2:
+
+        DATASTORE = './job_ads/'
+        RESULTSPATH = './results/'
 
-else:
+    else:
 
-    # Dont change these values, these are for the command-line override
+        # Dont change these values, these are for the command-line override
 
-    DATASTORE = in_args[1]
-    RESULTSPATH = in_args[2]
+        DATASTORE = args[0]
+        RESULTSPATH = args[1]
 
 
 # ---------------------------------------------------
 
-def find_files():
+def is_archive(path):
     """
-    Goes through the DATASTORE directory and collects names of all the files
-    :return: a list of all files
+    Checks whether a file is one of the archives the job adverts can be stored in
+    :param path: the path to a file
+    :return: True if the file is a tar or zip archive
     """
 
-    list_of_adverts = glob.glob(DATASTORE + '*')
+    return path.endswith(ARCHIVE_EXTENSIONS)
 
-    return list_of_adverts
 
+def in_shard(filename, shard):
+    """
+    Checks whether a file belongs to a shard. The filename is hashed with crc32, which (unlike Python's hash) is
+    the same on every machine and every run
+    :param filename: the filename of the file, without any directories
+    :param shard: a tuple of the shard number and the number of shards, or None if the adverts aren't sharded
+    :return: True if the file belongs to the shard
+    """
+
+    if shard is None:
+        return True
+
+    shard_number, n_shards = shard
+
+    return zlib.crc32(filename.encode('utf-8')) % n_shards == shard_number - 1
 
-def export_to_csv(df, location, filename, index_write):
+
+def iter_archive(path, shard=None):
     """
-    Exports a df to a csv file
-    :params: a df and a location in which to save it
-    :return: nothing, saves a csv
+    Streams the files out of a tar or zip archive without extracting them. Only the files with a job advert
+    filename are read, the rest are handed back without their contents
+    :param path: the path to the archive
+    :param shard: a tuple of the shard number and the number of shards, if only one shard of the files is wanted
+    :return: a generator of ArchiveMembers, one per file in the archive (or in the shard)
     """
 
-    return df.to_csv(location + filename + '.csv', index=index_write)
+    if path.endswith('.zip'):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not in_shard(os.path.basename(info.filename), shard):
+                    continue
+                contents = archive.read(info) if ADVERT_FILENAME.match(os.path.basename(info.filename)) else None
+                mtime = int(time.mktime(info.date_time + (0, 0, -1))) * 10**9
+                yield ArchiveMember(info.filename, info.file_size, mtime, contents)
+
+    else:
+        # Open the tar as a stream so that compressed archives are only decompressed once, front to back
+        with tarfile.open(path, 'r|*') as archive:
+            for info in archive:
+                if not info.isfile() or not in_shard(os.path.basename(info.name), shard):
+                    continue
+                if ADVERT_FILENAME.match(os.path.basename(info.name)):
+                    contents = archive.extractfile(info).read()
+                else:
+                    contents = None
+                yield ArchiveMember(info.name, info.size, int(info.mtime) * 10**9, contents)
 
 
-def read_html(list_of_adverts):
+def iter_directory(directory):
     """
-    Goes through the list of job adverts in the DATASTORE dir, extracts the data I need and adds it to a df
-    :param list_of_adverts: a list of the job advert filenames
-    :return: a df with a data extracted from job adverts (titles, start date, location, etc)
+    Lists the files in a directory as it reads the directory, rather than building the whole list first (which
+    takes minutes for a huge directory on a network filesystem). Like glob, hidden files are skipped
+    :param directory: the path to the directory
+    :return: a generator of the paths of the files in the directory
     """
 
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.name.startswith('.') and entry.is_file():
+                yield entry.path
 
-    def find_title(advert):
-        """
-        Find the title from the job advert
-        :param advert: the beatiful soup parsed version of an advert
-        :return: a job title
-        """
-        try:
-            title = advert.find('h1').text
-            if len(title) == 0:
-                title = ''
-        except:
-            title = ''
-            pass
-
-        if title != '':
-            title = re.sub(clean_lb, '', title)
-            title = title.lower()
-
-        return title
-
-
-    def find_date(advert):
-        """
-        Find the date on which the advert was placed
-        :param advert: the beautiful soup parsed version of an advert
-        :return: a date on which the advert was placed
-        """
-        try:
-            date = advert.find('td', string='Placed on:').find_next_sibling('td').text.replace('th','').replace('1st','1').replace('2nd','2').replace('3rd','3')
-        except:
-            date = ''
-            pass
-
-        try:
-            try_date = advert.find('th', string='Placed On:').find_next_sibling('td').text
-            # Only replace the date if the previous date is '' (i.e. don't overwrite
-            # a valid date from the last 'try'
-            if date == '':
-                date = try_date.replace('th','').replace('1st','1').replace('2nd','2').replace('3rd','3')
-        except:
-            pass
-
-        return date
-
-
-    def find_role(advert):
-        """
-        Find the role (i.e. the job family) in the advert
-        :param advert: the beautiful soup parsed version of an advert
-        :return: the role from the advert
-        """
-        try:
-            role = advert.find('p', string='Type / Role:').find_next_sibling('p').text
-            role = re.sub(clean_lb, '', role)
-        except:
-            role = ''
-            pass
-
-        try:
-            try_role = advert.find('p', string='Type / Role:').find_next('a').text
-            # Only replace the role if the previous role is zero (i.e. don't overwrite
-            # a valid date from the last 'try'
-            if role == '':
-                role = try_role
-        except:
-            pass
-
-        try:
-            try_role = \
-            advert.find('b', string='Type / Role:').find_next('div', {'class': 'j-form-input ie-11-width'}).find_next(
-                'input').attrs['value']
-            # Only replace the role if the previous role is zero (i.e. don't overwrite
-            # a valid date from the last 'try'
-            if role == '':
-                role = try_role
-        except:
-            pass
-
-        try:
-            try_role = \
-            advert.find('p', string='Type / Role:').find_next('div', {'class': 'j-form-input ie-11-width'}).find_next(
-                'input').attrs['value']
-            # Only replace the role if the previous role is zero (i.e. don't overwrite
-            # a valid date from the last 'try'
-            if role == '':
-                role = try_role
-        except:
-            pass
-
-        if role !='':
-            role = re.sub(clean_lb, '', role)
-            role = role.lower()
-
-        return role
-
-
-    def find_organisation(advert):
-        """
-        Find the organisation (i.e. the university where the job is based) in the advert
-        :param advert: the beatiful soup parsed version of an advert
-        :return: the organisation from the advert
-        """
-        try:
-            organisation = advert.find('h3').text.split('-',1)[0]
-        except:
-            organisation = ''
-            pass
-
-        if organisation !='':
-            organisation = re.sub(clean_lb, '', organisation)
-            organisation = organisation.lower()
-
-        return organisation
-
-    def find_location(advert):
-        """
-        Find the location (i.e. the city where the job is based) in the advert
-        :param advert: the beatiful soup parsed version of an advert
-        :return: the location from the advert
-        """
-        try:
-            location = advert.find('td', string='Location:').find_next_sibling('td').text
-        except:
-            location = ''
-            pass
-
-        try:
-            try_location = advert.find('th', string='Location:').find_next_sibling('td').text
-            if location == '':
-                location = try_location
-        except:
-            pass
-
-        if location !='':
-            location = re.sub(clean_lb, '', location)
-            location = location.lower()
-            location = location.strip()
-
-        return location
-
-
-    def find_salary(advert):
-        """
-        Find the salary
-        :param advert: the beautiful soup parsed version of an advert
-        :return: a text field describing salary
-        """
-        try:
-            salary = advert.find('th', string='Salary:').find_next_sibling('td').text
-        except:
-            return ''
-
-        # Remove carriage returns, tabs, brackets,slashes and commas
-        salary_string = salary.replace('\n', ' ').replace('\t', ' ').replace(',', '').replace('(',' ').replace(')',' ')
-
-        # Remove spaces either side of dashes and slashes to better locate salary ranges,
-        # convert slashes into dashes so they will be treated the same (e.g. 10000-30000 and
-        # 10000/30000 will both be treated as 20000).
-        salary_string = salary_string.replace('- ','-').replace(' -','-')
-        salary_string = salary_string.replace(' /','-').replace('/ ','-').replace('/','-')
-
-        # Define function to search for and extract salaries from a string when given an
-        # arbitrary currency code or symbol to search for
-
-        def extract_values_by_currency(salary_string,currency_symbol,conversion=1):
-
-            salary_strings = salary_string.split(currency_symbol)[1:]
-            salaries=[]
-
-            # For each value appearing after that symbol...
-            for salary in salary_strings:
-
-                # Get numeric value immediately after currency sign
-                salary=salary.strip().split(' ')
-
-                # Remove any 'per annum' denotation that wasnt space-separated
-                salary_cleaned=salary[0].replace('pa','').replace('PA','').replace('p.a.','').replace('per','')
-
-                # Remove various other symbols, interpret 'xxxxx+' as just 'xxxxx'
-                salary_cleaned=salary_cleaned.replace('+','').replace('*','').replace(';','')
-
-                # Remove trailing -s (these happen when salaries are given as e.g. £30000-£40000, so both ends
-                # of the range will already be encapsulated and trailing - can be ignored)
-                salary_cleaned=salary_cleaned.strip('-')
-                
-                # Turn '40k' back into '40000', etc
-                salary_cleaned=salary_cleaned.replace('k','000').replace('K','000')
-
-                # Deal with ranges; deal with low value now, append other value onto the end of the loop list for later
-                if '-' in salary_cleaned:
-                    sc_split=salary_cleaned.split('-')
-                    salary_cleaned=sc_split[0]
-                    salary_strings.append(sc_split[1])
-
-                # If it still cant be parsed, throw it out
-
-                try:
-                    salary_value=float(salary_cleaned)
-                except:
-                    continue
 
-                # Convert to GBP
+def find_files(shard=None):
+    """
+    Goes through the DATASTORE and collects all the files. The DATASTORE can be a directory of job adverts, an
+    archive of job adverts or a directory of archives (or a mixture of adverts and archives)
+    :param shard: a tuple of the shard number and the number of shards, if only one shard of the files is wanted
+    :return: a generator of all files (or all files in the shard), as paths for files on disk and ArchiveMembers
+    for files in archives
+    """
 
-                salary_gbp=salary_value*conversion
+    if os.path.isfile(DATASTORE):
+        list_of_paths = [DATASTORE]
+    else:
+        list_of_paths = iter_directory(DATASTORE)
 
-                # Do not save small numbers which relate to grades or hourly pay
+    for path in list_of_paths:
+        if is_archive(path):
+            yield from iter_archive(path, shard)
+        elif in_shard(os.path.basename(path), shard):
+            yield path
 
-                if salary_gbp<=12000:
-                    continue
 
-                # If there's a huge salary, something has probably gone wrong, so remove these too
+# Setting up annoying text remover
+CLEAN_LB = re.compile('\n')
 
-                if salary_gbp>500000:
-                    continue
+# Job adverts have a set pattern of filename, anything else in the DATASTORE is ignored
+ADVERT_FILENAME = re.compile(r'\w\w\w\d\d\d')
 
-                salaries.append(salary_gbp)
+# The tags that hold the data I want. The title and organisation are the first h1 and h3 in the advert, the
+# rest sit next to a label cell (tag name and exact text) which has moved around between versions of the
+# jobs.ac.uk layout
 
-            # After all the fireworks, check we actually got some sane salary values out, else return ''
+LABEL_TAGS = {'h1', 'h3', 'td', 'th', 'p', 'b'}
+LABELS = {
+    ('td', 'Placed on:'),
+    ('th', 'Placed On:'),
+    ('td', 'Location:'),
+    ('th', 'Location:'),
+    ('th', 'Salary:'),
+    ('p', 'Type / Role:'),
+    ('b', 'Type / Role:'),
+}
+ROLE_INPUT_CLASS = {'class': 'j-form-input ie-11-width'}
 
-            if len(salaries)==0:
-                return ''
 
-            else:
-                return np.mean(salaries)
+# The find_* functions each search the whole advert for one field. parse_advert uses extract_fields (below),
+# which gets the same results from a single walk of the tree; these are kept as the reference it is checked
+# against in benchmark_parsing.py
 
-        # Create a dictionary of currencies to scan for with their conversion rates
+def find_title(advert):
+    """
+    Find the title from the job advert
+    :param advert: the beatiful soup parsed version of an advert
+    :return: a job title
+    """
+    try:
+        title = advert.find('h1').text
+        if len(title) == 0:
+            title = ''
+    except:
+        title = ''
+        pass
 
-        # Format: tuple of symbols, conversion rate from currency to GBP  They will be looked for in this order,
-        # so keep USD near the bottom so '$' doesnt trigger for 'AUS $', for example
+    if title != '':
+        title = re.sub(CLEAN_LB, '', title)
+        title = title.lower()
 
-        # Currencies based on interatively looking through unparseable files to see what could scoop more values.
-        # Exchange rates from xe.com in Sep 2023
+    return title
 
-        currencies=OrderedDict()
-        currencies[('£','GBP')]=1
-        currencies[('€','EUR')]=0.85
-        currencies[('SEK')]=0.07
-        currencies[('DKK')]=0.11
-        currencies[('CHF')]=0.90
-        currencies[('MOP')]=0.098 # Macau
-        currencies[('RMB')]=0.11
-        currencies[('JPY')]=0.0054
-        currencies[('A$','AUD$','AUD $','AUD')]=0.51
-        currencies[('CAD$','CAD $','CAD')]=0.58
-        currencies[('HKD$','HK $','HKD')]=0.10
-        currencies[('NZD$','NZD $','NZD')]=0.47
-        currencies[('S$','SGD$','SGD $','SGD')]=0.58
-        currencies[('Col$','COP')]=0.00019
-        currencies[('USD$','USD','$')]=0.79
 
-        # Run the currency scanner for all currencies listed
+def find_date(advert):
+    """
+    Find the date on which the advert was placed
+    :param advert: the beautiful soup parsed version of an advert
+    :return: a date on which the advert was placed
+    """
+    try:
+        date = advert.find('td', string='Placed on:').find_next_sibling('td').text.replace('th','').replace('1st','1').replace('2nd','2').replace('3rd','3')
+    except:
+        date = ''
+        pass
 
-        for currency in currencies:
-            conversion=currencies[currency]
-            for symbol in currency:
-                if symbol in currency:
-                    salary=extract_values_by_currency(salary_string,symbol,conversion)
+    try:
+        try_date = advert.find('th', string='Placed On:').find_next_sibling('td').text
+        # Only replace the date if the previous date is '' (i.e. don't overwrite
+        # a valid date from the last 'try'
+        if date == '':
+            date = try_date.replace('th','').replace('1st','1').replace('2nd','2').replace('3rd','3')
+    except:
+        pass
 
-                    # If salary succesfully found, return it and dont run the rest of the tests
+    return date
 
-                    if salary!='':
-                        return salary
-                else:
-                    continue
 
-        # If no symbols yielded sane results, return empty string
+def find_role(advert):
+    """
+    Find the role (i.e. the job family) in the advert
+    :param advert: the beautiful soup parsed version of an advert
+    :return: the role from the advert
+    """
+    try:
+        role = advert.find('p', string='Type / Role:').find_next_sibling('p').text
+        role = re.sub(CLEAN_LB, '', role)
+    except:
+        role = ''
+        pass
+
+    try:
+        try_role = advert.find('p', string='Type / Role:').find_next('a').text
+        # Only replace the role if the previous role is zero (i.e. don't overwrite
+        # a valid date from the last 'try'
+        if role == '':
+            role = try_role
+    except:
+        pass
+
+    try:
+        try_role = \
+        advert.find('b', string='Type / Role:').find_next('div', {'class': 'j-form-input ie-11-width'}).find_next(
+            'input').attrs['value']
+        # Only replace the role if the previous role is zero (i.e. don't overwrite
+        # a valid date from the last 'try'
+        if role == '':
+            role = try_role
+    except:
+        pass
+
+    try:
+        try_role = \
+        advert.find('p', string='Type / Role:').find_next('div', {'class': 'j-form-input ie-11-width'}).find_next(
+            'input').attrs['value']
+        # Only replace the role if the previous role is zero (i.e. don't overwrite
+        # a valid date from the last 'try'
+        if role == '':
+            role = try_role
+    except:
+        pass
+
+    if role !='':
+        role = re.sub(CLEAN_LB, '', role)
+        role = role.lower()
+
+    return role
+
+
+def find_organisation(advert):
+    """
+    Find the organisation (i.e. the university where the job is based) in the advert
+    :param advert: the beatiful soup parsed version of an advert
+    :return: the organisation from the advert
+    """
+    try:
+        organisation = advert.find('h3').text.split('-',1)[0]
+    except:
+        organisation = ''
+        pass
 
+    if organisation !='':
+        organisation = re.sub(CLEAN_LB, '', organisation)
+        organisation = organisation.lower()
+
+    return organisation
+
+def find_location(advert):
+    """
+    Find the location (i.e. the city where the job is based) in the advert
+    :param advert: the beatiful soup parsed version of an advert
+    :return: the location from the advert
+    """
+    try:
+        location = advert.find('td', string='Location:').find_next_sibling('td').text
+    except:
+        location = ''
+        pass
+
+    try:
+        try_location = advert.find('th', string='Location:').find_next_sibling('td').text
+        if location == '':
+            location = try_location
+    except:
+        pass
+
+    if location !='':
+        location = re.sub(CLEAN_LB, '', location)
+        location = location.lower()
+        location = location.strip()
+
+    return location
+
+
+def find_salary(advert):
+    """
+    Find the salary
+    :param advert: the beautiful soup parsed version of an advert
+    :return: a text field describing salary
+    """
+    try:
+        salary = advert.find('th', string='Salary:').find_next_sibling('td').text
+    except:
         return ''
 
+    return parse_salary(salary)
+
+
+def collect_labels(advert):
+    """
+    Walks the parsed advert once and picks out the first h1 and h3 and the first of each of the LABELS, which
+    is what the find_* functions would each have found with a search of the whole tree
+    :param advert: the beautiful soup parsed version of an advert
+    :return: a dict of 'h1', 'h3' or (tag name, label text) to the matching tag
+    """
+
+    labels = {}
+    n_wanted = len(LABELS) + 2
+
+    for tag in advert.descendants:
+        name = tag.name
+        if name not in LABEL_TAGS:
+            continue
+
+        if name == 'h1' or name == 'h3':
+            key = name
+        else:
+            key = (name, tag.string)
+            if key not in LABELS:
+                continue
 
-    big_data_list = []
+        if key not in labels:
+            labels[key] = tag
+
+            # Every old and new layout label turning up in one advert is unlikely, but no need to carry on if it does
+            if len(labels) == n_wanted:
+                break
+
+    return labels
+
+
+def next_text(label, name):
+    """
+    Gets the text of the next sibling tag of a label cell
+    :param label: a label tag from collect_labels (or None if the advert didn't have it)
+    :param name: the tag name of the sibling that holds the value
+    :return: the text of the sibling, or None if there isn't one
+    """
+
+    if label is None:
+        return None
+
+    value = label.find_next_sibling(name)
+    if value is None:
+        return None
+
+    return value.text
+
+
+def role_input_value(label):
+    """
+    Gets the role from the form input which follows the 'Type / Role:' label in some layouts
+    :param label: a 'Type / Role:' label tag from collect_labels (or None if the advert didn't have it)
+    :return: the value of the input, or None if there isn't one
+    """
+
+    if label is None:
+        return None
+
+    div = label.find_next('div', ROLE_INPUT_CLASS)
+    if div is None:
+        return None
+
+    role_input = div.find_next('input')
+    if role_input is None:
+        return None
+
+    return role_input.attrs.get('value')
+
+
+def generic_fields(labels):
+    """
+    Finds the date, role and location from whichever labels the advert has, trying each historical layout in
+    turn. This copes with any mix of labels, so it's used for adverts whose layout isn't recognised
+    :param labels: the labels found in the advert by collect_labels
+    :return: a tuple of the uncleaned date, role and location text
+    """
+
+    # Date, which is in a td label in older adverts and a th label in newer ones
+    date = next_text(labels.get(('td', 'Placed on:')), 'td')
+    if not date:
+        date = next_text(labels.get(('th', 'Placed On:')), 'td')
+
+    # Role, which has been a paragraph, a link and a form input over the years
+    p_role_label = labels.get(('p', 'Type / Role:'))
+
+    role = next_text(p_role_label, 'p')
+    if role:
+        role = CLEAN_LB.sub('', role)
+
+    if not role and p_role_label is not None:
+        role_link = p_role_label.find_next('a')
+        if role_link is not None:
+            role = role_link.text
+
+    if not role:
+        role = role_input_value(labels.get(('b', 'Type / Role:')))
+
+    if not role:
+        role = role_input_value(p_role_label)
+
+    # Location, which is in a td label in older adverts and a th label in newer ones
+    location = next_text(labels.get(('td', 'Location:')), 'td')
+    if not location:
+        location = next_text(labels.get(('th', 'Location:')), 'td')
+
+    return date, role, location
+
+
+def td_table_fields(labels):
+    """
+    Finds the date, role and location in the older layout, where the labels are td cells and the role is the
+    paragraph after the 'Type / Role:' paragraph
+    :param labels: the labels found in the advert by collect_labels
+    :return: a tuple of the uncleaned date, role and location text, or None if any of them are missing (in which
+    case the advert needs the generic extractor)
+    """
+
+    date = next_text(labels[('td', 'Placed on:')], 'td')
+    role = next_text(labels[('p', 'Type / Role:')], 'p')
+    location = next_text(labels[('td', 'Location:')], 'td')
+
+    if not date or not role or not location or not CLEAN_LB.sub('', role):
+        return None
+
+    return date, role, location
+
+
+def th_table_fields(labels):
+    """
+    Finds the date, role and location in the newer layout, where the labels are th cells and the role is a form
+    input after a bold 'Type / Role:'
+    :param labels: the labels found in the advert by collect_labels
+    :return: a tuple of the uncleaned date, role and location text, or None if any of them are missing (in which
+    case the advert needs the generic extractor)
+    """
+
+    date = next_text(labels[('th', 'Placed On:')], 'td')
+    role = role_input_value(labels[('b', 'Type / Role:')])
+    location = next_text(labels[('th', 'Location:')], 'td')
+
+    if not date or not role or not location:
+        return None
+
+    return date, role, location
+
+
+# The known jobs.ac.uk layouts: the labels which identify the layout (the salary label is the same in all of
+# them so it's ignored) and the extractor for adverts in that layout. Anything else goes to generic_fields
+
+LAYOUTS = {
+    'td-table': (frozenset([('td', 'Placed on:'), ('td', 'Location:'), ('p', 'Type / Role:')]), td_table_fields),
+    'th-table': (frozenset([('th', 'Placed On:'), ('th', 'Location:'), ('b', 'Type / Role:')]), th_table_fields),
+}
+LAYOUT_SIGNATURES = {signature: layout for layout, (signature, _) in LAYOUTS.items()}
+GENERIC_LAYOUT = 'generic'
+
+
+def detect_layout(labels):
+    """
+    Works out which version of the jobs.ac.uk layout an advert uses from the labels it contains
+    :param labels: the labels found in the advert by collect_labels
+    :return: the name of the layout in LAYOUTS, or GENERIC_LAYOUT if it isn't one of them
+    """
+
+    signature = frozenset(key for key in labels if key in LABELS and key != ('th', 'Salary:'))
+
+    return LAYOUT_SIGNATURES.get(signature, GENERIC_LAYOUT)
+
+
+def extract_fields(advert):
+    """
+    Finds the title, date, salary, role, organisation and location in an advert. Gives the same results as the
+    find_* functions, but works from a single walk of the tree (see collect_labels) rather than a dozen searches,
+    and only looks where the advert's layout puts each field
+    :param advert: the beautiful soup parsed version of an advert
+    :return: a tuple of title, date, salary, role, organisation and location, a tuple of the raw text of the
+    date and salary cells (None if the advert doesn't have them) and the name of the layout the fields were
+    extracted with
+    """
+
+    labels = collect_labels(advert)
+
+    # Date, role and location are where the layout changed, so get them with the extractor for the layout
+    layout = detect_layout(labels)
+    fields = None
+
+    if layout != GENERIC_LAYOUT:
+        fields = LAYOUTS[layout][1](labels)
+
+    if fields is None:
+        layout = GENERIC_LAYOUT
+        fields = generic_fields(labels)
+
+    date, role, location = fields
+    date_text = date
+
+    # Title
+    title = labels['h1'].text if 'h1' in labels else ''
+
+    if title != '':
+        title = CLEAN_LB.sub('', title)
+        title = title.lower()
+
+    # Date
+    date = clean_date(date) if date else ''
+
+    # Salary
+    salary_text = next_text(labels.get(('th', 'Salary:')), 'td')
+    salary = parse_salary(salary_text) if salary_text is not None else ''
+
+    # Role
+    if role:
+        role = CLEAN_LB.sub('', role)
+        role = role.lower()
+    else:
+        role = ''
+
+    # Organisation, which is the start of the h3
+    organisation = labels['h3'].text.split('-',1)[0] if 'h3' in labels else ''
+
+    if organisation != '':
+        organisation = CLEAN_LB.sub('', organisation)
+        organisation = organisation.lower()
+
+    # Location
+    if location:
+        location = CLEAN_LB.sub('', location)
+        location = location.lower()
+        location = location.strip()
+    else:
+        location = ''
+
+    return (title, date, salary, role, organisation, location), (date_text, salary_text), layout
+
+
+def source_filename(source):
+    """
+    Gets the filename of a job advert, whether it's a file in the DATASTORE dir or a member of an archive
+    :param source: a path to a file or an ArchiveMember (see find_files)
+    :return: the filename, without any directories
+    """
 
-    # Setting up annoying text remover
-    clean_lb = re.compile('\n')
+    if isinstance(source, ArchiveMember):
+        return os.path.basename(source.name)
+
+    return os.path.basename(source)
+
+
+def source_details(source):
+    """
+    Gets the size and modification time of a job advert, which are used to spot unchanged adverts
+    :param source: a path to a file or an ArchiveMember (see find_files)
+    :return: the size in bytes and the modification time in nanoseconds, both as strings
+    """
+
+    if isinstance(source, ArchiveMember):
+        return str(source.size), str(source.mtime)
+
+    stats = os.stat(source)
+
+    return str(stats.st_size), str(stats.st_mtime_ns)
+
+
+def read_source(source):
+    """
+    Reads the raw contents of a job advert
+    :param source: a path to a file or an ArchiveMember (see find_files)
+    :return: the contents as bytes
+    """
+
+    if isinstance(source, ArchiveMember):
+        return source.contents
+
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+def decode_contents(contents):
+    """
+    Turns the raw contents of a job advert into text, in the same way as opening the file in text mode would
+    :param contents: the contents of the advert as bytes
+    :return: the contents as a string
+    """
+
+    return io.TextIOWrapper(io.BytesIO(contents)).read()
+
+
+def parse_contents(filename, contents):
+    """
+    Extracts the data I need from the text of a single job advert
+    :param filename: the filename of the advert
+    :param contents: the html of the advert
+    :return: a list of the data extracted from the advert and the layout of the advert
+    """
+
+    data = []
+    data.append(filename)
+
+    advert = BeautifulSoup(contents, 'lxml')
+
+    #Extract info I want
+    (title, _, salary, role, organisation, location), (date_text, salary_text), layout = extract_fields(advert)
+
+    # Normalise the date to ISO-8601 and get the year (as an integer) from it, so that later stages don't have
+    # to work out the format of each date
+    date = iso_date(date_text) if date_text else ''
+    year = year_from_date(date, date_text or '')
+
+    # Add the info to the data list
+    data.append(title)
+    data.append(date)
+    data.append(year)
+    data.append(salary)
+    data.append(role)
+    data.append(organisation)
+    data.append(location)
+    data.append(date_text)
+    data.append(salary_text)
+
+    return data, layout
+
+
+def parse_advert(source):
+    """
+    Extracts the data I need from a single job advert. This lives at module level (rather than inside read_html)
+    so that it can be handed to a pool of worker processes
+    :param source: a path to a file in the DATASTORE dir or an ArchiveMember (see find_files)
+    :return: a list of the data extracted from the advert (just the filename if the file isn't a job advert)
+    and the layout of the advert (None if the file isn't a job advert)
+    """
+
+    filename = source_filename(source)
+
+    # Check if the file is one of the job adverts (which have
+    # a set patern of filename
+    if not ADVERT_FILENAME.match(filename):
+        return [filename], None
+
+    if isinstance(source, ArchiveMember):
+        contents = decode_contents(source.contents)
+    else:
+        with open(source, "r") as f:
+            contents = f.read()
+
+    return parse_contents(filename, contents)
+
+
+def iter_pool(function, items, workers=1):
+    """
+    Applies a function to each item, across a pool of worker processes if more than one worker is wanted
+    :param function: a module level function (so that it can be sent to the workers)
+    :param items: an iterable of the items to apply it to
+    :param workers: the number of processes to use
+    :return: a generator of the results, in the same order as the items
+    """
+
+    if workers <= 1:
+        yield from map(function, items)
+        return
+
+    pool = Pool(workers)
+
+    # imap would pull every item into its task queue straight away, which for adverts streamed out of an archive
+    # means holding the whole archive in memory. So the items are handed over a window at a time, with the next
+    # window queued up while the results of the current one are collected
+    window_size = CHUNKSIZE * workers * 4
+    items = iter(items)
+
+    try:
+        window = list(itertools.islice(items, window_size))
+        results = pool.imap(function, window, chunksize=CHUNKSIZE)
+
+        while window:
+            window = list(itertools.islice(items, window_size))
+            next_results = pool.imap(function, window, chunksize=CHUNKSIZE) if window else None
+
+            yield from results
+
+            results = next_results
+
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def iter_parsed_adverts(list_of_adverts, workers=1, layout_counts=None):
+    """
+    Goes through the job adverts in the DATASTORE and extracts the data I need from each, handing back each
+    advert's data as soon as it's ready
+    :param list_of_adverts: an iterable of the job adverts (see find_files)
+    :param workers: the number of processes to parse the adverts with. The rows come back in the same order
+    as list_of_adverts whatever the number of workers
+    :param layout_counts: a Counter which, if given, is updated with the number of adverts parsed in each layout
+    :return: a generator of lists of the data extracted from each advert (see parse_advert)
+    """
 
     # Set up a counter to print on screen and assure me that everything's working
     sanity_counter=0
 
     # Go through all the ads and extract the data I need
-    for current_ad in list_of_adverts:
+    for data, layout in iter_pool(parse_advert, list_of_adverts, workers):
         sanity_counter+=1
-        data = []
-        filename = os.path.basename(current_ad)
-        data.append(filename)
-
-        # Check if the file is one of the job adverts (which have
-        # a set patern of filename
-        if re.match(r'\w\w\w\d\d\d', filename):
-
-            with open(current_ad, "r") as f:
-                contents = f.read()
-                advert = BeautifulSoup(contents, 'lxml')
-
-                #Extract info I want
-                title = find_title(advert)
-                date = find_date(advert)
-                salary = find_salary(advert)
-
-                # Extract year directly from date variable (there's two forms of date, hence the if)
-                if date=='':
-                    year = ''
-                elif '-' in date:
-                    year = str(date)[:4]
-                else:
-                    year = str(date)[-4:]
 
-                role = find_role(advert)
-                organisation = find_organisation(advert)
-                location = find_location(advert)
+        if layout_counts is not None and layout is not None:
+            layout_counts[layout] += 1
 
-                # Add the info to the data list
-                data.append(title)
-                data.append(date)
-                data.append(year)
-                data.append(salary)
-                data.append(role)
-                data.append(organisation)
-                data.append(location)
-
-        # Add data to a list of lists which will later be transformed into a df
-        big_data_list.append(data)
+        yield data
 
         # Not drowning but waving output for my sanity
         print('Processed ' + str(sanity_counter) + ' jobs', end='\r')
 
-    df = pd.DataFrame.from_records(big_data_list)
-    df.columns = ['filename', 'job title', 'date', 'year', 'salary', 'role', 'organisation', 'location']
+
+def rows_to_df(rows):
+    """
+    Turns the data extracted from the job adverts into a df
+    :param rows: an iterable of lists of the data extracted from each advert (see parse_advert)
+    :return: a df with a data extracted from job adverts (titles, start date, location, etc)
+    """
+
+    # Add data to a list of lists which is then transformed into a df
+    big_data_list = list(rows)
+    df = pd.DataFrame.from_records(big_data_list, columns=COLUMNS)
+
+    # Give the year and salary fixed types, so they're written as e.g. 2019 and 35000.0 (rather than 2019.0 when
+    # some adverts have no year) and can be read back with fixed dtypes
+    df['year'] = pd.to_numeric(df['year'], errors='coerce').astype('Int64')
+    df['salary'] = pd.to_numeric(df['salary'], errors='coerce').astype('float64')
 
     return df
 
 
-def main():
+def read_html(list_of_adverts, workers=1, layout_counts=None):
+    """
+    Goes through the list of job adverts in the DATASTORE dir, extracts the data I need and adds it to a df
+    :param list_of_adverts: an iterable of the job adverts (see find_files)
+    :param workers: the number of processes to parse the adverts with. The rows come back in the same order
+    as list_of_adverts whatever the number of workers
+    :param layout_counts: a Counter which, if given, is updated with the number of adverts parsed in each layout
+    :return: a df with a data extracted from job adverts (titles, start date, location, etc)
+    """
+
+    return rows_to_df(iter_parsed_adverts(list_of_adverts, workers, layout_counts))
+
+
+def is_missing_data(data):
+    """
+    Checks whether the data extracted from an advert lacks both a title and a date
+    :param data: a list of the data extracted from an advert (see parse_advert)
+    :return: True if both the title and the date are blank
+    """
+
+    return len(data) == len(COLUMNS) and data[1] == '' and data[2] == ''
+
+
+def is_unreadable_date(data):
+    """
+    Checks whether an advert has a date which couldn't be read (its year is still taken from the text if it has one)
+    :param data: a list of the data extracted from an advert (see parse_advert)
+    :return: True if there's text in the date cell but no date
+    """
+
+    return len(data) == len(COLUMNS) and data[2] == '' and bool(data[COLUMNS.index('date text')])
+
+
+def write_batch(writer, batch, header):
+    """
+    Appends a batch of parsed jobs to an open csv or parquet file, formatted the same way as write_jobs would write
+    them
+    :param writer: the open csv file, or the ParquetWriter for a parquet file (see jobs_io.open_parquet_writer)
+    :param batch: a list of lists of the data extracted from each advert (see parse_advert)
+    :param header: whether to write the column names first (only used for csv files)
+    :return: nothing, writes to the file
+    """
+
+    if hasattr(writer, 'write_table'):
+        write_parquet_batch(writer, rows_to_df(batch))
+    else:
+        rows_to_df(batch).to_csv(writer, header=header, index=False)
+        writer.flush()
+
+
+def stream_to_file(rows, path, batch_size):
+    """
+    Writes the data extracted from the job adverts to a csv or parquet file a batch at a time, so that only one
+    batch is held in memory. Whatever has been written to a csv so far is still usable if the run dies part way
+    through (a parquet file is only readable once it has been finished)
+    :param rows: an iterable of lists of the data extracted from each advert (see parse_advert)
+    :param path: the path to the .csv or .parquet file
+    :param batch_size: the number of rows to write at a time
+    :return: the number of rows written, the number of those missing a title and a date and the number with a date
+    that couldn't be read
+    """
+
+    n_rows = 0
+    n_invalid = 0
+    n_unreadable = 0
+    batch = []
+    header = True
+
+    if file_format(path) == 'parquet':
+        writer = open_parquet_writer(path, rows_to_df([]))
+    else:
+        writer = open(path, 'w', newline='')
+
+    try:
+        for data in rows:
+            n_rows += 1
+            if is_missing_data(data):
+                n_invalid += 1
+            if is_unreadable_date(data):
+                n_unreadable += 1
+
+            batch.append(data)
+            if len(batch) == batch_size:
+                write_batch(writer, batch, header)
+                header = False
+                batch = []
+
+        # Write whatever is left over (and the header if there were no adverts at all)
+        if len(batch) > 0 or header:
+            write_batch(writer, batch, header)
+
+    finally:
+        writer.close()
+
+    return n_rows, n_invalid, n_unreadable
+
+
+def read_manifest(manifest_file):
+    """
+    Reads the manifest written by the last incremental run
+    :param manifest_file: the path to the manifest csv
+    :return: a dict of filename to the manifest record (a dict of column to value) for that file, empty if
+    there's no manifest yet
+    """
+
+    if not os.path.exists(manifest_file):
+        return {}
+
+    # Read everything back as text so the cached rows are written out exactly as they were parsed
+    manifest = pd.read_csv(manifest_file, dtype=str, keep_default_na=False)
+
+    # A manifest from before a column was added can't fill that column in, so everything has to be parsed again
+    if not set(COLUMNS + MANIFEST_COLUMNS).issubset(manifest.columns):
+        return {}
+
+    # Likewise a manifest from before dates were normalised to ISO-8601 would bring the old style of dates back
+    if not manifest['date'].str.fullmatch(r'(\d{4}-\d{2}-\d{2})?').all():
+        return {}
+
+    return {record['filename']: record for record in manifest.to_dict('records')}
+
+
+def parse_advert_incremental(job):
+    """
+    Does the same job as parse_advert, unless the advert is unchanged since it was recorded in the manifest, in
+    which case the data is taken from the manifest instead. Unchanged adverts are recognised by size and
+    modification time, or failing that by the hash of their contents
+    :param job: a tuple of the advert (see find_files) and its record in the manifest (None if it isn't there)
+    :return: a list of the data for the advert, the layout of the advert (None if it wasn't parsed) and a tuple
+    of the size, modification time and hash to record in the new manifest
+    """
+
+    source, record = job
+    filename = source_filename(source)
+    size, mtime = source_details(source)
+
+    # Files which aren't job adverts aren't parsed, so there's nothing to remember about them
+    if not ADVERT_FILENAME.match(filename):
+        return [filename], None, (size, mtime, '')
+
+    # Only read and hash the advert if the cheap checks say it might have changed
+    if record is not None and record['size'] == size and record['mtime'] == mtime:
+        return [record[column] for column in COLUMNS], None, (size, mtime, record['hash'])
+
+    contents = read_source(source)
+    content_hash = hashlib.sha1(contents).hexdigest()
+
+    if record is not None and record['hash'] == content_hash:
+        return [record[column] for column in COLUMNS], None, (size, mtime, content_hash)
+
+    data, layout = parse_contents(filename, decode_contents(contents))
+
+    return data, layout, (size, mtime, content_hash)
+
+
+def iter_incremental_adverts(list_of_adverts, manifest_file, workers=1, layout_counts=None):
+    """
+    Does the same job as iter_parsed_adverts, but only parses the adverts that aren't in the manifest or have
+    changed since it was written, and takes the rest from the manifest. The manifest is rewritten as it goes, and
+    replaces the old one once every advert has been handed back
+    :param list_of_adverts: an iterable of the job adverts (see find_files)
+    :param manifest_file: the path to the manifest csv
+    :param workers: the number of processes to parse the new and changed adverts with
+    :param layout_counts: a Counter which, if given, is updated with the number of new and changed adverts
+    parsed in each layout
+    :return: a generator of lists of the data extracted from each advert, in the same order as list_of_adverts
+    """
+
+    cached = read_manifest(manifest_file)
+    jobs = ((source, cached.get(source_filename(source))) for source in list_of_adverts)
+
+    # Set up a counter to print on screen and assure me that everything's working
+    sanity_counter=0
+
+    with open(manifest_file + '.tmp', 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS + MANIFEST_COLUMNS)
+
+        for data, layout, details in iter_pool(parse_advert_incremental, jobs, workers):
+            sanity_counter+=1
+
+            if layout_counts is not None and layout is not None:
+                layout_counts[layout] += 1
+
+            padded_data = data + [''] * (len(COLUMNS) - len(data))
+            writer.writerow(padded_data + list(details))
+
+            yield data
+
+            # Not drowning but waving output for my sanity
+            print('Processed ' + str(sanity_counter) + ' jobs', end='\r')
+
+    os.replace(manifest_file + '.tmp', manifest_file)
+
+
+def merge_shards(location, n_shards, filename, extension='.csv'):
+    """
+    Stitches the results of the N shards back together into one file. If a shard has been run more than once, its
+    most recent results are used
+    :param location: the directory holding the shards' results, where the merged file is also saved
+    :param n_shards: the number of shards
+    :param filename: the name of the merged file, without the extension
+    :param extension: the extension of the shards' results, which the merged file is saved with too ('.csv' or
+    '.parquet')
+    :return: the list of shard files that were merged and the number of jobs in the merged file
+    """
+
+    shard_files = []
+    for shard_number in range(1, n_shards + 1):
+        candidates = sorted(glob.glob(location + SHARD_ROOT.format(shard_number, n_shards) + '_*' + extension))
+        if len(candidates) == 0:
+            raise ValueError('No results found for shard %i of %i in "%s"' % (shard_number, n_shards, location))
+        shard_files.append(candidates[-1])
+
+    if extension == FORMATS['parquet']:
+        return shard_files, merge_parquet_files(shard_files, location + filename + extension)
+
+    # The shards are already csvs with the same columns, so just copy the rows across (keeping only the first
+    # header). The date and salary text can contain line breaks, so they're read as csv rather than line by line
+    n_rows = 0
+    with open(location + filename + '.csv', 'w', newline='') as merged:
+        writer = csv.writer(merged, lineterminator='\n')
+        for shard_number, shard_file in enumerate(shard_files):
+            with open(shard_file, 'r', newline='') as f:
+                reader = csv.reader(f)
+                header = next(reader)
+                if shard_number == 0:
+                    writer.writerow(header)
+                for row in reader:
+                    writer.writerow(row)
+                    n_rows += 1
+
+    return shard_files, n_rows
+
+
+def main(argv=None):
     """
     Main function to run program
+    :param argv: the list of command line arguments, without the name of the script (defaults to sys.argv[1:]),
+    e.g. ['./job_ads_simon', './simon_results', '--workers', '8']
     """
 
-    start_time = time.time()
+    parse_args(sys.argv[1:] if argv is None else argv)
 
-    # Get filenames of all available jobs
-    list_of_adverts = find_files()
+    start_time = time.time()
 
     now = datetime.now()
     flndate = now.strftime("%Y-%m-%d")
     logdate = now.strftime('%d/%m/%Y %H.%M.%S')
 
+    # Stitching the shards back together doesn't need any parsing
+    if REDUCE is not None:
+        logfile = open(RESULTSPATH + 'job_parser_log_'+flndate+'.txt', 'w')
+        logfile.write('Date and time: ' + str(logdate) + '\n \n')
+
+        shard_files, n_rows = merge_shards(RESULTSPATH, REDUCE, '1_processed_jobs_'+flndate, FORMATS[FORMAT])
+
+        logfile.write('Merged the results of ' + str(REDUCE) + ' shards:\n')
+        for shard_file in shard_files:
+            logfile.write(' - ' + shard_file + '\n')
+        logfile.write('\nThere were ' + str(n_rows) + ' job adverts in the merged data file' + '\n\n')
+
+        print("--- %s seconds ---" % round((time.time() - start_time),1))
+        logfile.write('Processing took ' + str(round((time.time() - start_time),1)) + 's\n')
+
+        logfile.close()
+        return
+
+    # Each shard gets its own results, log and manifest so that they don't trip over each other
+    if SHARD is None:
+        results_root = '1_processed_jobs'
+        log_root = 'job_parser_log'
+        manifest_name = MANIFEST_NAME
+    else:
+        shard_suffix = '_shard_{}_of_{}'.format(*SHARD)
+        results_root = SHARD_ROOT.format(*SHARD)
+        log_root = 'job_parser_log' + shard_suffix
+        manifest_name = MANIFEST_NAME.replace('.csv', shard_suffix + '.csv')
+
+    # Get all available jobs (these are streamed, so they're counted as they are parsed)
+    list_of_adverts = find_files(SHARD)
+
     # Logging
-    logfile = open(RESULTSPATH + 'job_parser_log_'+flndate+'.txt', 'w')
+    logfile = open(RESULTSPATH + log_root + '_'+flndate+'.txt', 'w')
 
     logfile.write('Date and time: ' + str(logdate) + '\n \n')
-    logfile.write('There were ' + str(len(list_of_adverts)) + ' job adverts reviewed in the sample' + '\n \n')
 
-    # Parse jobs html and read into df
-    df = read_html(list_of_adverts)
+    if SHARD is not None:
+        logfile.write('Parsing shard ' + str(SHARD[0]) + ' of ' + str(SHARD[1]) + '\n \n')
 
-    # Logging
-    logfile.write('There were ' + str(len(df)) + ' job adverts were parsed into the data file' + '\n')
+    logfile.write('Parsing with ' + str(WORKERS) + ' worker process(es)' + '\n \n')
+
+    # Parse jobs html
+    layout_counts = Counter()
+
+    if INCREMENTAL:
+        rows = iter_incremental_adverts(list_of_adverts, RESULTSPATH + manifest_name, WORKERS, layout_counts)
+    else:
+        rows = iter_parsed_adverts(list_of_adverts, WORKERS, layout_counts)
 
-    n_invalid = sum((df['date'] == '') & (df['job title'] == ''))
+    # Either write the parsed jobs out as they come, or read them into a df and export that
+    if STREAM:
+        n_rows, n_invalid, n_unreadable = stream_to_file(rows, RESULTSPATH + results_root + '_'+flndate +
+                                                         FORMATS[FORMAT], BATCH_SIZE)
+    else:
+        df = rows_to_df(rows)
+        n_rows = len(df)
+        n_invalid = sum((df['date'] == '') & (df['job title'] == ''))
+        n_unreadable = sum((df['date'] == '') & (df['date text'].fillna('') != ''))
+        write_jobs(df, RESULTSPATH + results_root + '_'+flndate + FORMATS[FORMAT])
 
-    logfile.write(' - ' +str(n_invalid) + ' were missing date and/or title data\n\n')
+    logfile.write('There were ' + str(n_rows) + ' job adverts reviewed in the sample' + '\n \n')
+
+    if INCREMENTAL:
+        logfile.write(str(sum(layout_counts.values())) + ' new or changed adverts were parsed, the rest were taken '
+                      'from ' + manifest_name + '\n \n')
+
+    # Logging the layouts lets me see when jobs.ac.uk changes its layout, as the new adverts will start to go
+    # through the (slower) generic extractor
+    logfile.write('Adverts parsed in each layout:\n')
+    for layout in list(LAYOUTS) + [GENERIC_LAYOUT]:
+        logfile.write(' - ' + layout + ': ' + str(layout_counts[layout]) + '\n')
+    logfile.write('\n')
+
+    # Logging
+    logfile.write('There were ' + str(n_rows) + ' job adverts were parsed into the data file' + '\n')
 
-    export_to_csv(df, RESULTSPATH, '1_processed_jobs_'+flndate, False)
+    logfile.write(' - ' +str(n_invalid) + ' were missing date and/or title data\n')
+    logfile.write(' - ' + str(n_unreadable) + ' had a date that couldn\'t be read, so only the year was taken from it '
+                  '(where there was one)\n\n')
 
     print("--- %s seconds ---" % round((time.time() - start_time),1))
     logfile.write('Processing took ' + str(round((time.time() - start_time),1)) + 's\n')
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import numpy as np
+import pandas as pd
+
+from jobs_io import parse_dates
+
+# Finds adverts which are near duplicates of each other: the same post advertised again under a new jobs.ac.uk ID,
+# or scraped twice, which would otherwise be counted twice. Adverts are compared on the words of the job title, the
+# organisation, the location and the salary, and only adverts from the same organisation posted within
+# DUPLICATE_WINDOW days of each other can be duplicates.
+#
+# Comparing every advert with every other one would take time proportional to the square of the number of
+# adverts, so each advert is summarised by a MinHash signature instead: NUM_PERM hashes, each the smallest hash of
+# the advert's words under a different hash function, where the fraction of hashes two adverts have in common
+# estimates the Jaccard similarity of their words. The signatures are split into BANDS bands, and only adverts
+# whose signatures are identical over a whole band (locality sensitive hashing) become candidate pairs. Within a
+# band the adverts with the same hashes are sorted by date and each is paired with the adverts after it that were
+# posted within DUPLICATE_WINDOW days, up to MAX_NEIGHBOURS of them, so the number of candidate pairs grows with the
+# number of adverts rather than its square. Candidates with at least
+# DUPLICATE_THRESHOLD of their hashes in common and posted close enough together are duplicates, and the
+# duplicates are joined up into clusters.
+#
+# Each cluster is identified by the filename of its first advert (by date), which goes in the DUPLICATE_COLUMN, so
+# the data can be collapsed to one advert per cluster (see collapse_duplicates).
+
+DUPLICATE_COLUMN = 'duplicate_cluster'
+
+# The number of hashes in each signature, and the number of bands they're split into. With 8 bands of 4 hashes,
+# adverts with 70% of their words in common are candidates 89% of the time (98% for 80%), and adverts with 30%
+# only 6% of the time
+
+NUM_PERM = 32
+BANDS = 8
+
+DUPLICATE_THRESHOLD = 0.7
+DUPLICATE_WINDOW = 60
+
+# The most adverts after it in the same bucket (by date, and within DUPLICATE_WINDOW days) that each advert is paired
+# with. A bucket with more adverts than this in the window (a job advertised over and over, or lots of adverts that
+# happen to share a band) only has each advert compared with the next MAX_NEIGHBOURS, which keeps the time linear
+
+MAX_NEIGHBOURS = 8
+
+# The number of days numpy gives a missing date (NaT). Adverts without a date can't be within the window of any other
+# advert, so they're left out of the buckets altogether
+
+NO_DATE = np.iinfo(np.int64).min
+
+# The seeds of the hash functions, fixed so that the signatures (and so the clusters) are the same on every run
+
+SEEDS = np.random.default_rng(2019).integers(0, 2 ** 63, size=NUM_PERM, dtype=np.uint64)
+
+# Separates the fields of an advert when they're joined into one string
+
+FIELD_SEPARATOR = '\x1f'
+
+
+def mix_hashes(hashes):
+    """
+    Scrambles some 64 bit hashes (the finaliser of the splitmix64 generator), so that hashes which differ by a
+    single bit come out completely different
+    :param hashes: a numpy array of uint64
+    :return: the scrambled hashes, as a numpy array of uint64
+    """
+
+    hashes = (hashes ^ (hashes >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    hashes = (hashes ^ (hashes >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+
+    return hashes ^ (hashes >> np.uint64(31))
+
+
+def advert_fields(df):
+    """
+    Tidies up the fields adverts are compared on
+    :param df: the job data
+    :return: a df with the same index as df, and the lowercased job title, organisation and location and the
+    salary (to the nearest pound) as text in the columns 'title', 'organisation', 'location' and 'salary' (with ''
+    for anything missing)
+    """
+
+    def text(column):
+        return df[column].astype(object).fillna('').astype(str).str.lower().str.strip()
+
+    salary = pd.to_numeric(df['salary'], errors='coerce').round()
+
+    return pd.DataFrame({'title': text('job title'), 'organisation': text('organisation'),
+                         'location': text('location'),
+                         'salary': salary.astype('Int64').astype(str).where(salary.notna(), '')})
+
+
+def distinct_adverts(fields):
+    """
+    Finds the distinct adverts, as adverts with the same fields have the same signature and only need hashing once
+    :param fields: the df from advert_fields
+    :return: a numpy array of which distinct advert each advert is, and a df of the fields of the distinct adverts
+    """
+
+    codes, _ = pd.factorize(fields['title'] + FIELD_SEPARATOR + fields['organisation'] + FIELD_SEPARATOR +
+                            fields['location'] + FIELD_SEPARATOR + fields['salary'])
+    firsts = pd.Series(codes).drop_duplicates()
+
+    return codes, fields.iloc[firsts.index].set_axis(firsts.to_numpy()).sort_index()
+
+
+def minhash_signatures(fields):
+    """
+    Works out the MinHash signature of each advert from its words
+    :param fields: a df of the adverts' fields, from advert_fields (or distinct_adverts)
+    :return: a numpy array of uint32 with a row per advert and NUM_PERM columns, and a numpy array of True/False
+    which is False for adverts without any words (which can't be compared)
+    """
+
+    # The words of the title, and the organisation, location and salary as single words, each marked with the field
+    # it came from. The index of each word is the position of its advert
+    fields = fields.set_axis(np.arange(len(fields)))
+    words = [fields['title'].str.findall(r'[a-z0-9]+').explode().dropna()]
+    for column, prefix in [('organisation', 'o:'), ('location', 'l:'), ('salary', 's:')]:
+        words.append((prefix + fields[column])[fields[column] != ''])
+    words = pd.concat(words)
+
+    rows = words.index.to_numpy(dtype=np.int64)
+    hashes = pd.util.hash_pandas_object(words, index=False).to_numpy()
+
+    # Put each advert's words together, so the smallest hash of each advert is found with a single reduceat
+    order = np.argsort(rows, kind='stable')
+    rows, hashes = rows[order], hashes[order]
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]]) if len(rows) > 0 else np.array([], dtype=np.int64)
+
+    signatures = np.full((len(fields), NUM_PERM), np.iinfo(np.uint32).max, dtype=np.uint32)
+    for i, seed in enumerate(SEEDS):
+        permuted = (mix_hashes(hashes ^ seed) >> np.uint64(32)).astype(np.uint32)
+        if len(starts) > 0:
+            signatures[rows[starts], i] = np.minimum.reduceat(permuted, starts)
+
+    has_words = np.zeros(len(fields), dtype=bool)
+    has_words[rows[starts]] = True
+
+    return signatures, has_words
+
+
+def candidate_pairs(signatures, codes, days, bands=BANDS, window=DUPLICATE_WINDOW, neighbours=MAX_NEIGHBOURS):
+    """
+    Finds the pairs of adverts whose signatures are identical over at least one band and which were posted within
+    the window of each other. Within a band each advert is only paired with the next few adverts (by date) with the
+    same hashes, so if more than that many were posted within the window some pairs are left out
+    :param signatures: the signatures of the distinct adverts, from minhash_signatures
+    :param codes: a numpy array of which row of signatures each advert has
+    :param days: a numpy array of the date of each advert, as a number of days (NO_DATE for adverts without a date,
+    which aren't paired with anything)
+    :param bands: the number of bands the signatures are split into
+    :param window: the most days apart two adverts can be and still be a pair
+    :param neighbours: the most adverts after it in the same bucket that each advert is paired with
+    :return: two numpy arrays of the positions of the first and second advert of each pair (the first is always
+    the lower position, and each pair is only given once)
+    """
+
+    rows_per_band = signatures.shape[1] // bands
+    dated = np.flatnonzero(days != NO_DATE)
+
+    firsts = [np.array([], dtype=np.int64)]
+    seconds = [np.array([], dtype=np.int64)]
+    for band in range(bands):
+        band_hashes = signatures[:, band * rows_per_band:(band + 1) * rows_per_band]
+        keys = pd.util.hash_pandas_object(pd.DataFrame(band_hashes), index=False).to_numpy()[codes[dated]]
+
+        # Adverts in the same bucket end up next to each other, in date order, and each is paired with the ones
+        # after it in the window
+        in_order = np.lexsort((days[dated], keys))
+        order = dated[in_order]
+        keys, order_days = keys[in_order], days[order]
+        for step in range(1, neighbours + 1):
+            same = (keys[step:] == keys[:-step]) & (order_days[step:] - order_days[:-step] <= window)
+            if not same.any():
+                break
+            firsts.append(order[:-step][same])
+            seconds.append(order[step:][same])
+
+    first = np.concatenate(firsts)
+    second = np.concatenate(seconds)
+
+    # The same pair turns up in several bands if the adverts are very alike
+    pairs = np.sort(np.minimum(first, second) * len(codes) + np.maximum(first, second))
+    pairs = pairs[np.r_[True, pairs[1:] != pairs[:-1]]] if len(pairs) > 0 else pairs
+
+    return pairs // max(len(codes), 1), pairs % max(len(codes), 1)
+
+
+def connected_labels(n, first, second):
+    """
+    Joins up pairs of adverts into clusters, labelling every advert in a cluster with the lowest position in it
+    :param n: the number of adverts
+    :param first: a numpy array of the position of the first advert of each pair
+    :param second: a numpy array of the position of the second advert of each pair
+    :return: a numpy array of the label of each advert
+    """
+
+    labels = np.arange(n)
+
+    while True:
+        # Point the higher label of each pair at the lower one
+        low = np.minimum(labels[first], labels[second])
+        high = np.maximum(labels[first], labels[second])
+        joined = low != high
+        if not joined.any():
+            return labels
+        np.minimum.at(labels, high[joined], low[joined])
+
+        # Then follow the pointers until every advert points at the lowest label it can reach
+        while True:
+            followed = labels[labels]
+            if np.array_equal(followed, labels):
+                break
+            labels = followed
+
+
+def duplicate_clusters(df, threshold=DUPLICATE_THRESHOLD, window=DUPLICATE_WINDOW):
+    """
+    Finds the clusters of near duplicate adverts
+    :param df: the job data, with the dates as text or as datetimes
+    :param threshold: the fraction of their signatures two adverts need in common to be duplicates
+    :param window: the most days apart two adverts can be and still be duplicates
+    :return: a Series with the same index as df, of the filename of the first advert in each advert's cluster
+    (adverts which aren't duplicates of any other are in a cluster of their own)
+    """
+
+    dates = df['date'] if pd.api.types.is_datetime64_any_dtype(df['date']) else parse_dates(df['date'])
+    dates = pd.to_datetime(dates, errors='coerce')
+    days = dates.to_numpy(dtype='datetime64[D]').astype(np.int64)
+    has_date = dates.notna().to_numpy()
+
+    # Adverts with the same words have the same signature, so each distinct advert is only hashed once
+    codes, fields = distinct_adverts(advert_fields(df))
+    signatures, has_words = minhash_signatures(fields)
+
+    first, second = candidate_pairs(signatures, codes, days, window=window)
+
+    # Check the candidates properly
+    similar = (signatures[codes[first]] == signatures[codes[second]]).mean(axis=1) >= threshold
+    close = np.abs(days[first] - days[second]) <= window
+    comparable = has_words[codes[first]] & has_date[first] & has_date[second]
+
+    # Similar posts at different organisations are different jobs
+    organisations = pd.factorize(fields['organisation'])[0][codes]
+    same_organisation = organisations[first] == organisations[second]
+
+    keep = similar & close & comparable & same_organisation
+
+    labels = connected_labels(len(df), first[keep], second[keep])
+
+    # Name each cluster after its first advert, by date (then by position)
+    order = np.lexsort((np.arange(len(df)), np.where(has_date, days, np.iinfo(np.int64).max)))
+    filenames = df['filename'].to_numpy(dtype=object)
+    first_advert = pd.Series(filenames[order], index=labels[order])
+    first_advert = first_advert[~first_advert.index.duplicated()]
+
+    return pd.Series(first_advert.reindex(labels).to_numpy(), index=df.index, name=DUPLICATE_COLUMN)
+
+
+def collapse_duplicates(df):
+    """
+    Keeps only the first advert (by date) of each cluster of near duplicates
+    :param df: the job data, with the DUPLICATE_COLUMN already filled in (e.g. by dataset_merger.py) or without it,
+    in which case the clusters are found with duplicate_clusters
+    :return: the job data without the duplicates, and the number of adverts that were dropped
+    """
+
+    if DUPLICATE_COLUMN in df.columns:
+        clusters = df[DUPLICATE_COLUMN]
+    else:
+        clusters = duplicate_clusters(df)
+
+    keep = clusters.isna() | (clusters.astype(object) == df['filename'].astype(object))
+
+    # If a cluster's first advert isn't in the data any more, keep the first advert of the cluster that is
+    keep |= ~clusters.isin(clusters[keep]) & ~clusters.duplicated()
+
+    return df[keep], int((~keep).sum())
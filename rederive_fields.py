@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import os
+import sys
+import time
+
+import pandas as pd
+
+from date_parser import iso_dates, years_from_dates
+from salary_parser import parse_salaries
+
+# Recomputes the date, year and salary columns of a file produced by 'jobs_to_csv.py' from the raw 'date text' and
+# 'salary text' columns, so that changes to the date cleanup or the salary heuristics (thresholds, exchange rates)
+# can be applied to the whole dataset without parsing the html again.
+#
+# Call as 'python rederive_fields.py /PATH_TO_PROCESSED_JOBS_FILE.csv' to update the file in place, or as
+# 'python rederive_fields.py /PATH_TO_PROCESSED_JOBS_FILE.csv /PATH_TO_OUTPUT_FILE.csv' to save the results
+# elsewhere.
+
+RAW_COLUMNS = ['date text', 'salary text']
+
+
+def rederive(df):
+    """
+    Recomputes the date, year and salary from the raw text columns, a whole column at a time
+    :param df: the parsed job advert data, read with every column as text
+    :return: the same df with the date, year and salary columns replaced
+    """
+
+    missing_columns = [column for column in RAW_COLUMNS if column not in df.columns]
+    if missing_columns:
+        raise ValueError('Cannot rederive fields, the data has no %s column(s). Files parsed before these columns '
+                         'were added need to be parsed again with jobs_to_csv.py' % ', '.join(missing_columns))
+
+    df['date'] = iso_dates(df['date text'])
+    df['year'] = years_from_dates(df['date'], df['date text'])
+    df['salary'] = parse_salaries(df['salary text'])
+
+    return df
+
+
+def main(infile, outfile):
+    """
+    Main function to run program
+    """
+
+    start_time = time.time()
+
+    # Read everything as text so that the columns which aren't rederived are written back exactly as they were
+    print('Loading dataset...')
+    df = pd.read_csv(infile, dtype=str, keep_default_na=False)
+
+    print('Rederiving date, year and salary...')
+    df = rederive(df)
+
+    # Write to a temporary file first so the original is left alone if anything goes wrong
+    df.to_csv(outfile + '.tmp', index=False)
+    os.replace(outfile + '.tmp', outfile)
+
+    print('Rederived %i jobs and saved them to "%s"' % (len(df), outfile))
+    print("--- %s seconds ---" % round((time.time() - start_time),1))
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) not in (2, 3):
+        raise ValueError('Must pass the processed jobs csv to rederive (and optionally a file to save the results to)')
+
+    main(sys.argv[1], sys.argv[-1])
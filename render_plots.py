@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import csv
+import hashlib
+import os
+from multiprocessing import Pool
+
+import pandas as pd
+
+# Renders the plots for find_jobs.py. The analysis works out a small table for each plot (e.g. the number of jobs
+# per year) and describes the plot with line_plot or bar_plot; render_plots then draws them all in one go, across a
+# pool of worker processes if asked.
+#
+# The figures are drawn straight onto Agg canvases rather than through pyplot, so they don't need a display, are
+# never registered with pyplot's list of open figures and are closed (freed) as soon as each has been saved, however
+# many plots there are. Each plot's table is hashed and the hashes are kept in a manifest next to the plots, so plots
+# whose table (and labels) haven't changed since the last run aren't drawn again.
+
+PLOT_MANIFEST_NAME = 'plot_manifest.csv'
+
+
+def line_plot(table, path, x, columns, style='-', title='', xlabel=None, ylabel=None, legend=True):
+    """
+    Describes a line plot of some of the columns of a table
+    :param table: a df holding everything that's plotted
+    :param path: the path to save the png to
+    :param x: the column (or None for the index) to plot along the x axis
+    :param columns: the list of columns to plot a line for, each labelled with the column name in the legend
+    :param style: the matplotlib format string for the lines, e.g. 'x-'
+    :param title: the title of the plot
+    :param xlabel: the x axis label, which defaults to the name of x
+    :param ylabel: the y axis label
+    :param legend: whether to show the legend
+    :return: a dict describing the plot, for render_plots
+    """
+
+    return {'kind': 'line', 'table': table, 'path': path, 'x': x, 'columns': list(columns), 'style': style,
+            'title': title, 'xlabel': x if xlabel is None else xlabel, 'ylabel': ylabel, 'legend': legend}
+
+
+def bar_plot(table, path, title=''):
+    """
+    Describes a bar plot of counts over time, such as the one from time_series.period_counts
+    :param table: a df with a row per bar, and the 'start', 'end' and 'count' of each bar as columns
+    :param path: the path to save the png to
+    :param title: the title of the plot
+    :return: a dict describing the plot, for render_plots
+    """
+
+    return {'kind': 'bars', 'table': table, 'path': path, 'title': title}
+
+
+def plot_hash(plot):
+    """
+    Hashes everything that goes into a plot, so that it's only drawn again if something has changed
+    :param plot: a dict describing the plot (see line_plot and bar_plot)
+    :return: the hash as a hex string
+    """
+
+    content_hash = hashlib.sha1()
+    content_hash.update(repr(sorted((key, value) for key, value in plot.items() if key != 'table')).encode())
+    content_hash.update(repr(list(plot['table'].columns)).encode())
+    content_hash.update(pd.util.hash_pandas_object(plot['table'], index=True).to_numpy().tobytes())
+
+    return content_hash.hexdigest()
+
+
+def render_plot(plot):
+    """
+    Draws a plot on an Agg canvas and saves it as a png
+    :param plot: a dict describing the plot (see line_plot and bar_plot)
+    :return: the path the plot was saved to
+    """
+
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    ax = figure.subplots()
+    table = plot['table']
+
+    if plot['kind'] == 'line':
+        x = table.index if plot['x'] is None else table[plot['x']]
+        for column in plot['columns']:
+            ax.plot(x, table[column], plot['style'], label=column)
+        if plot['legend']:
+            ax.legend()
+        ax.set_xlabel(plot['xlabel'] or '')
+        ax.set_ylabel(plot['ylabel'] or '')
+    else:
+        ax.bar(table['start'], table['count'], width=table['end'] - table['start'], align='edge')
+
+    ax.set_title(plot['title'])
+    figure.savefig(plot['path'])
+
+    # Nothing else holds on to the figure, but clear it anyway so that the memory goes as soon as possible
+    figure.clear()
+
+    return plot['path']
+
+
+def read_plot_manifest(manifest_file):
+    """
+    Reads the hashes of the plots drawn by the last run
+    :param manifest_file: the path to the manifest csv
+    :return: a dict of the path of each plot to its hash, empty if there's no manifest yet
+    """
+
+    if not os.path.exists(manifest_file):
+        return {}
+
+    with open(manifest_file, 'r', newline='') as f:
+        return {row['path']: row['hash'] for row in csv.DictReader(f)}
+
+
+def render_plots(plots, manifest_file=None, workers=1):
+    """
+    Draws a list of plots, skipping those which are unchanged since they were last drawn
+    :param plots: a list of dicts describing the plots (see line_plot and bar_plot). If several have the same path,
+    only the last one is drawn
+    :param manifest_file: the path to the csv of the hashes of the plots, or None to draw every plot
+    :param workers: the number of processes to draw the plots with (1 draws them in this process)
+    :return: the number of plots drawn and the number skipped because they were unchanged
+    """
+
+    plots = list({plot['path']: plot for plot in plots}.values())
+    hashes = {plot['path']: plot_hash(plot) for plot in plots}
+
+    previous = {} if manifest_file is None else read_plot_manifest(manifest_file)
+    to_render = [plot for plot in plots
+                 if previous.get(plot['path']) != hashes[plot['path']] or not os.path.exists(plot['path'])]
+
+    if workers <= 1 or len(to_render) <= 1:
+        list(map(render_plot, to_render))
+    else:
+        with Pool(min(workers, len(to_render))) as pool:
+            pool.map(render_plot, to_render)
+
+    # Remember the plots drawn now alongside any others from earlier runs
+    if manifest_file is not None:
+        previous.update(hashes)
+        with open(manifest_file + '.tmp', 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['path', 'hash'])
+            writer.writerows(previous.items())
+        os.replace(manifest_file + '.tmp', manifest_file)
+
+    return len(to_render), len(plots) - len(to_render)
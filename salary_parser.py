@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import numpy as np
+from collections import deque
+from functools import lru_cache
+
+# Turns the free text that job adverts use to describe salaries (e.g. '£30,000 - £40,000 per annum') into a single
+# value in GBP. Used by jobs_to_csv.py when parsing adverts, but it can also be run on its own over a column of raw
+# salary strings with parse_salaries (which is how rederive_fields.py recomputes salaries).
+
+# Salaries at or below MIN_SALARY are grades or hourly pay, and ones above MAX_SALARY mean something has probably
+# gone wrong, so neither are kept
+
+MIN_SALARY = 12000
+MAX_SALARY = 500000
+
+# The currencies to scan for: a tuple of the symbols that mark the currency and the conversion rate from the
+# currency to GBP. They will be looked for in this order, so keep USD near the bottom so '$' doesnt trigger for
+# 'AUS $', for example.
+#
+# Currencies based on interatively looking through unparseable files to see what could scoop more values.
+# Exchange rates from xe.com in Sep 2023
+#
+# The three letter codes of the currencies with a single symbol are scanned for one letter at a time (so SEK
+# looks for 'S', then 'E', then 'K'). That's how the original scanner behaved, as each of these was a plain string
+# rather than a tuple, and it's kept so that the salaries stay the same.
+
+CURRENCIES = (
+    (('£', 'GBP'), 1),
+    (('€', 'EUR'), 0.85),
+    (tuple('SEK'), 0.07),
+    (tuple('DKK'), 0.11),
+    (tuple('CHF'), 0.90),
+    (tuple('MOP'), 0.098), # Macau
+    (tuple('RMB'), 0.11),
+    (tuple('JPY'), 0.0054),
+    (('A$', 'AUD$', 'AUD $', 'AUD'), 0.51),
+    (('CAD$', 'CAD $', 'CAD'), 0.58),
+    (('HKD$', 'HK $', 'HKD'), 0.10),
+    (('NZD$', 'NZD $', 'NZD'), 0.47),
+    (('S$', 'SGD$', 'SGD $', 'SGD'), 0.58),
+    (('Col$', 'COP'), 0.00019),
+    (('USD$', 'USD', '$'), 0.79),
+)
+
+# The symbols in the order they are scanned for, with their conversion rates. A symbol which comes round again with
+# the same rate (e.g. the second 'K' in DKK) can't find anything the first scan didn't, so it's only listed once
+
+SYMBOLS = []
+for symbols, conversion in CURRENCIES:
+    for symbol in symbols:
+        if (symbol, conversion) not in SYMBOLS:
+            SYMBOLS.append((symbol, conversion))
+SYMBOLS = tuple(SYMBOLS)
+
+# Single characters to blank out of the salary text (carriage returns, tabs and brackets) or remove (commas)
+
+CLEAN_TABLE = str.maketrans({'\n': ' ', '\t': ' ', '(': ' ', ')': ' ', ',': None})
+
+# Single characters to remove from a value (interpreting 'xxxxx+' as just 'xxxxx'), and turning '40k' back into
+# '40000', etc
+
+VALUE_TABLE = str.maketrans({'+': None, '*': None, ';': None, 'k': '000', 'K': '000'})
+
+
+def clean_salary_string(salary):
+    """
+    Tidies up the text describing a salary so that the values can be picked out of it
+    :param salary: the text from the salary cell of an advert
+    :return: the cleaned text
+    """
+
+    # Remove carriage returns, tabs, brackets and commas
+    salary_string = salary.translate(CLEAN_TABLE)
+
+    # Remove spaces either side of dashes and slashes to better locate salary ranges,
+    # convert slashes into dashes so they will be treated the same (e.g. 10000-30000 and
+    # 10000/30000 will both be treated as 20000).
+    salary_string = salary_string.replace('- ','-').replace(' -','-')
+    salary_string = salary_string.replace(' /','-').replace('/ ','-').replace('/','-')
+
+    return salary_string
+
+
+def extract_values_by_currency(salary_string, currency_symbol, conversion=1):
+    """
+    Search for and extract salaries from a string when given an arbitrary currency code or symbol to search for
+    :param salary_string: the cleaned salary text (see clean_salary_string)
+    :param currency_symbol: the currency code or symbol
+    :param conversion: the conversion rate from the currency to GBP
+    :return: the mean of the sane salary values found after the symbol, in GBP, or '' if there weren't any
+    """
+
+    # Values still to look at; the high end of a range is put on the end of the queue for later
+    pending = deque(salary_string.split(currency_symbol)[1:])
+    salaries = []
+
+    # For each value appearing after that symbol...
+    while pending:
+
+        # Get numeric value immediately after currency sign
+        salary = pending.popleft().strip().split(' ')
+
+        # Remove any 'per annum' denotation that wasnt space-separated
+        salary_cleaned = salary[0].replace('pa','').replace('PA','').replace('p.a.','').replace('per','')
+
+        # Remove various other symbols and expand 'k's
+        salary_cleaned = salary_cleaned.translate(VALUE_TABLE)
+
+        # Remove trailing -s (these happen when salaries are given as e.g. £30000-£40000, so both ends
+        # of the range will already be encapsulated and trailing - can be ignored)
+        salary_cleaned = salary_cleaned.strip('-')
+
+        # Deal with ranges; deal with low value now, queue the other value up for later
+        if '-' in salary_cleaned:
+            sc_split = salary_cleaned.split('-')
+            salary_cleaned = sc_split[0]
+            pending.append(sc_split[1])
+
+        # If it still cant be parsed, throw it out
+        try:
+            salary_value = float(salary_cleaned)
+        except ValueError:
+            continue
+
+        # Convert to GBP
+        salary_gbp = salary_value * conversion
+
+        # Do not save small numbers which relate to grades or hourly pay, or huge ones where something has
+        # probably gone wrong
+        if salary_gbp <= MIN_SALARY or salary_gbp > MAX_SALARY:
+            continue
+
+        salaries.append(salary_gbp)
+
+    # After all the fireworks, check we actually got some sane salary values out, else return ''
+    if len(salaries) == 0:
+        return ''
+
+    return np.mean(salaries)
+
+
+def clean_salary_strings(salaries):
+    """
+    Does the same job as clean_salary_string over a pandas Series of salary text
+    :param salaries: a Series of the text from the salary cells of adverts (with no missing values)
+    :return: a Series of the cleaned text
+    """
+
+    salaries = salaries.str.translate(CLEAN_TABLE)
+    salaries = salaries.str.replace('- ', '-', regex=False).str.replace(' -', '-', regex=False)
+    salaries = (salaries.str.replace(' /', '-', regex=False).str.replace('/ ', '-', regex=False)
+                .str.replace('/', '-', regex=False))
+
+    return salaries
+
+
+def parse_clean_salary(salary_string):
+    """
+    Turn cleaned salary text into a single value in GBP
+    :param salary_string: the cleaned salary text (see clean_salary_string)
+    :return: the mean of the sane salary values found in the text, or '' if there weren't any
+    """
+
+    # Run the currency scanner for all currencies listed, skipping symbols which aren't in the text at all
+    for symbol, conversion in SYMBOLS:
+        if symbol not in salary_string:
+            continue
+
+        salary_value = extract_values_by_currency(salary_string, symbol, conversion)
+
+        # If salary succesfully found, return it and dont run the rest of the tests
+        if salary_value != '':
+            return salary_value
+
+    # If no symbols yielded sane results, return empty string
+    return ''
+
+
+@lru_cache(maxsize=65536)
+def parse_salary(salary):
+    """
+    Turn the text describing the salary into a single value in GBP. Many adverts share the same salary text, so
+    the results are cached
+    :param salary: the text from the salary cell of an advert
+    :return: the mean of the sane salary values found in the text, or '' if there weren't any
+    """
+
+    return parse_clean_salary(clean_salary_string(salary))
+
+
+def parse_salaries(salaries):
+    """
+    Runs parse_salary over a column of raw salary strings. For a pandas Series the text is cleaned for the whole
+    column at once and then each distinct string is only parsed once
+    :param salaries: a pandas Series or a list of salary text (missing values can be None or NaN)
+    :return: the salaries in GBP ('' where no salary was found), as a Series if a Series was given or else a list
+    """
+
+    if not hasattr(salaries, 'str'):
+        return [parse_salary(salary) if isinstance(salary, str) else '' for salary in salaries]
+
+    has_text = salaries.map(lambda salary: isinstance(salary, str))
+    cleaned = clean_salary_strings(salaries[has_text])
+
+    parsed = {salary_string: parse_clean_salary(salary_string) for salary_string in cleaned.unique()}
+
+    return cleaned.map(parsed).reindex(salaries.index, fill_value='')
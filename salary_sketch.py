@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import numpy as np
+import pandas as pd
+
+from salary_stats import STATS, period_keys
+
+# Works out the same salary statistics as salary_stats.aggregate_salaries, but from summaries ("sketches") of the
+# salaries that can be built up a chunk of the data at a time, so that find_jobs.py doesn't need every advert in
+# memory at once (see '--stream' in find_jobs.py).
+#
+# A sketch counts how many adverts have each salary, for each cohort and period. Salaries are set on pay scales, so
+# only a few thousand different salaries turn up in any one year however many adverts there are, and the sketch stays
+# small. Two sketches are merged by adding up their counts, and the quartiles (and so the clipped mean) worked out
+# from the counts are exactly those of the salaries themselves.
+
+
+def sketch_salaries(cohorts, period='year'):
+    """
+    Counts the adverts with each salary, for each cohort and period
+    :param cohorts: a dict of cohort name to the df of job adverts in that cohort, e.g. {'RSE Jobs': df_interest,
+    'All Jobs': df}. Jobs without a salary or a period are left out
+    :param period: 'year', 'quarter' or 'month' (see salary_stats.period_keys)
+    :return: the sketch, a Series of the counts indexed by cohort, period and salary
+    """
+
+    frames = []
+    for name, df in cohorts.items():
+        frames.append(pd.DataFrame({'cohort': name,
+                                    period: period_keys(df, period).to_numpy(),
+                                    'salary': pd.to_numeric(df['salary'], errors='coerce').to_numpy()}))
+
+    data = pd.concat(frames, ignore_index=True).dropna(subset=[period, 'salary'])
+
+    return data.groupby(['cohort', period, 'salary']).size().rename('count')
+
+
+def merge_sketches(sketches):
+    """
+    Merges sketches made from different parts of the data (e.g. one per chunk)
+    :param sketches: a list of the sketches from sketch_salaries (any of them can be None, and are skipped)
+    :return: the merged sketch, as if it had been made from all the data at once
+    """
+
+    sketches = [sketch for sketch in sketches if sketch is not None]
+
+    return pd.concat(sketches).groupby(level=[0, 1, 2]).sum()
+
+
+def weighted_quantile(values, counts, q):
+    """
+    Finds a quantile of some numbers given as each distinct number and how often it appears, interpolating in the
+    same way as pandas (and numpy) do for the full list of numbers
+    :param values: a sorted numpy array of the distinct numbers
+    :param counts: a numpy array of how many times each of them appears
+    :param q: the quantile, between 0 and 1
+    :return: the quantile
+    """
+
+    ends = np.cumsum(counts)
+    position = (ends[-1] - 1) * q
+    below = int(np.floor(position))
+    fraction = position - below
+
+    # The numbers either side of the position in the full, sorted list
+    a = values[np.searchsorted(ends, below, side='right')]
+    b = values[np.searchsorted(ends, min(below + 1, ends[-1] - 1), side='right')]
+
+    # numpy's interpolation, so the results are identical
+    if fraction >= 0.5:
+        return b - (b - a) * (1 - fraction)
+
+    return a + (b - a) * fraction
+
+
+def sketch_stats(sketch, cohorts, period='year', periods=None):
+    """
+    Calculates the salary statistics for each cohort in each period from a sketch
+    :param sketch: a sketch from sketch_salaries or merge_sketches
+    :param cohorts: the list of the cohort names, in the order they should be in the results
+    :param period: the period the sketch was made with
+    :param periods: the list of periods to include for every cohort (periods without any salaries get NaNs and a
+    count of 0), or None to only include the periods that have salaries
+    :return: a df with a row per cohort per period, and the cohort, period and STATS as columns, the same as
+    salary_stats.aggregate_salaries gives
+    """
+
+    keys = ['cohort', period]
+
+    rows = []
+    for (cohort, key), group in sketch.groupby(level=[0, 1], sort=False):
+        values = group.index.get_level_values('salary').to_numpy(dtype=float)
+        counts = group.to_numpy()
+        order = np.argsort(values)
+        values, counts = values[order], counts[order]
+
+        # Clipped mean: the mean of the salaries between the lower and upper quartiles (inclusive)
+        lower = weighted_quantile(values, counts, 0.25)
+        upper = weighted_quantile(values, counts, 0.75)
+        inside = (values >= lower) & (values <= upper)
+
+        # The quartiles can fall between two salaries with none in between, in which case there's no clipped mean
+        if inside.any():
+            clipped_mean = np.sum(values[inside] * counts[inside]) / np.sum(counts[inside])
+        else:
+            clipped_mean = np.nan
+
+        rows.append({'cohort': cohort, period: key,
+                     'mean': np.sum(values * counts) / np.sum(counts),
+                     'clipped_mean': clipped_mean,
+                     'min': values[0], 'max': values[-1], 'count': int(np.sum(counts))})
+
+    stats = pd.DataFrame(rows, columns=keys + STATS)
+    stats = stats[stats['cohort'].isin(cohorts)].set_index(keys)
+
+    if periods is None:
+        everything = pd.MultiIndex.from_tuples(sorted(stats.index, key=lambda row: (cohorts.index(row[0]), row[1])),
+                                               names=keys)
+    else:
+        everything = pd.MultiIndex.from_product([list(cohorts), list(periods)], names=keys)
+
+    stats = stats.reindex(everything)
+    stats['count'] = stats['count'].fillna(0).astype(int)
+
+    return stats[STATS].reset_index()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import pandas as pd
+
+# Works out the salary statistics that find_jobs.py plots: the mean, the clipped mean (the mean of the salaries
+# inside the interquartile range, to remove the influence of outliers), the min, the max and the number of
+# salaries, per year (or per quarter or month). Any number of cohorts (e.g. the jobs of interest and all jobs) are
+# done together with a single groupby, rather than filtering the whole dataset once per year per cohort.
+
+STATS = ['mean', 'clipped_mean', 'min', 'max', 'count']
+
+# The periods the salaries can be grouped by, and the pandas frequency used to turn a date into each period (years
+# come straight from the year column)
+
+PERIOD_FREQUENCIES = {'year': None, 'quarter': 'Q', 'month': 'M'}
+
+
+def period_keys(df, period):
+    """
+    Finds the period each job advert belongs to
+    :param df: the parsed job advert data, with the date column converted to datetimes
+    :param period: 'year', 'quarter' or 'month'
+    :return: a Series of the years as integers, or of the quarters or months as pandas Periods
+    """
+
+    if period not in PERIOD_FREQUENCIES:
+        raise ValueError('period must be one of: ' + ', '.join(PERIOD_FREQUENCIES))
+
+    if period == 'year':
+        return df['year']
+
+    return df['date'].dt.to_period(PERIOD_FREQUENCIES[period])
+
+
+def aggregate_salaries(cohorts, period='year', periods=None):
+    """
+    Calculates the salary statistics for each cohort in each period
+    :param cohorts: a dict of cohort name to the df of job adverts in that cohort, e.g. {'RSE Jobs': df_interest,
+    'All Jobs': df}. Jobs without a salary or a period are left out
+    :param period: 'year', 'quarter' or 'month'
+    :param periods: the list of periods to include for every cohort (periods without any salaries get NaNs and a
+    count of 0), or None to only include the periods that have salaries
+    :return: a df with a row per cohort per period, and the cohort, period and STATS as columns
+    """
+
+    # Stack the salaries of every cohort into one long df, so they can all be grouped at once
+    frames = []
+    for name, df in cohorts.items():
+        frames.append(pd.DataFrame({'cohort': name,
+                                    period: period_keys(df, period).to_numpy(),
+                                    'salary': pd.to_numeric(df['salary'], errors='coerce').to_numpy()}))
+
+    data = pd.concat(frames, ignore_index=True).dropna(subset=[period, 'salary'])
+    data['cohort'] = pd.Categorical(data['cohort'], categories=list(cohorts))
+
+    keys = ['cohort', period]
+    salaries = data.groupby(keys, observed=True)['salary']
+    stats = salaries.agg(['mean', 'min', 'max', 'count'])
+
+    # Clipped mean: the mean of the salaries between the lower and upper quartiles of their cohort and period
+    # (inclusive), with the quartiles looked up for every row from the grouped results
+    rows = pd.MultiIndex.from_frame(data[keys])
+    lower = salaries.quantile(0.25).reindex(rows).to_numpy()
+    upper = salaries.quantile(0.75).reindex(rows).to_numpy()
+    inside = (data['salary'] >= lower) & (data['salary'] <= upper)
+    stats['clipped_mean'] = data['salary'].where(inside).groupby([data['cohort'], data[period]],
+                                                                 observed=True).mean()
+
+    if periods is not None:
+        everything = pd.MultiIndex.from_product([list(cohorts), list(periods)], names=keys)
+        stats = stats.reindex(everything)
+        stats['count'] = stats['count'].fillna(0)
+
+    stats['count'] = stats['count'].astype(int)
+
+    return stats[STATS].reset_index()
+
+
+def salary_table(stats, stat, period='year'):
+    """
+    Picks one statistic out of the results of aggregate_salaries, ready for plotting
+    :param stats: the df from aggregate_salaries
+    :param stat: one of STATS
+    :param period: the period the stats were grouped by
+    :return: a df with a row per period and a column per cohort
+    """
+
+    table = stats.pivot(index=period, columns='cohort', values=stat)
+
+    # Keep the cohorts in the order they were given
+    return table[list(stats['cohort'].unique())]
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import pandas as pd
+
+# Counts the job adverts per week, month and year for find_jobs.py, for any number of cohorts (e.g. all jobs and
+# the jobs of interest). The counts are worked out from the number of adverts on each date, so each cohort is done
+# in one vectorised pass over its distinct dates (a few thousand, however many adverts there are), and they're
+# saved as a table so that the plots, and anything else that wants the numbers, can be made from it.
+
+# The periods the adverts are counted over, and the pandas frequency of each. Weeks run from Monday to Sunday
+
+TIME_SERIES_FREQUENCIES = {'week': 'W-SUN', 'month': 'M', 'year': 'Y'}
+
+
+def count_per_period(date_counts, frequency):
+    """
+    Adds up the number of adverts in each period
+    :param date_counts: the number of adverts on each date, as a Series indexed by date (e.g. from value_counts)
+    :param frequency: one of the TIME_SERIES_FREQUENCIES
+    :return: a Series of the number of adverts indexed by period (a pandas PeriodIndex)
+    """
+
+    periods = pd.DatetimeIndex(date_counts.index).to_period(TIME_SERIES_FREQUENCIES[frequency])
+
+    return date_counts.groupby(periods).sum()
+
+
+def time_series_table(cohorts, frequencies=tuple(TIME_SERIES_FREQUENCIES)):
+    """
+    Counts the adverts of each cohort in every week, month and year from the first advert to the last
+    :param cohorts: a dict of cohort name to the number of adverts on each date, as a Series indexed by date, e.g.
+    {'all jobs': all_dates, 'RSE Jobs': interest_dates}
+    :param frequencies: the periods to count over (see TIME_SERIES_FREQUENCIES)
+    :return: a df with a row per period, and the 'frequency', the 'start' and 'end' dates of the period and the
+    number of adverts of each cohort as columns. Periods without any adverts are included, with a count of 0
+    """
+
+    frames = []
+    for frequency in frequencies:
+        counts = pd.DataFrame({name: count_per_period(dates, frequency) for name, dates in cohorts.items()})
+
+        if len(counts) == 0:
+            continue
+
+        # Every period from the first to the last, so the gaps show up as zeros
+        counts = counts.reindex(pd.period_range(counts.index.min(), counts.index.max()))
+        counts = counts.fillna(0).astype('int64')
+
+        table = pd.DataFrame({'frequency': frequency,
+                              'start': counts.index.start_time.normalize(),
+                              'end': counts.index.end_time.normalize()})
+        frames.append(pd.concat([table, counts.reset_index(drop=True)], axis=1))
+
+    if not frames:
+        return pd.DataFrame(columns=['frequency', 'start', 'end'] + list(cohorts))
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def period_counts(table, frequency, cohort):
+    """
+    Picks the counts of one cohort over one frequency out of the results of time_series_table, ready for a bar plot
+    :param table: the df from time_series_table
+    :param frequency: one of the frequencies in the table
+    :param cohort: one of the cohorts in the table
+    :return: a df with a row per period, and the 'start', 'end' and 'count' of each period as columns
+    """
+
+    rows = table[table['frequency'] == frequency]
+
+    # The bars run up to the start of the next day, so that they meet
+    return pd.DataFrame({'start': rows['start'], 'end': rows['end'] + pd.Timedelta(days=1),
+                         'count': rows[cohort]}).reset_index(drop=True)
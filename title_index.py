@@ -0,0 +1,418 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import json
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from command_line import pop_option, pop_flag
+from jobs_io import filename_hashes, iter_jobs, sorted_contains, sorted_insert
+
+# Keeps an inverted index of the job titles on disk, so that questions like 'how many titles with "research software"
+# in them were there each year?' can be answered in milliseconds, rather than by editing the search terms in
+# find_jobs.py and searching every title in the dataset again.
+#
+# Every advert with a title gets a row ID (in the order the adverts were added), and each row has its title, year
+# and organisation as side columns. The distinct titles (lowercased, a few per cent of the adverts) are split into
+# words, and for each word the index holds the sorted IDs of the titles it's in, so finding the titles with a word
+# is a slice of one array. A search term is looked up word by word in the (small) vocabulary: a word of the term
+# can be any part of a word in the title, so a stem like 'scien' finds 'science', 'scientist' and 'neuroscience',
+# and the titles with every word of the term are then checked for the whole term. That's the same rule as
+# find_jobs.py uses (the term appears somewhere in the lowercased title), so the counts agree.
+#
+# Call as 'python title_index.py update /PATH_TO_PROCESSED_JOBS_FILE.csv' to add the adverts in a file to the
+# index (only adverts that aren't in it yet are added, so run it on each new file as it's parsed), and as
+# 'python title_index.py count "research software" "engineer" --not "lecturer"' for the number of jobs and
+# organisations each year with titles containing every term and none of the '--not' terms. Add '--any' to count
+# titles with any of the terms instead (like the 'include' list of a profile in find_jobs.py). The index is kept
+# in TITLE_INDEX_NAME in ./results, or wherever '--index PATH' says.
+
+TITLE_INDEX_NAME = './results/title_index'
+
+# The columns read from the processed jobs file
+
+INDEX_COLUMNS = ['filename', 'job title', 'year', 'organisation']
+
+# The numbers are kept in ARRAYS_FILE and the text (the titles, organisations and vocabulary) in TEXT_FILE
+
+ARRAYS_FILE = 'index.npz'
+TEXT_FILE = 'text.json'
+
+# What a title is split into words on
+
+WORD_PATTERN = r'[a-z0-9]+'
+
+# The side columns of the rows where the year or organisation is missing
+
+MISSING = -1
+
+
+def empty_index():
+    """
+    Makes an index with nothing in it yet
+    :return: the index, a dict of:
+     - 'titles', 'organisations': lists of the distinct (lowercased) titles and the distinct organisations
+     - 'row titles', 'row years', 'row organisations': numpy arrays of the title, year and organisation of each row
+       (as positions in the lists, or MISSING)
+     - 'words': the sorted list of the words in the titles
+     - 'offsets', 'postings': numpy arrays where the IDs of the titles with the i-th word are
+       postings[offsets[i]:offsets[i + 1]], in order
+     - 'title hashes', 'title ids': numpy arrays of the (64 bit) hash of each title, sorted, and the ID of the title
+       with each hash, so the IDs of the titles in new adverts are looked up without going through every title
+     - 'adverts': a sorted numpy array of the hashes of the filenames of the adverts in the index
+    """
+
+    return {'titles': [], 'organisations': [],
+            'row titles': np.array([], dtype=np.int32), 'row years': np.array([], dtype=np.int16),
+            'row organisations': np.array([], dtype=np.int32),
+            'words': [], 'offsets': np.zeros(1, dtype=np.int64), 'postings': np.array([], dtype=np.int32),
+            'title hashes': np.array([], dtype=np.uint64), 'title ids': np.array([], dtype=np.int32),
+            'adverts': np.array([], dtype=np.uint64)}
+
+
+def load_index(location):
+    """
+    Loads the index, or starts a new one if there isn't one yet
+    :param location: the folder the index is kept in
+    :return: the index (see empty_index)
+    """
+
+    index = empty_index()
+
+    if not os.path.exists(os.path.join(location, ARRAYS_FILE)):
+        return index
+
+    with open(os.path.join(location, TEXT_FILE), 'r') as f:
+        index.update(json.load(f))
+
+    with np.load(os.path.join(location, ARRAYS_FILE)) as arrays:
+        for name in arrays.files:
+            index[name.replace('_', ' ')] = arrays[name]
+
+    # Indexes saved before the title hashes were kept get them now
+    if len(index['title hashes']) != len(index['titles']):
+        hashes = title_hashes(index['titles'])
+        order = np.argsort(hashes, kind='stable')
+        index['title hashes'], index['title ids'] = hashes[order], order.astype(np.int32)
+
+    return index
+
+
+def save_index(index, location):
+    """
+    Saves the index. Both files are written in full before the old ones are replaced
+    :param index: the index
+    :param location: the folder to keep the index in, which is made if it doesn't exist
+    :return: nothing, saves the files
+    """
+
+    os.makedirs(location, exist_ok=True)
+
+    with open(os.path.join(location, TEXT_FILE + '.tmp'), 'w') as f:
+        json.dump({name: index[name] for name in ['titles', 'organisations', 'words']}, f)
+
+    with open(os.path.join(location, ARRAYS_FILE + '.tmp'), 'wb') as f:
+        np.savez(f, **{name.replace(' ', '_'): value for name, value in index.items() if isinstance(value, np.ndarray)})
+
+    for filename in [TEXT_FILE, ARRAYS_FILE]:
+        os.replace(os.path.join(location, filename + '.tmp'), os.path.join(location, filename))
+
+
+def title_hashes(titles):
+    """
+    Hashes some (lowercased) titles, so they can be looked up in the index as numbers
+    :param titles: a list or numpy array of titles
+    :return: a numpy array of the (64 bit) hashes
+    """
+
+    return pd.util.hash_pandas_object(pd.Series(titles, dtype=object), index=False).to_numpy()
+
+
+def title_ids(index, titles):
+    """
+    Finds the ID of each title, adding the titles that aren't in the index yet to the end of its titles. Only the
+    distinct titles given are looked up (in the sorted title hashes), so this takes time in proportion to the number
+    of titles given rather than the number in the index
+    :param index: the index, which is updated
+    :param titles: a pandas Series of (lowercased) titles, with no missing values
+    :return: a numpy array of the ID of each title
+    """
+
+    codes, uniques = pd.factorize(titles)
+    uniques = np.asarray(uniques, dtype=object)
+    hashes = title_hashes(uniques)
+
+    found = sorted_contains(index['title hashes'], hashes)
+    places = np.minimum(np.searchsorted(index['title hashes'], hashes), max(len(index['title hashes']) - 1, 0))
+    ids = np.where(found, index['title ids'][places] if len(index['title ids']) > 0 else MISSING, MISSING)
+
+    # The new titles get the next IDs, and their hashes are slotted into the sorted hashes
+    ids[~found] = np.arange(len(index['titles']), len(index['titles']) + (~found).sum())
+    index['titles'] += uniques[~found].tolist()
+
+    order = np.argsort(hashes[~found], kind='stable')
+    slots = np.searchsorted(index['title hashes'], hashes[~found][order])
+    index['title hashes'] = np.insert(index['title hashes'], slots, hashes[~found][order])
+    index['title ids'] = np.insert(index['title ids'], slots, ids[~found][order].astype(np.int32))
+
+    return ids[codes].astype(np.int32)
+
+
+def positions(values, known):
+    """
+    Finds the position of each value in a list, adding the values that aren't in it yet to the end
+    :param values: a pandas Series of values (missing values get MISSING)
+    :param known: a dict of each value in the list to its position, which is updated along with the list
+    :return: a numpy array of the positions, and the list of the values that were added
+    """
+
+    codes, uniques = pd.factorize(values)
+    added = [value for value in uniques if value not in known]
+    for value in added:
+        known[value] = len(known)
+
+    lookup = np.array([known[value] for value in uniques] + [MISSING], dtype=np.int32)
+
+    return lookup[codes], added
+
+
+def add_adverts(index, df, known_organisations):
+    """
+    Adds the adverts which aren't in the index yet to its rows. The titles are only added to the word postings by
+    finish_update, so that they're sorted once however many chunks are added
+    :param index: the index, which is updated
+    :param df: a df of job data with the INDEX_COLUMNS
+    :param known_organisations: a dict of each organisation in the index to its position, which is updated
+    :return: the number of adverts added
+    """
+
+    df = df.dropna(subset=['job title'])
+
+    # Leave out adverts that are already in the index, and repeats of the same advert
+    hashes = filename_hashes(df['filename'])
+    new = ~sorted_contains(index['adverts'], hashes) & ~pd.Series(hashes).duplicated().to_numpy()
+    df = df[new]
+
+    titles = title_ids(index, df['job title'].astype(object).str.lower())
+    organisations, added_organisations = positions(df['organisation'].astype(object), known_organisations)
+    years = pd.to_numeric(df['year'], errors='coerce').fillna(MISSING).to_numpy(dtype=np.int16)
+
+    index['organisations'] += added_organisations
+    index['row titles'] = np.concatenate([index['row titles'], titles])
+    index['row years'] = np.concatenate([index['row years'], years])
+    index['row organisations'] = np.concatenate([index['row organisations'], organisations])
+    index['adverts'] = sorted_insert(index['adverts'], hashes[new])
+
+    return len(df)
+
+
+def finish_update(index, first_new_title):
+    """
+    Adds the words of the titles added since an update started to the word postings. Only the new (word, title)
+    pairs are sorted: the new titles have higher IDs than any title already in the index, so each word's new
+    postings go on the end of its existing slice, and are slotted in there
+    :param index: the index, which is updated
+    :param first_new_title: the ID of the first title added
+    :return: nothing
+    """
+
+    new_titles = pd.Series(index['titles'][first_new_title:], dtype=object)
+    new_titles.index += first_new_title
+    title_words = new_titles.str.findall(WORD_PATTERN).explode().dropna()
+
+    # Each distinct word is only looked up once
+    word_codes, new_vocabulary = pd.factorize(title_words.to_numpy(dtype=object))
+    pairs = pd.DataFrame({'title': title_words.index.to_numpy(dtype=np.int32), 'word': word_codes}).drop_duplicates()
+
+    old_vocabulary = np.array(index['words'], dtype=object)
+    words = sorted(set(index['words']).union(new_vocabulary))
+    vocabulary = np.array(words, dtype=object)
+
+    # The new pairs, as positions in the new (bigger) vocabulary, sorted by word and then title
+    new_words = np.searchsorted(vocabulary, np.asarray(new_vocabulary, dtype=object))[pairs['word'].to_numpy()] \
+        if len(pairs) > 0 else np.array([], dtype=np.int64)
+    new_postings = pairs['title'].to_numpy()
+    order = np.lexsort((new_postings, new_words))
+    new_words, new_postings = new_words[order], new_postings[order]
+
+    # Each new posting goes at the end of its word's slice of the old postings (for a word that's new to the
+    # vocabulary, that's where the slice would be: after the slices of the old words that come before it)
+    slice_ends = index['offsets'][np.searchsorted(old_vocabulary, vocabulary, side='right')] \
+        if len(old_vocabulary) > 0 else np.zeros(len(vocabulary), dtype=np.int64)
+    postings = np.insert(index['postings'], slice_ends[new_words], new_postings)
+
+    counts = np.bincount(new_words, minlength=len(words))
+    if len(old_vocabulary) > 0:
+        counts[np.searchsorted(vocabulary, old_vocabulary)] += np.diff(index['offsets'])
+
+    index['words'] = words
+    index['postings'] = postings.astype(np.int32)
+    index['offsets'] = np.r_[0, np.cumsum(counts)].astype(np.int64)
+
+
+def update_index(index, path, chunk_size=100000):
+    """
+    Adds the adverts in a file of job data that aren't in the index yet
+    :param index: the index, which is updated
+    :param path: the path to a .csv or .parquet file of job data
+    :param chunk_size: the number of adverts to read at a time
+    :return: the number of adverts added
+    """
+
+    known_organisations = {name: position for position, name in enumerate(index['organisations'])}
+    first_new_title = len(index['titles'])
+
+    n_added = 0
+    for chunk in iter_jobs(path, INDEX_COLUMNS, chunk_size):
+        n_added += add_adverts(index, chunk, known_organisations)
+
+    finish_update(index, first_new_title)
+
+    return n_added
+
+
+def term_titles(index, term):
+    """
+    Finds the titles which contain a search term
+    :param index: the index
+    :param term: the search term, e.g. 'data scien'
+    :return: a numpy array of True/False with an entry for each title
+    """
+
+    term = term.lower()
+    term_words = list(dict.fromkeys(re.findall(WORD_PATTERN, term)))
+    found = np.ones(len(index['titles']), dtype=bool)
+
+    # The titles with a word containing each word of the term (a title can only contain the term if it has them all)
+    for term_word in term_words:
+        matches = np.array([position for position, word in enumerate(index['words']) if term_word in word],
+                           dtype=np.int64)
+
+        # The postings of all the words that match, gathered in one go
+        starts = index['offsets'][matches]
+        lengths = index['offsets'][matches + 1] - starts
+        within = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+        with_word = np.zeros(len(index['titles']), dtype=bool)
+        with_word[index['postings'][np.repeat(starts, lengths) + within]] = True
+        found &= with_word
+
+    # A term that's a single word is in every title found, but otherwise check that the titles have the whole term,
+    # with the spaces and punctuation in the same places
+    if term_words != [term]:
+        candidates = np.flatnonzero(found)
+        found[candidates] = [term in index['titles'][title_id] for title_id in candidates]
+
+    return found
+
+
+def matching_rows(index, terms, not_terms=(), any_term=False):
+    """
+    Finds the rows whose titles contain every one of the terms (or any of them) and none of the other terms
+    :param index: the index
+    :param terms: a list of the search terms
+    :param not_terms: a list of terms the titles mustn't contain
+    :param any_term: True for titles containing any of the terms, False for titles containing them all
+    :return: a numpy array of the row IDs, in order
+    """
+
+    found = [term_titles(index, term) for term in terms]
+    if found:
+        titles = np.logical_or.reduce(found) if any_term else np.logical_and.reduce(found)
+    else:
+        titles = np.ones(len(index['titles']), dtype=bool)
+
+    for term in not_terms:
+        titles &= ~term_titles(index, term)
+
+    return np.flatnonzero(titles[index['row titles']])
+
+
+def counts_per_year(index, rows):
+    """
+    Counts some rows of the index in each year
+    :param index: the index
+    :param rows: a numpy array of row IDs, e.g. from matching_rows
+    :return: a df with a row per year (from the first to the last), and the 'year', the number of 'jobs' and the
+    number of different 'organisations' they're at
+    """
+
+    years = index['row years'][rows].astype(np.int64)
+    organisations = index['row organisations'][rows].astype(np.int64)
+    organisations, years = organisations[years != MISSING], years[years != MISSING]
+
+    if len(years) == 0:
+        return pd.DataFrame({'year': [], 'jobs': [], 'organisations': []}, dtype='int64')
+
+    first_year = years.min()
+    n_years = years.max() - first_year + 1
+    jobs = np.bincount(years - first_year, minlength=n_years)
+
+    # The distinct (year, organisation) pairs, as single numbers, then how many there are in each year
+    n_organisations = max(len(index['organisations']), 1)
+    pairs = np.sort(((years - first_year) * n_organisations + organisations)[organisations != MISSING])
+    pairs = pairs[np.r_[True, pairs[1:] != pairs[:-1]]] if len(pairs) > 0 else pairs
+    organisation_counts = np.bincount(pairs // n_organisations, minlength=n_years)
+
+    return pd.DataFrame({'year': np.arange(first_year, first_year + n_years), 'jobs': jobs,
+                         'organisations': organisation_counts})
+
+
+def parse_args(argv):
+    """
+    Reads the command line arguments
+    :param argv: the list of command line arguments, without the name of the script
+    :return: the command ('update' or 'count'), the folder the index is in, the files to add (for 'update') or the
+    terms, the terms to leave out and whether any of the terms will do (for 'count')
+    """
+
+    args = list(argv)
+
+    location = pop_option(args, '--index', TITLE_INDEX_NAME)
+    any_term = pop_flag(args, '--any')
+
+    not_terms = []
+    while '--not' in args:
+        not_terms.append(pop_option(args, '--not', None))
+
+    if len(args) < 2 or args[0] not in ('update', 'count'):
+        raise ValueError('Call as "title_index.py update FILE [FILE...]" or '
+                         '"title_index.py count TERM [TERM...] [--not TERM] [--any]"')
+
+    return args[0], location, args[1:], not_terms, any_term
+
+
+def main(command, location, arguments, not_terms=(), any_term=False):
+    """
+    Main function to run program
+    """
+
+    start_time = time.time()
+    index = load_index(location)
+
+    if command == 'update':
+        for path in arguments:
+            n_added = update_index(index, path)
+            print('Added %i adverts from "%s"' % (n_added, path))
+        save_index(index, location)
+        print('The index has %i adverts, with %i different titles' % (len(index['row titles']), len(index['titles'])))
+
+    else:
+        search_time = time.time()
+        rows = matching_rows(index, arguments, not_terms, any_term)
+        counts = counts_per_year(index, rows)
+        search_time = time.time() - search_time
+        print(counts.to_string(index=False))
+        print('Found %i of the %i jobs in %.1f ms' % (len(rows), len(index['row titles']), 1000 * search_time))
+
+    print("--- %s seconds ---" % round((time.time() - start_time),1))
+
+
+if __name__ == '__main__':
+
+    main(*parse_args(sys.argv[1:]))
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import json
+import re
+
+import numpy as np
+import pandas as pd
+
+# Looks for a list of search terms in the job titles in a single pass, rather than running str.contains over the
+# whole title column once per term. Used by find_jobs.py to flag the jobs of interest and the jobs to avoid, either
+# for a single list of each or for several named profiles at once (see load_profiles).
+#
+# All the terms are compiled into one regex and each distinct title is only scanned once (most titles turn up
+# many times, e.g. 'research fellow'). The terms are matched as plain text, not as regexes, and the titles are
+# lowercased first, so 'Data Scien' and 'data scien' match the same titles.
+
+
+def compile_terms(terms):
+    """
+    Compiles the search terms into a single regex which finds every term in a title, even where terms overlap
+    (e.g. 'software engineer' and 'engineer' in 'research software engineer')
+    :param terms: a list of the search terms
+    :return: the compiled regex and a dict of each term to the list of terms it contains as a prefix (itself
+    included)
+    """
+
+    unique_terms = sorted(set(term.lower() for term in terms), key=len, reverse=True)
+
+    # The lookahead matches at every position in the title without using any of it up, so terms which overlap
+    # are all found. Where several terms start at the same position the longest is listed first and so wins; the
+    # others are all prefixes of it, so they're found through the prefix lists
+    pattern = re.compile('(?=(' + '|'.join(re.escape(term) for term in unique_terms) + '))')
+
+    prefixes = {term: [other for other in unique_terms if term.startswith(other)] for term in unique_terms}
+
+    return pattern, prefixes
+
+
+def find_terms(titles, terms):
+    """
+    Finds which of the terms each title contains, scanning each distinct title only once
+    :param titles: a pandas Series of job titles (missing titles don't match anything)
+    :param terms: a list of the terms to search for
+    :return: a numpy array of True/False with a row for each title and a column for each term
+    """
+
+    # Find the distinct titles, and where each title appears in the column (missing titles get a code of -1)
+    codes, unique_titles = pd.factorize(titles)
+    unique_titles = [str(title).lower() for title in unique_titles]
+
+    # Scan each distinct title once, marking which terms it contains
+    term_positions = {}
+    for position, term in enumerate(terms):
+        term_positions.setdefault(term.lower(), []).append(position)
+
+    # The extra row at the end, which never matches, is the one that the -1 codes pick out
+    found = np.zeros((len(unique_titles) + 1, len(terms)), dtype=bool)
+
+    if terms:
+        pattern, prefixes = compile_terms(terms)
+        positions = {term: [position for other in prefixes[term] for position in term_positions[other]]
+                     for term in prefixes}
+        for title_number, title in enumerate(unique_titles):
+            for term in set(pattern.findall(title)):
+                found[title_number, positions[term]] = True
+
+    # Then spread the results back out to every row
+    return found[codes]
+
+
+def matches_to_df(index, jobs_of_interest, interest_found, avoid_found):
+    """
+    Turns the terms found in each title into the columns used by find_jobs.py
+    :param index: the index of the titles
+    :param jobs_of_interest: the list of the terms to search for
+    :param interest_found: the array from find_terms for the jobs of interest
+    :param avoid_found: the array from find_terms for the jobs to avoid
+    :return: a df with the same index as the titles, with a True/False column for each job of interest and the
+    'any_job' (contains a job of interest), 'not_job' (contains a job to avoid) and 'keep_job' columns
+    """
+
+    matches = pd.DataFrame(interest_found, index=index, columns=list(jobs_of_interest))
+    matches['any_job'] = interest_found.any(axis=1)
+    matches['not_job'] = avoid_found.any(axis=1)
+    matches['keep_job'] = matches['any_job'] & ~matches['not_job']
+
+    return matches
+
+
+def match_titles(titles, jobs_of_interest, avoid_jobs=()):
+    """
+    Flags the titles which contain each of the jobs of interest, and decides which titles to keep: those which
+    contain any of the jobs of interest and none of the jobs to avoid
+    :param titles: a pandas Series of job titles (missing titles don't match anything)
+    :param jobs_of_interest: a list of the terms to search for, e.g. 'data scien' to catch 'data science' and
+    'data scientist'
+    :param avoid_jobs: a list of the terms for jobs to leave out, e.g. 'lecturer'
+    :return: a df with the same index as titles, with a True/False column for each job of interest and the
+    'any_job' (contains a job of interest), 'not_job' (contains a job to avoid) and 'keep_job' columns
+    """
+
+    n_interest = len(jobs_of_interest)
+    found = find_terms(titles, list(jobs_of_interest) + list(avoid_jobs))
+
+    return matches_to_df(titles.index, jobs_of_interest, found[:, :n_interest], found[:, n_interest:])
+
+
+def load_profiles(path):
+    """
+    Reads a file of job profiles: named sets of terms to search the job titles for, each with its own terms to
+    avoid. The file is json, e.g.
+
+        {
+            "rse": {"include": ["software engineer", "research engineer"], "exclude": ["lecturer"]},
+            "hpc": {"include": ["hpc", "high performance comput"]}
+        }
+
+    :param path: the path to the json file
+    :return: a dict of profile name to a tuple of the list of jobs of interest and the list of jobs to avoid, in
+    the order they are in the file
+    """
+
+    with open(path, 'r') as f:
+        rule_set = json.load(f)
+
+    profiles = {}
+    for name, rules in rule_set.items():
+        if not isinstance(rules, dict) or not rules.get('include'):
+            raise ValueError('Profile "%s" in "%s" must have a list of terms to "include"' % (name, path))
+        unknown = set(rules) - {'include', 'exclude'}
+        if unknown:
+            raise ValueError('Profile "%s" in "%s" has unknown keys: %s' % (name, path, ', '.join(sorted(unknown))))
+        profiles[name] = (list(rules['include']), list(rules.get('exclude', [])))
+
+    return profiles
+
+
+def match_profiles(titles, profiles):
+    """
+    Does the same job as match_titles for every profile at once. The terms of all the profiles are looked for in
+    a single scan of the titles, so many profiles cost little more than one
+    :param titles: a pandas Series of job titles (missing titles don't match anything)
+    :param profiles: a dict of profile name to a tuple of the list of jobs of interest and the list of jobs to
+    avoid (see load_profiles)
+    :return: a dict of profile name to the df that match_titles would give for that profile
+    """
+
+    terms = []
+    for jobs_of_interest, avoid_jobs in profiles.values():
+        terms += [term for term in list(jobs_of_interest) + list(avoid_jobs) if term not in terms]
+
+    found = find_terms(titles, terms)
+    columns = {term: position for position, term in enumerate(terms)}
+
+    all_matches = {}
+    for name, (jobs_of_interest, avoid_jobs) in profiles.items():
+        interest_found = found[:, [columns[term] for term in jobs_of_interest]]
+        avoid_found = found[:, [columns[term] for term in avoid_jobs]]
+        all_matches[name] = matches_to_df(titles.index, jobs_of_interest, interest_found, avoid_found)
+
+    return all_matches